@@ -150,7 +150,11 @@ export default function AdminArchiveSchoolYear({ adminEmail }) {
             (e.g., to start 2026–2027, archive <strong>2025–2026</strong>).
           </li>
           <li>
-            <strong>Step 3:</strong> Done!
+            <strong>Step 3:</strong> On the kiosk server, archive the same school year in the attendance
+            database: <code>python -m kiosk.migrate_attendance --archive 2025-2026</code>.
+          </li>
+          <li>
+            <strong>Step 4:</strong> Done!
           </li>
         </ul>
       </div>
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Attendance Write-Behind Buffer ----------------
+class AttendanceBuffer:
+    # Keeps the set of students already marked today in memory and queues new
+    # marks for a background thread that inserts them in batches. Batches that
+    # cannot reach the DB are spooled to a local file and replayed later. If
+    # today's set could not be seeded, every flush retries until it succeeds.
+    # Only connection errors (db.RETRY_ERRORS) count as an outage; rows the
+    # database rejects are retried one by one and the ones it keeps rejecting
+    # go to a dead-letter file, so a bad row cannot hold up the rest.
+    def __init__(self, db, spool_path, flush_interval=2.0, batch_size=500, rejected_path=None):
+        self.db = db
+        self.spool_path = spool_path
+        self.rejected_path = rejected_path or os.path.splitext(spool_path)[0] + "_rejected.jsonl"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._marked = set()
+        self._day = date.today()
+        self._seeded = False
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- Seed today's set with one range query (index-friendly, no DATE()) ---
+    def seed(self):
+        marked = self.db.attendance_marked_today()
+        with self._lock:
+            self._roll_day(date.today())
+            # Marks made while unseeded may still be queued: keep them
+            self._marked |= set(marked)
+            self._seeded = True
+        return len(marked)
+
+    def _roll_day(self, today):
+        # Called with the lock held; a new day starts empty and unseeded
+        if today != self._day:
+            self._day = today
+            self._marked = set()
+            self._seeded = False
+
+    # --- Called from the inference worker; never touches the DB ---
+    def mark(self, student_id):
+        now = datetime.now()
+        with self._lock:
+            self._roll_day(now.date())
+            if student_id in self._marked:
+                return False
+            self._marked.add(student_id)
+            self._queue.append((student_id, now))
+        return True
+
+    def is_marked(self, student_id):
+        with self._lock:
+            return student_id in self._marked
+
+    def pending(self):
+        return len(self._queue)
+
+    # --- Background flusher ---
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("attendance flush failed")
+
+    def flush(self):
+        batch = []
+        with self._lock:
+            self._roll_day(date.today())
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            seeded = self._seeded
+        if not batch and seeded and not os.path.exists(self.spool_path):
+            return 0
+
+        try:
+            if not seeded:
+                self.seed()
+        except self.db.RETRY_ERRORS:
+            self._spool(batch)
+            return 0
+        if not self._replay_spool():
+            self._spool(batch)
+            return 0
+        written, unsent = self._write(batch)
+        if unsent:
+            self._spool(unsent)
+            return written
+
+        # Keep draining when the queue outgrew one batch
+        if self._queue:
+            self._wake.set()
+        return written
+
+    def _write(self, rows):
+        # Returns (rows written, rows left unsent by an outage). A batch the
+        # database rejects is rolled back whole, so it is retried row by row.
+        if not rows:
+            return 0, []
+        try:
+            self.db.insert_attendance(rows)
+            return len(rows), []
+        except self.db.RETRY_ERRORS:
+            return 0, rows
+        except Exception as e:
+            if len(rows) == 1:
+                self._reject(rows, e)
+                return 0, []
+            logger.warning("attendance batch of %d rejected (%s), retrying row by row", len(rows), e)
+
+        written = 0
+        for i, row in enumerate(rows):
+            try:
+                self.db.insert_attendance([row])
+                written += 1
+            except self.db.RETRY_ERRORS:
+                return written, rows[i:]
+            except Exception as e:
+                self._reject([row], e)
+        return written, []
+
+    # --- Local spool for DB outages ---
+    def _spool(self, rows, path=None, error=None):
+        if not rows:
+            return
+        path = path or self.spool_path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for student_id, timestamp in rows:
+                record = {"student_id": student_id, "timestamp": timestamp.isoformat()}
+                if error is not None:
+                    record["error"] = str(error).strip()
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _reject(self, rows, error):
+        logger.error("attendance rows %s rejected, moved to %s: %s", rows, self.rejected_path, error)
+        self._spool(rows, self.rejected_path, error)
+
+    def _replay_spool(self):
+        # False when the database went away again; the unsent rows stay spooled
+        if not os.path.exists(self.spool_path):
+            return True
+        rows = []
+        with open(self.spool_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    rows.append((record["student_id"], datetime.fromisoformat(record["timestamp"])))
+                except (ValueError, KeyError, TypeError):
+                    continue  # blank or torn line from a crash
+
+        _written, unsent = self._write(rows)
+        if unsent:
+            if len(unsent) < len(rows):
+                # Part of the spool went through: keep only the rest
+                tmp_path = self.spool_path + ".tmp"
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self._spool(unsent, tmp_path)
+                os.replace(tmp_path, self.spool_path)
+            return False
+        os.remove(self.spool_path)
+        return True
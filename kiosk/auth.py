@@ -0,0 +1,227 @@
+# ---------------- Kiosk Admin Authentication ----------------
+# Passwords in `users.password` are stored as salted scrypt hashes:
+#
+#   scrypt$<log2 n>$<r>$<p>$<salt b64>$<hash b64>
+#
+# The cost comes from KIOSK_SCRYPT_LOG2N / _R / _P, so login time stays
+# predictable on kiosk hardware. Rows still holding a plaintext password are
+# accepted once and re-hashed on that login; `python -m kiosk.auth --migrate`
+# hashes all of them up front. The dump created users.password as
+# varchar(50), too short for a hash (~80 characters); --migrate and
+# --set-password widen it to varchar(255) first.
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+
+SCHEME = "scrypt"
+DEFAULT_LOG2N = int(os.environ.get("KIOSK_SCRYPT_LOG2N", "14"))   # n = 16384, ~50 ms
+DEFAULT_R = int(os.environ.get("KIOSK_SCRYPT_R", "8"))
+DEFAULT_P = int(os.environ.get("KIOSK_SCRYPT_P", "1"))
+SALT_BYTES = 16
+HASH_BYTES = 32
+PASSWORD_COLUMN_WIDTH = 255
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Hashing ----------------
+def _b64(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log2n, r, p):
+    n = 1 << log2n
+    # OpenSSL refuses scrypt above its default 32 MB unless maxmem is raised
+    maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=maxmem, dklen=HASH_BYTES)
+
+
+def hash_password(password, log2n=DEFAULT_LOG2N, r=DEFAULT_R, p=DEFAULT_P):
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, log2n, r, p)
+    return f"{SCHEME}${log2n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(SCHEME + "$")
+
+
+def verify_password(password, stored):
+    # Returns (ok, needs_rehash). Plaintext rows and hashes made with a
+    # different cost ask to be re-hashed with the current settings.
+    if not stored:
+        return False, False
+    if not is_hashed(stored):
+        ok = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return ok, ok
+    try:
+        _scheme, log2n, r, p, salt, digest = stored.split("$")
+        log2n, r, p = int(log2n), int(r), int(p)
+        expected = _unb64(digest)
+        actual = _scrypt(password, _unb64(salt), log2n, r, p)
+    except (ValueError, TypeError):
+        return False, False
+    ok = hmac.compare_digest(actual, expected)
+    return ok, ok and (log2n, r, p) != (DEFAULT_LOG2N, DEFAULT_R, DEFAULT_P)
+
+
+# ---------------- Session Cache ----------------
+class SessionCache:
+    # Recently verified logins, so switching screens or a short DB outage
+    # does not cost another scrypt run and round trip. Only an HMAC of the
+    # password under a per-process random key is kept in memory.
+    def __init__(self, ttl_s=300.0, outage_grace_s=900.0, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.outage_grace_s = outage_grace_s
+        self.clock = clock
+        self._key = secrets.token_bytes(32)
+        self._entries = {}       # username -> (verifier, role, verified_at)
+        self._lock = threading.Lock()
+
+    def _verifier(self, username, password):
+        return hmac.new(self._key, f"{username}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def put(self, username, password, role):
+        with self._lock:
+            self._entries[username] = (self._verifier(username, password), role, self.clock())
+
+    def get(self, username, password, max_age_s=None):
+        max_age_s = self.ttl_s if max_age_s is None else max_age_s
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is None:
+            return None
+        verifier, role, verified_at = entry
+        if self.clock() - verified_at > max_age_s:
+            return None
+        if not hmac.compare_digest(verifier, self._verifier(username, password)):
+            return None
+        return role
+
+    def invalidate(self, username=None):
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+
+# ---------------- Authenticator ----------------
+class Authenticator:
+    # Blocking by design (scrypt + DB); the UI calls it from a worker thread.
+    def __init__(self, db, cache=None, cached_roles=("admin",)):
+        self.db = db
+        self.cache = cache or SessionCache()
+        self.cached_roles = cached_roles
+
+    def login(self, username, password):
+        # Returns (username, role) or None; raises when the DB is unreachable
+        # and no recent session covers this login
+        role = self.cache.get(username, password)
+        if role is not None:
+            return username, role
+
+        try:
+            row = self.db.fetch_credentials(username)
+        except self.db.RETRY_ERRORS:
+            role = self.cache.get(username, password, max_age_s=self.cache.outage_grace_s)
+            if role is not None:
+                return username, role
+            raise
+
+        if row is None:
+            # Burn the same time as a real check so unknown usernames are not obvious
+            _scrypt(password, bytes(SALT_BYTES), DEFAULT_LOG2N, DEFAULT_R, DEFAULT_P)
+            return None
+        db_username, stored, role = row
+        ok, needs_rehash = verify_password(password, stored)
+        if not ok:
+            return None
+
+        if needs_rehash:
+            try:
+                self.db.update_password_hash(db_username, hash_password(password))
+            except Exception as e:
+                # Retried on the next login; a too-narrow column needs `python -m kiosk.auth --migrate`
+                logger.warning("could not re-hash the password of %s: %s", db_username, e)
+        if (role or "").lower() in self.cached_roles:
+            self.cache.put(username, password, role)
+        return db_username, role
+
+
+# ---------------- Admin CLI ----------------
+def widen_password_column(db):
+    # Returns True when users.password had to be widened to hold hashes
+    def query(cursor):
+        cursor.execute(
+            "SELECT character_maximum_length FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'users' AND column_name = 'password'"
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None or row[0] >= PASSWORD_COLUMN_WIDTH:
+            return False
+        cursor.execute(f"ALTER TABLE users ALTER COLUMN password TYPE varchar({PASSWORD_COLUMN_WIDTH})")
+        return True
+    return db.run(query)
+
+
+def migrate_plaintext(db):
+    # Hash every users.password that is still plaintext
+    widen_password_column(db)
+    rows = db.run(lambda cursor: cursor.execute("SELECT username, password FROM users") or cursor.fetchall())
+    updated = 0
+    for username, stored in rows:
+        if stored and not is_hashed(stored):
+            db.update_password_hash(username, hash_password(stored))
+            updated += 1
+    return updated
+
+
+def main():
+    from kiosk.db import Database
+
+    parser = argparse.ArgumentParser(description="Manage kiosk admin passwords")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--migrate", action="store_true", help="hash all plaintext passwords")
+    action.add_argument("--set-password", metavar="USERNAME", help="set a user's password")
+    action.add_argument("--benchmark", action="store_true", help="time one hash with the current cost")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        start = time.perf_counter()
+        hash_password("benchmark")
+        print(f"scrypt log2n={DEFAULT_LOG2N} r={DEFAULT_R} p={DEFAULT_P}: "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms per login")
+        return
+
+    db = Database()
+    try:
+        if args.migrate:
+            print(f"hashed {migrate_plaintext(db)} plaintext passwords")
+        else:
+            password = getpass.getpass("New password: ")
+            if password != getpass.getpass("Repeat: "):
+                raise SystemExit("Passwords do not match")
+            widen_password_column(db)
+            if not db.update_password_hash(args.set_password, hash_password(password)):
+                raise SystemExit(f"No user named {args.set_password}")
+            print("password updated")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# ---------------- Face Index Benchmark ----------------
+# Recall@1 and per-query latency of the IVF index against the exact scan on
+# synthetic, L2-normalized embeddings.
+#
+#   python -m kiosk.bench_index --sizes 1000 10000 100000 --probes 4 16 32 64
+
+import argparse
+import time
+
+import numpy as np
+
+from kiosk.face_index import ExactIndex, IVFIndex
+
+
+def make_gallery(n, dim, rng):
+    gallery = rng.standard_normal((n, dim)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    return gallery
+
+
+def make_queries(gallery, n_queries, noise, rng):
+    # A probe is a noisy re-capture of an enrolled face
+    picks = rng.choice(len(gallery), n_queries, replace=False)
+    queries = gallery[picks] + noise * rng.standard_normal((n_queries, gallery.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def time_queries(index, queries):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        ids, _ = index.search(q, k=1)
+        results.append(int(ids[0]))
+    elapsed = time.perf_counter() - start
+    return np.asarray(results), elapsed / len(queries) * 1000
+
+
+def run(sizes, probes, dim, n_queries, noise, seed):
+    rng = np.random.default_rng(seed)
+    print(f"{'size':>8} {'index':>10} {'n_probe':>8} {'build_s':>8} {'ms/query':>9} {'recall@1':>9}")
+
+    for n in sizes:
+        gallery = make_gallery(n, dim, rng)
+        ids = np.arange(n, dtype=np.int64)
+        queries = make_queries(gallery, min(n_queries, n), noise, rng)
+
+        exact = ExactIndex()
+        exact.build(gallery, ids)
+        truth, exact_ms = time_queries(exact, queries)
+        print(f"{n:>8} {'exact':>10} {'-':>8} {0.0:>8.2f} {exact_ms:>9.3f} {1.0:>9.3f}")
+
+        ivf = IVFIndex(seed=seed)
+        start = time.perf_counter()
+        ivf.build(gallery, ids)
+        build_s = time.perf_counter() - start
+
+        for n_probe in probes:
+            ivf.n_probe = n_probe
+            found, ivf_ms = time_queries(ivf, queries)
+            recall = float(np.mean(found == truth))
+            print(f"{n:>8} {'ivf':>10} {n_probe:>8} {build_s:>8.2f} {ivf_ms:>9.3f} {recall:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face index recall vs latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 16, 32, 64])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.probes, args.dim, args.queries, args.noise, args.seed)
+
+
+if __name__ == "__main__":
+    main()
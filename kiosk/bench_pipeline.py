@@ -0,0 +1,323 @@
+# ---------------- Headless Pipeline Benchmark ----------------
+# Replays a video, an image folder or generated frames through the same
+# FrameProcessor the kiosk uses, with a stand-in detector/embedder, a
+# synthetic gallery and an in-memory SQLite stand-in for Postgres.
+#
+#   python -m kiosk.bench_pipeline --video door.mp4 --gallery 10000
+#   python -m kiosk.bench_pipeline --images frames/ --detect-every 1
+#   python -m kiosk.bench_pipeline --frames 600 --faces 3 --detect-ms 80
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from kiosk.attendance import AttendanceBuffer
+from kiosk.gallery import EmbeddingGallery
+from kiosk.recognizer import FrameProcessor
+from kiosk.tracking import FaceTracker
+
+try:
+    import resource
+except ImportError:   # Windows kiosks: only the tracemalloc peak is reported
+    resource = None
+
+STAGES = ["capture", "track", "detect", "embed", "match", "log", "draw", "render"]
+
+
+# ---------------- SQLite Stand-in ----------------
+class SQLiteDatabase:
+    # Implements the kiosk.db.Database methods the pipeline calls
+    RETRY_ERRORS = (sqlite3.OperationalError,)
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE students (
+                student_id INTEGER PRIMARY KEY,
+                first_name TEXT, last_name TEXT, course TEXT, section TEXT,
+                face_embedding BLOB NOT NULL, face_photo BLOB, created_at TEXT
+            );
+            CREATE TABLE attendance (
+                id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL, timestamp TEXT
+            );
+        """)
+
+    def _query(self, sql, params=(), many=False):
+        with self.lock:
+            cursor = self.conn.executemany(sql, params) if many else self.conn.execute(sql, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return rows
+
+    def ping(self):
+        return True
+
+    def load_embeddings(self):
+        return self._query("SELECT student_id, face_embedding FROM students")
+
+    def fetch_profile(self, student_id):
+        rows = self._query("SELECT student_id, first_name, last_name, course, section "
+                           "FROM students WHERE student_id = ?", (student_id,))
+        return rows[0] if rows else None
+
+    def fetch_photo(self, student_id):
+        rows = self._query("SELECT face_photo FROM students WHERE student_id = ?", (student_id,))
+        return rows[0][0] if rows else None
+
+    def insert_student(self, first_name, last_name, course, section, embedding_bytes, photo_bytes):
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO students (first_name, last_name, course, section, face_embedding, face_photo, created_at) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (first_name, last_name, course, section, embedding_bytes, photo_bytes, datetime.now().isoformat()))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def attendance_marked_today(self):
+        today = datetime.now().date().isoformat()
+        return {row[0] for row in self._query(
+            "SELECT DISTINCT student_id FROM attendance WHERE timestamp >= ?", (today,))}
+
+    def insert_attendance(self, rows):
+        self._query("INSERT INTO attendance (student_id, timestamp) VALUES (?, ?)",
+                    [(sid, ts.isoformat()) for sid, ts in rows], many=True)
+        return len(rows)
+
+
+# ---------------- Stand-in Face Model ----------------
+class StandInFace(dict):
+    # Same attribute-style access as insightface.app.common.Face
+    def __getattr__(self, name):
+        return self.get(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class StandInFaceModel:
+    # Detector: a downscale + grayscale pass and fixed boxes (plus an optional
+    # sleep to emulate model cost). Embedder: each face slot has a fixed
+    # identity vector; a random projection of the 16x16 crop thumbnail only
+    # jitters it (cosine >= ~0.99), so the panning background still costs the
+    # same work but every frame matches the enrolled slot and gets logged.
+    JITTER = 0.1
+
+    def __init__(self, dim=512, faces_per_frame=1, detect_ms=0.0, embed_ms=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((256, dim)).astype(np.float32)
+        identities = rng.standard_normal((faces_per_frame, dim)).astype(np.float32)
+        self.identities = identities / np.linalg.norm(identities, axis=1, keepdims=True)
+        self.faces_per_frame = faces_per_frame
+        self.detect_ms = detect_ms
+        self.embed_ms = embed_ms
+
+    def detect(self, frame):
+        small = cv2.resize(frame, (320, 240))
+        cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.detect_ms:
+            time.sleep(self.detect_ms / 1000)
+
+        h, w = frame.shape[:2]
+        slot = w / self.faces_per_frame
+        size = min(slot * 0.8, h * 0.4)
+        faces = []
+        for i in range(self.faces_per_frame):
+            cx, cy = slot * (i + 0.5), h * 0.45
+            bbox = np.array([cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2], dtype=np.float32)
+            kps = np.tile(np.array([cx, cy], dtype=np.float32), (5, 1))
+            faces.append(StandInFace(bbox=bbox, kps=kps, det_score=0.99))
+        return faces
+
+    def embed(self, frame, faces):
+        if self.embed_ms:
+            time.sleep(self.embed_ms * len(faces) / 1000)
+        width = frame.shape[1]
+        thumbs, slots = [], []
+        for face in faces:
+            x1, y1, x2, y2 = face.bbox.astype(int)
+            crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+            thumbs.append(cv2.resize(gray, (16, 16)).astype(np.float32).reshape(-1) / 255.0 - 0.5)
+            slots.append(min(int((x1 + x2) / 2 / width * self.faces_per_frame), self.faces_per_frame - 1))
+        jitter = np.vstack(thumbs) @ self.projection
+        norms = np.linalg.norm(jitter, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        feats = self.identities[slots] + self.JITTER * jitter / norms
+        for face, feat in zip(faces, feats):
+            face.embedding = feat
+        return feats
+
+
+# ---------------- Frame Sources ----------------
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def image_frames(folder):
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")):
+            frame = cv2.imread(os.path.join(folder, name))
+            if frame is not None:
+                yield frame
+
+
+def synthetic_frames(count, width=1280, height=720, seed=0):
+    # A textured background panning slowly, so tracking has something to follow
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur((rng.random((height, width + 200, 3)) * 255).astype(np.uint8), (7, 7), 0)
+    for i in range(count):
+        offset = int(100 + 60 * np.sin(i / 30))
+        yield np.ascontiguousarray(base[:, offset:offset + width])
+
+
+# ---------------- Benchmark ----------------
+def build_gallery(db, model, first_frame, size, dim, seed, storage="float32"):
+    rng = np.random.default_rng(seed)
+
+    # The faces in the replay are enrolled so match and log run for real
+    faces = model.detect(first_frame)
+    for i, feat in enumerate(model.embed(first_frame, faces)):
+        db.insert_student(f"Replay{i}", "Student", "BSCS", "A", feat.astype(np.float32).tobytes(), None)
+
+    with db.lock:
+        for start in range(0, size, 5000):
+            n = min(5000, size - start)
+            vectors = rng.standard_normal((n, dim)).astype(np.float32)
+            db.conn.executemany(
+                "INSERT INTO students (first_name, last_name, course, section, face_embedding) VALUES (?,?,?,?,?)",
+                [(f"Synthetic{start + j}", "Student", "BSIT", "B", v.tobytes()) for j, v in enumerate(vectors)])
+        db.conn.commit()
+
+    gallery = EmbeddingGallery(dim=dim, storage=storage)
+    gallery.load(db.load_embeddings())
+    return gallery
+
+
+def percentile_table(samples, frames, wall_s, peak_traced, peak_rss_kb):
+    print(f"{'stage':>8} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for stage in STAGES:
+        values = samples.get(stage)
+        if not values:
+            continue
+        arr = np.asarray(values)
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        print(f"{stage:>8} {len(arr):>6} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {arr.mean():>8.2f}")
+    print()
+    print(f"frames: {frames}  wall: {wall_s:.2f}s  fps: {frames / wall_s if wall_s else 0:.1f}")
+    rss = f"{peak_rss_kb / 1024:.1f} MB" if peak_rss_kb is not None else "n/a"
+    print(f"peak traced memory: {peak_traced / 1e6:.1f} MB  peak RSS: {rss}")
+
+
+def run(args):
+    if args.video:
+        source = video_frames(args.video)
+    elif args.images:
+        source = image_frames(args.images)
+    else:
+        source = synthetic_frames(args.frames)
+
+    first_frame = next(source, None)
+    if first_frame is None:
+        raise SystemExit("No frames to replay")
+
+    tracemalloc.start()
+    db = SQLiteDatabase()
+    model = StandInFaceModel(dim=args.dim, faces_per_frame=args.faces,
+                             detect_ms=args.detect_ms, embed_ms=args.embed_ms, seed=args.seed)
+    gallery = build_gallery(db, model, first_frame, args.gallery, args.dim, args.seed, args.storage)
+
+    spool_path = os.path.join(tempfile.mkdtemp(), "attendance_spool.jsonl")
+    attendance = AttendanceBuffer(db, spool_path)
+    attendance.seed()
+    processor = FrameProcessor(
+        detect=model.detect,
+        embed=model.embed,
+        gallery=gallery,
+        db=db,
+        attendance=attendance,
+        tracker=FaceTracker(detect_every=args.detect_every),
+        threshold=args.threshold,
+    )
+
+    samples = {stage: [] for stage in STAGES}
+    render_buf = np.empty_like(first_frame)
+    frames = 0
+
+    def frames_with_first():
+        yield first_frame
+        yield from source
+
+    iterator = frames_with_first()
+    start = time.perf_counter()
+    while args.max_frames is None or frames < args.max_frames:
+        t0 = time.perf_counter()
+        frame = next(iterator, None)
+        if frame is None:
+            break
+        samples["capture"].append((time.perf_counter() - t0) * 1000)
+
+        result = processor.process(frame)
+        for stage, ms in result.timings.items():
+            samples.setdefault(stage, []).append(ms)
+
+        # Stand-in for the texture upload: one contiguous copy of the frame
+        t0 = time.perf_counter()
+        if render_buf.shape != result.frame.shape:
+            render_buf = np.empty_like(result.frame)
+        np.copyto(render_buf, result.frame)
+        samples["render"].append((time.perf_counter() - t0) * 1000)
+        frames += 1
+    wall_s = time.perf_counter() - start
+
+    attendance.flush()
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+    print(f"gallery: {len(gallery)} ({args.storage}, {gallery.nbytes / 1e6:.1f} MB)  faces/frame: {args.faces}  detect_every: {args.detect_every}")
+    percentile_table(samples, frames, wall_s, peak_traced, peak_rss_kb)
+
+    # A stage that never ran means the replay did not exercise the pipeline
+    missing = [stage for stage in STAGES if not samples.get(stage)]
+    if missing:
+        raise SystemExit(f"No samples for stage(s): {', '.join(missing)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless recognition pipeline benchmark")
+    parser.add_argument("--video", help="video file to replay")
+    parser.add_argument("--images", help="directory of frames to replay")
+    parser.add_argument("--frames", type=int, default=300, help="generated frames when no source is given")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--gallery", type=int, default=5000, help="synthetic enrolled students")
+    parser.add_argument("--faces", type=int, default=1, help="faces per frame")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--storage", choices=["float32", "float16", "int8"], default="float32",
+                        help="in-memory gallery precision")
+    parser.add_argument("--detect-every", type=int, default=5)
+    parser.add_argument("--detect-ms", type=float, default=0.0, help="simulated detector cost")
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="simulated recognizer cost per face")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
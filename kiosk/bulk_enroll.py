@@ -0,0 +1,254 @@
+# ---------------- Bulk Offline Enrollment ----------------
+# Enrolls a whole list of students from photos instead of one at a time at
+# the kiosk. Detection and embedding run in a process pool, students are
+# written to Postgres in batches, and a state file next to the input records
+# what is done so an interrupted import resumes where it stopped.
+#
+#   python -m kiosk.bulk_enroll --csv students.csv
+#   python -m kiosk.bulk_enroll --photos photos/ --workers 8 --batch-size 200
+#
+# CSV columns: first_name, last_name, course, section, photo. `photo` holds
+# one or more image paths (relative to the CSV) separated by ";".
+# Photo folders: each image is named First_Last_Course_Section.jpg, or a
+# sub-folder with that name holds several images of the same student.
+#
+# A face that matches an enrolled student, or an earlier record of the same
+# import, is not inserted but recorded as "duplicate"; --allow-duplicates
+# imports such records anyway.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from kiosk.db import Database
+from kiosk.duplicates import DUPLICATE_THRESHOLD, find_duplicate
+from kiosk.embedding_codec import DTYPES, decode_templates, dequantize, encode_templates
+from kiosk.enrollment import EnrollmentSession
+from kiosk.gallery import EmbeddingGallery
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+FIELDS = ("first_name", "last_name", "course", "section")
+
+
+# ---------------- Input Records ----------------
+# A record is (key, (first_name, last_name, course, section), [image paths]);
+# the key identifies it in the resume state file.
+def csv_records(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            fields = tuple((row.get(name) or "").strip() for name in FIELDS)
+            photos = [os.path.join(base, p.strip()) for p in (row.get("photo") or "").split(";") if p.strip()]
+            yield f"{line_no}:{'|'.join(fields)}", fields, photos
+
+
+def folder_records(folder):
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            photos = [os.path.join(path, p) for p in sorted(os.listdir(path))
+                      if p.lower().endswith(IMAGE_EXTENSIONS)]
+            stem = name
+        elif name.lower().endswith(IMAGE_EXTENSIONS):
+            photos = [path]
+            stem = os.path.splitext(name)[0]
+        else:
+            continue
+        # Extra underscores belong to the last name (First_Dela_Cruz_BSCS_A)
+        parts = stem.split("_")
+        fields = (parts[0], " ".join(parts[1:-2]), parts[-2], parts[-1]) if len(parts) >= 4 else ()
+        yield name, fields, photos
+
+
+# ---------------- Worker Process ----------------
+_face_app = None
+
+
+def init_worker(det_size, workers):
+    # Each process gets its share of the cores, not one ONNX thread per core
+    global _face_app
+    from kiosk.inference import load_face_app
+    _face_app = load_face_app(det_size=det_size, workers=workers)
+
+
+def read_image(path):
+    # imdecode handles non-ASCII paths that cv2.imread cannot open on Windows
+    data = np.fromfile(path, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+
+
+def embed_record(record, templates=1, min_samples=1, dtype="float32"):
+    # Runs in a worker: same quality gates and template averaging as the kiosk
+    from kiosk.inference import detect_faces, embed_faces
+
+    key, fields, photos = record
+    if len(fields) != len(FIELDS) or not all(fields):
+        return key, None, "missing name, course or section"
+    if not photos:
+        return key, None, "no photos"
+
+    session = EnrollmentSession(samples=len(photos), window_s=float("inf"),
+                                min_samples=min_samples, templates=templates)
+    for path in photos:
+        image = read_image(path)
+        if image is None:
+            session.rejected["unreadable image"] = session.rejected.get("unreadable image", 0) + 1
+            continue
+        faces = detect_faces(_face_app, image)
+        if not faces:
+            session.rejected["no face"] = session.rejected.get("no face", 0) + 1
+            continue
+        # Portraits may catch someone in the background; keep the largest face
+        face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+        embed_faces(_face_app, image, [face])
+        session.add(image, face)
+
+    if not session.succeeded:
+        return key, None, ", ".join(sorted(session.rejected)) or "no usable photo"
+    row = (*fields, encode_templates(session.templates_matrix(), dtype=dtype), session.best_photo())
+    return key, row, None
+
+
+# ---------------- Resume State ----------------
+class ImportState:
+    # Append-only JSONL of {"key", "status", ...}; the last entry per key wins
+    def __init__(self, path):
+        self.path = path
+        self.status = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.status[entry["key"]] = entry["status"]
+
+    def record(self, entries):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                self.status[entry["key"]] = entry["status"]
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ---------------- Import ----------------
+def run(args):
+    if args.csv:
+        records = list(csv_records(args.csv))
+        source = args.csv
+    else:
+        records = list(folder_records(args.photos))
+        source = os.path.abspath(args.photos).rstrip(os.sep)
+
+    state = ImportState(args.state or f"{source}.enroll-state.jsonl")
+    skip = {"done", "failed", "duplicate"} if args.skip_failed else {"done"}
+    todo = [r for r in records if state.status.get(r[0]) not in skip]
+    print(f"{len(records)} records, {len(records) - len(todo)} already imported, {len(todo)} to process")
+    if not todo:
+        return 0
+
+    db = Database()
+    batch, failed, duplicates, imported = [], 0, 0, 0
+    start = time.perf_counter()
+
+    # Everyone already enrolled, plus the records accepted so far in this
+    # import under provisional negative ids
+    gallery = EmbeddingGallery()
+    if not args.allow_duplicates:
+        gallery.load(db.load_embeddings())
+    provisional = {}
+
+    def check_duplicate(key, row):
+        if args.allow_duplicates:
+            return None
+        record = decode_templates(row[4])
+        templates = dequantize(record.vectors, record.scales)
+        match = find_duplicate(gallery, templates, args.duplicate_threshold)
+        if match is None:
+            provisional[-len(provisional) - 1] = key
+            gallery.add(-len(provisional), templates)
+            return None
+        student_id, score = match
+        if student_id < 0:
+            return {"key": key, "status": "duplicate", "of_record": provisional[student_id],
+                    "score": round(score, 4)}
+        return {"key": key, "status": "duplicate", "of_student_id": student_id, "score": round(score, 4)}
+
+    def flush():
+        nonlocal imported
+        if not batch:
+            return
+        ids = db.insert_students([row for _key, row in batch])
+        # Only recorded after the commit, so a crash re-imports at most this batch
+        state.record({"key": key, "status": "done", "student_id": student_id}
+                     for (key, _row), student_id in zip(batch, ids))
+        imported += len(batch)
+        batch.clear()
+
+    try:
+        with Pool(args.workers, initializer=init_worker, initargs=(tuple(args.det_size), args.workers)) as pool:
+            jobs = pool.imap_unordered(_embed_job, [(r, args.templates, args.min_samples, args.dtype) for r in todo],
+                                       chunksize=args.chunksize)
+            for done, (key, row, error) in enumerate(jobs, start=1):
+                if row is None:
+                    failed += 1
+                    state.record([{"key": key, "status": "failed", "reason": error}])
+                elif (duplicate := check_duplicate(key, row)) is not None:
+                    duplicates += 1
+                    state.record([duplicate])
+                else:
+                    batch.append((key, row))
+                    if len(batch) >= args.batch_size:
+                        flush()
+                if done % 100 == 0 or done == len(todo):
+                    rate = done / (time.perf_counter() - start)
+                    print(f"  {done}/{len(todo)}  imported {imported + len(batch)}  failed {failed}  "
+                          f"duplicates {duplicates}  {rate:.1f} records/s", flush=True)
+            flush()
+    finally:
+        db.close()
+
+    print(f"imported {imported}, failed {failed}, duplicates {duplicates} in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"failures are listed in {state.path}; fix them and re-run to retry")
+    if duplicates:
+        print(f"suspected duplicates are listed in {state.path}; re-run with --allow-duplicates to import them")
+    return 1 if failed or duplicates else 0
+
+
+def _embed_job(job):
+    record, templates, min_samples, dtype = job
+    return embed_record(record, templates, min_samples, dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-enroll students from photos")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV of student records with photo paths")
+    source.add_argument("--photos", help="folder of First_Last_Course_Section photos")
+    parser.add_argument("--state", help="resume state file (default: next to the input)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="detection/embedding processes")
+    parser.add_argument("--batch-size", type=int, default=200, help="students per INSERT")
+    parser.add_argument("--chunksize", type=int, default=4, help="records handed to a worker at a time")
+    parser.add_argument("--templates", type=int, default=1, help="templates per student")
+    parser.add_argument("--min-samples", type=int, default=1, help="usable photos required per student")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float32", help="stored embedding precision")
+    parser.add_argument("--det-size", type=int, nargs=2, default=(640, 640))
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry records that failed before")
+    parser.add_argument("--duplicate-threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help="similarity at which a face counts as already enrolled")
+    parser.add_argument("--allow-duplicates", action="store_true", help="import suspected duplicates too")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
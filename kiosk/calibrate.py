@@ -0,0 +1,177 @@
+# ---------------- Inference Profile Calibration ----------------
+# Picks the fastest inference profile whose recognition accuracy on a local
+# validation set stays within --tolerance of the best profile, and saves the
+# choice where the kiosk looks for it (KIOSK_INFERENCE_PROFILE=auto).
+#
+#   python -m kiosk.calibrate --quantize                  write *.int8.onnx model variants
+#   python -m kiosk.calibrate --validation val/ --tolerance 0.01
+#
+# The validation folder holds one sub-folder per person with a few photos
+# each, ideally taken with the kiosk's own camera. A person with a single
+# photo acts as a stranger who must not match anyone.
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from kiosk.bulk_enroll import IMAGE_EXTENSIONS, read_image
+from kiosk.gallery import normalize_rows
+from kiosk.inference import (PROFILE_PATH, PROFILES, detect_faces, embed_faces, int8_model_path, load_face_app,
+                             model_files, warm_up)
+
+
+# ---------------- Validation Set ----------------
+def validation_images(folder):
+    # [(label, path)] from folder/<person>/<image>
+    images = []
+    for label in sorted(os.listdir(folder)):
+        person = os.path.join(folder, label)
+        if os.path.isdir(person):
+            images.extend((label, os.path.join(person, name)) for name in sorted(os.listdir(person))
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+    return images
+
+
+def identification_accuracy(labels, embeddings, threshold):
+    # Leave-one-out: each photo is matched against all the others. It is
+    # correct when its best match is the same person above the threshold, or,
+    # for people with a single photo, when nothing reaches the threshold.
+    # Photos where no face was found count as errors.
+    valid = [i for i, e in enumerate(embeddings) if e is not None]
+    if len(valid) < 2:
+        return 0.0
+    matrix = normalize_rows(np.vstack([embeddings[i] for i in valid]))
+    scores = matrix @ matrix.T
+    np.fill_diagonal(scores, -np.inf)
+    best = np.argmax(scores, axis=1)
+
+    counts = {}
+    for label in labels:
+        counts[label] = counts.get(label, 0) + 1
+    correct = 0
+    for row, i in enumerate(valid):
+        score, match = scores[row, best[row]], labels[valid[best[row]]]
+        if counts[labels[i]] > 1:
+            correct += score >= threshold and match == labels[i]
+        else:
+            correct += score < threshold
+    return correct / len(labels)
+
+
+# ---------------- Profile Evaluation ----------------
+def evaluate(profile, images, threshold, workers):
+    face_app = load_face_app(profile=profile, workers=workers)
+    warm_up(face_app)
+
+    labels, embeddings, timings, missed = [], [], [], 0
+    for label, path in images:
+        image = read_image(path)
+        labels.append(label)
+        if image is None:
+            embeddings.append(None)
+            missed += 1
+            continue
+        start = time.perf_counter()
+        faces = detect_faces(face_app, image)
+        if faces:
+            face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+            embed_faces(face_app, image, [face])
+        timings.append((time.perf_counter() - start) * 1000)
+        if faces:
+            embeddings.append(face.embedding)
+        else:
+            embeddings.append(None)
+            missed += 1
+
+    return {
+        "profile": profile.name,
+        "ms_per_image": round(float(np.median(timings)), 2) if timings else float("inf"),
+        "accuracy": round(identification_accuracy(labels, embeddings, threshold), 4),
+        "missed": missed,
+    }
+
+
+def choose_profile(results, tolerance):
+    # Fastest profile within `tolerance` of the best accuracy
+    best_accuracy = max(r["accuracy"] for r in results)
+    candidates = [r for r in results if r["accuracy"] >= best_accuracy - tolerance]
+    return min(candidates, key=lambda r: r["ms_per_image"])
+
+
+def save_choice(path, choice, results, tolerance):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        "profile": choice["profile"],
+        "calibrated_at": datetime.now().isoformat(timespec="seconds"),
+        "tolerance": tolerance,
+        "results": results,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ---------------- int8 Model Variants ----------------
+def quantize_models():
+    # Dynamic int8 quantization of the weights; activations stay float
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    for model_file in model_files().values():
+        target = int8_model_path(model_file)
+        quantize_dynamic(model_file, target, weight_type=QuantType.QInt8)
+        before, after = os.path.getsize(model_file), os.path.getsize(target)
+        print(f"{os.path.basename(target)}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+def run(args):
+    if args.quantize:
+        quantize_models()
+        if not args.validation:
+            return 0
+
+    images = validation_images(args.validation)
+    if len({label for label, _path in images}) < 2:
+        print(f"{args.validation} needs sub-folders for at least two people")
+        return 1
+    print(f"{len(images)} validation photos, {len({label for label, _path in images})} people")
+
+    results = []
+    for name in args.profiles:
+        result = evaluate(PROFILES[name], images, args.threshold, args.workers)
+        results.append(result)
+        print(f"  {name:<10} {result['ms_per_image']:8.1f} ms/photo  accuracy {result['accuracy']:.2%}  "
+              f"no face {result['missed']}", flush=True)
+
+    choice = choose_profile(results, args.tolerance)
+    print(f"fastest within {args.tolerance:.1%} of the best accuracy: {choice['profile']}")
+    if not args.dry_run:
+        save_choice(args.output, choice, results, args.tolerance)
+        print(f"saved to {args.output}; kiosks with KIOSK_INFERENCE_PROFILE=auto will use it")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the fastest inference profile for this machine")
+    parser.add_argument("--validation", help="folder with one sub-folder of photos per person")
+    parser.add_argument("--quantize", action="store_true", help="write int8 variants of the models first")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--tolerance", type=float, default=0.01, help="accuracy the chosen profile may lose")
+    parser.add_argument("--threshold", type=float, default=0.5, help="recognition threshold used by the kiosk")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("KIOSK_INFERENCE_WORKERS", "2")),
+                        help="inference workers sharing the cores, as on the kiosk")
+    parser.add_argument("--output", default=PROFILE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="report only, do not save the choice")
+    args = parser.parse_args()
+    if not args.validation and not args.quantize:
+        parser.error("give --validation and/or --quantize")
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
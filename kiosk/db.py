@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2.extras import execute_values
+
+
+# ---------------- Configuration ----------------
+DEFAULT_DB_CONFIG = {
+    "host": "localhost",
+    "port": 5432,
+    "database": "Attendance-DB",
+    "user": "postgres",
+    "password": "xd123",
+}
+
+ENV_KEYS = {
+    "host": "KIOSK_DB_HOST",
+    "port": "KIOSK_DB_PORT",
+    "database": "KIOSK_DB_NAME",
+    "user": "KIOSK_DB_USER",
+    "password": "KIOSK_DB_PASSWORD",
+}
+
+
+def load_db_config(path=None):
+    # defaults < JSON file (KIOSK_DB_CONFIG, default db_config.json) < env vars
+    config = dict(DEFAULT_DB_CONFIG)
+
+    path = path or os.environ.get("KIOSK_DB_CONFIG", "db_config.json")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+
+    for key, env_key in ENV_KEYS.items():
+        if os.environ.get(env_key):
+            config[key] = os.environ[env_key]
+    config["port"] = int(config["port"])
+    return config
+
+
+# ---------------- Prepared Statements ----------------
+# Hot queries are PREPAREd once per pooled connection and then EXECUTEd
+PREPARED = {
+    "kiosk_login": (
+        "SELECT username, password, role FROM users WHERE username = $1",
+        1,
+    ),
+    "kiosk_gallery": (
+        "SELECT student_id, face_embedding FROM students",
+        0,
+    ),
+    "kiosk_gallery_since": (
+        "SELECT student_id, face_embedding, COALESCE(created_at, '-infinity') AS enrolled_at FROM students "
+        "WHERE (COALESCE(created_at, '-infinity'), student_id) > ($1::timestamp, $2) "
+        "ORDER BY enrolled_at, student_id",
+        2,
+    ),
+    "kiosk_profile": (
+        "SELECT student_id, first_name, last_name, course, section FROM students WHERE student_id = $1",
+        1,
+    ),
+    "kiosk_attendance_insert": (
+        "INSERT INTO attendance (student_id, timestamp) VALUES ($1, $2)",
+        2,
+    ),
+    # Partitioned schema (kiosk.migrate_attendance): the unique
+    # (student_id, attendance_date) key drops repeat marks in the same round trip
+    "kiosk_attendance_mark": (
+        # $2 is cast to timestamp first; a bare $2::date makes PREPARE deduce two types for it
+        "INSERT INTO attendance (student_id, timestamp, attendance_date) VALUES ($1, $2, $2::timestamp::date) "
+        "ON CONFLICT (student_id, attendance_date) DO NOTHING RETURNING student_id",
+        2,
+    ),
+}
+
+
+class KioskConnection(psycopg2.extensions.connection):
+    # Remembers which statements were already prepared on this session
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+# ---------------- Database ----------------
+class Database:
+    # Thread-safe data-access layer for the kiosk. Every method borrows a
+    # pooled connection, commits or rolls back, and retries once the pool has
+    # dropped connections that died with the server.
+    RETRY_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def __init__(self, config=None, minconn=1, maxconn=8, retries=2, retry_delay=0.5):
+        self.config = config or load_db_config()
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._dated_attendance = None
+
+    # --- Pool management (created lazily so the kiosk starts while the DB is down) ---
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn,
+                    connection_factory=KioskConnection, **self.config
+                )
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    @contextmanager
+    def connection(self):
+        pool = self._get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except self.RETRY_ERRORS:
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def run(self, fn):
+        # Run fn(cursor) in a transaction, reconnecting on connection errors
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as conn:
+                    with conn.cursor() as cursor:
+                        return fn(cursor)
+            except self.RETRY_ERRORS:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    def ping(self):
+        return self.run(lambda cursor: cursor.execute("SELECT 1") or True)
+
+    @staticmethod
+    def execute_prepared(cursor, name, params=()):
+        conn = cursor.connection
+        sql, n_params = PREPARED[name]
+        if name not in conn.prepared:
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            conn.prepared.add(name)
+        if n_params:
+            placeholders = ", ".join(["%s"] * n_params)
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    # --- Login (password verification lives in kiosk.auth) ---
+    def fetch_credentials(self, username):
+        # (username, stored password hash, role) or None
+        def query(cursor):
+            self.execute_prepared(cursor, "kiosk_login", (username,))
+            return cursor.fetchone()
+        return self.run(query)
+
+    def update_password_hash(self, username, password_hash):
+        def query(cursor):
+            cursor.execute("UPDATE users SET password = %s WHERE username = %s", (password_hash, username))
+            return cursor.rowcount
+        return self.run(query)
+
+    # --- Students ---
+    def load_embeddings(self):
+        def query(cursor):
+            self.execute_prepared(cursor, "kiosk_gallery")
+            return cursor.fetchall()
+        return self.run(query)
+
+    def load_embeddings_since(self, enrolled_at=None, student_id=0):
+        # Rows after the (created_at, student_id) watermark, oldest first
+        def query(cursor):
+            self.execute_prepared(cursor, "kiosk_gallery_since", (enrolled_at or "-infinity", student_id))
+            return cursor.fetchall()
+        return self.run(query)
+
+    def student_ids(self):
+        return self.run(lambda cursor: cursor.execute("SELECT student_id FROM students")
+                        or {row[0] for row in cursor.fetchall()})
+
+    def fetch_profile(self, student_id):
+        def query(cursor):
+            self.execute_prepared(cursor, "kiosk_profile", (student_id,))
+            return cursor.fetchone()
+        return self.run(query)
+
+    def fetch_photo(self, student_id):
+        def query(cursor):
+            cursor.execute("SELECT face_photo FROM students WHERE student_id = %s", (student_id,))
+            row = cursor.fetchone()
+            return bytes(row[0]) if row and row[0] else None
+        return self.run(query)
+
+    def insert_student(self, first_name, last_name, course, section, embedding_bytes, photo_bytes):
+        def query(cursor):
+            cursor.execute(
+                "INSERT INTO students (first_name, last_name, course, section, face_embedding, face_photo, created_at) "
+                "VALUES (%s,%s,%s,%s,%s,%s,NOW()) RETURNING student_id",
+                (first_name, last_name, course, section, embedding_bytes, photo_bytes)
+            )
+            return cursor.fetchone()[0]
+        return self.run(query)
+
+    def insert_students(self, rows):
+        # rows: (first_name, last_name, course, section, embedding_bytes, photo_bytes);
+        # one multi-row INSERT, student_ids returned in input order
+        def query(cursor):
+            result = execute_values(
+                cursor,
+                "INSERT INTO students (first_name, last_name, course, section, face_embedding, face_photo, created_at) "
+                "VALUES %s RETURNING student_id",
+                rows, template="(%s,%s,%s,%s,%s,%s,NOW())", page_size=len(rows) or 1, fetch=True
+            )
+            return [row[0] for row in result]
+        return self.run(query)
+
+    # --- Attendance ---
+    def dated_attendance(self):
+        # True once attendance has the stored attendance_date column; checked
+        # once per process, so kiosks are restarted after the migration
+        if self._dated_attendance is None:
+            def query(cursor):
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+                    "AND table_name = 'attendance' AND column_name = 'attendance_date'"
+                )
+                return cursor.fetchone() is not None
+            self._dated_attendance = self.run(query)
+        return self._dated_attendance
+
+    def attendance_marked_today(self):
+        def query(cursor):
+            if self.dated_attendance():
+                # Equality on the partition key: one partition, served by the unique index
+                cursor.execute("SELECT student_id FROM attendance WHERE attendance_date = CURRENT_DATE")
+            else:
+                cursor.execute(
+                    "SELECT DISTINCT student_id FROM attendance "
+                    "WHERE timestamp >= CURRENT_DATE AND timestamp < CURRENT_DATE + 1"
+                )
+            return {row[0] for row in cursor.fetchall()}
+        return self.run(query)
+
+    def insert_attendance(self, rows):
+        # Batches go out as one multi-row INSERT; a single mark uses the prepared statement.
+        # Returns how many rows were written; on the partitioned schema students
+        # another kiosk already marked that day are skipped by ON CONFLICT.
+        # The NOTIFY is delivered on commit and wakes the reports service's rollup refresh.
+        dated = self.dated_attendance()
+
+        def query(cursor):
+            if dated and len(rows) == 1:
+                self.execute_prepared(cursor, "kiosk_attendance_mark", rows[0])
+                written = len(cursor.fetchall())
+            elif dated:
+                written = len(execute_values(
+                    cursor,
+                    "INSERT INTO attendance (student_id, timestamp, attendance_date) VALUES %s "
+                    "ON CONFLICT (student_id, attendance_date) DO NOTHING RETURNING student_id",
+                    [(student_id, timestamp, timestamp.date()) for student_id, timestamp in rows],
+                    page_size=1000, fetch=True
+                ))
+            elif len(rows) == 1:
+                self.execute_prepared(cursor, "kiosk_attendance_insert", rows[0])
+                written = 1
+            else:
+                execute_values(cursor, "INSERT INTO attendance (student_id, timestamp) VALUES %s",
+                               rows, page_size=1000)
+                written = len(rows)
+            if written:
+                cursor.execute("NOTIFY attendance_inserted")
+            return written
+        return self.run(query)
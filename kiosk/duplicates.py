@@ -0,0 +1,245 @@
+# ---------------- Duplicate Enrollment Detection ----------------
+# Finds students enrolled more than once. Every template is compared with
+# every other one in fixed-size blocks (one block x block matmul at a time),
+# so 100k templates need a few MB of scores instead of an N x N matrix.
+# Students linked by a similarity above the threshold are clustered with
+# union-find and written to a merge report for an admin to review.
+#
+#   python -m kiosk.duplicates --report duplicates.csv
+#   python -m kiosk.duplicates --threshold 0.6 --report dup.csv --sql merge.sql
+#
+# The SQL file moves each cluster's attendance to the kept student and deletes
+# the others. Every table with a foreign key to students is re-pointed: the
+# live attendance table, attendance_legacy and the archived monthly
+# partitions. It is only written, never run: review the report first.
+
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+from kiosk.embedding_codec import DTYPES, dequantize
+
+DUPLICATE_THRESHOLD = 0.5   # same as the kiosk's recognition threshold
+BLOCK_ROWS = 2048           # 2048 x 2048 float32 scores = 16 MB per block
+
+
+# ---------------- Enrollment Check ----------------
+def find_duplicate(gallery, templates, threshold=DUPLICATE_THRESHOLD):
+    # Best (student_id, score) any of the new templates matches, or None
+    matches = [m for m in gallery.match_batch(templates, threshold) if m is not None]
+    return max(matches, key=lambda m: m[1]) if matches else None
+
+
+# ---------------- Blocked All-Pairs Similarity ----------------
+def _block(matrix, scales, start, end):
+    return dequantize(matrix[start:end], None if scales is None else scales[start:end])
+
+
+def similar_pairs(matrix, ids, threshold, scales=None, block_rows=BLOCK_ROWS, progress=None):
+    # Yields (ids_a, ids_b, scores) arrays for every template pair scoring
+    # >= threshold; rows must be L2-normalized. Templates of the same student
+    # are not reported. Only the upper triangle of blocks is computed.
+    n = len(ids)
+    ids = np.asarray(ids)
+    for i0 in range(0, n, block_rows):
+        i1 = min(i0 + block_rows, n)
+        a = _block(matrix, scales, i0, i1)
+        for j0 in range(i0, n, block_rows):
+            j1 = min(j0 + block_rows, n)
+            b = a if j0 == i0 else _block(matrix, scales, j0, j1)
+            scores = a @ b.T
+            rows, cols = np.nonzero(scores >= threshold)
+            if j0 == i0:
+                keep = rows < cols
+                rows, cols = rows[keep], cols[keep]
+            ids_a, ids_b = ids[i0 + rows], ids[j0 + cols]
+            distinct = ids_a != ids_b
+            if distinct.any():
+                yield ids_a[distinct], ids_b[distinct], scores[rows[distinct], cols[distinct]]
+        if progress:
+            progress(i1, n)
+
+
+def best_pair_scores(pair_batches):
+    # {(low_id, high_id): best template similarity}
+    best = {}
+    for ids_a, ids_b, scores in pair_batches:
+        for a, b, score in zip(ids_a.tolist(), ids_b.tolist(), scores.tolist()):
+            key = (a, b) if a < b else (b, a)
+            if score > best.get(key, -1.0):
+                best[key] = score
+    return best
+
+
+# ---------------- Clustering ----------------
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while x != root:   # path compression
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster_pairs(pairs):
+    # pairs: {(a, b): score} -> list of {"members", "edges"} sorted by size.
+    # Clusters are transitive, so a chain A~B~C groups A with C even when
+    # they do not match directly; the per-member best score shows that.
+    uf = UnionFind()
+    for a, b in pairs:
+        uf.union(a, b)
+    clusters = {}
+    for (a, b), score in pairs.items():
+        cluster = clusters.setdefault(uf.find(a), {"members": set(), "edges": {}})
+        cluster["members"].update((a, b))
+        cluster["edges"][(a, b)] = score
+    return sorted(clusters.values(), key=lambda c: (-len(c["members"]), min(c["members"])))
+
+
+# ---------------- Merge Report ----------------
+def fetch_details(db, student_ids):
+    # {student_id: (first_name, last_name, course, section, created_at, attendance_count)}
+    def query(cursor):
+        cursor.execute(
+            "SELECT s.student_id, s.first_name, s.last_name, s.course, s.section, s.created_at, "
+            "(SELECT count(*) FROM attendance a WHERE a.student_id = s.student_id) "
+            "FROM students s WHERE s.student_id = ANY(%s)",
+            (list(student_ids),)
+        )
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+    return db.run(query)
+
+
+def choose_keeper(members, details):
+    # The record with the most attendance history wins; ties go to the oldest ID
+    return min(members, key=lambda sid: (-(details.get(sid, (0,) * 6)[5] or 0), sid))
+
+
+def write_report(path, clusters, details):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["cluster", "student_id", "action", "first_name", "last_name", "course", "section",
+                         "created_at", "attendance_count", "best_match_id", "best_score"])
+        for number, cluster in enumerate(clusters, start=1):
+            keeper = cluster["keeper"]
+            for sid in sorted(cluster["members"], key=lambda s: (s != keeper, s)):
+                best_id, best_score = max(
+                    ((b if a == sid else a, score) for (a, b), score in cluster["edges"].items() if sid in (a, b)),
+                    key=lambda e: e[1]
+                )
+                first_name, last_name, course, section, created_at, count = details.get(sid, ("",) * 4 + (None, 0))
+                writer.writerow([number, sid, "keep" if sid == keeper else "merge", first_name, last_name,
+                                 course, section, created_at.isoformat() if created_at else "", count,
+                                 best_id, f"{best_score:.4f}"])
+
+
+def referencing_tables(db):
+    # [(table, column, per_day)] for every table with a foreign key to
+    # students; attached partitions go through their parent. per_day tables
+    # have the attendance "timestamp" column and keep one mark per day.
+    def query(cursor):
+        cursor.execute(
+            "SELECT k.conrelid::regclass::text, a.attname, EXISTS ("
+            "  SELECT 1 FROM pg_attribute t WHERE t.attrelid = k.conrelid AND t.attname = 'timestamp'"
+            "  AND NOT t.attisdropped) "
+            "FROM pg_constraint k "
+            "JOIN pg_class c ON c.oid = k.conrelid "
+            "JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = k.conkey[1] "
+            "WHERE k.contype = 'f' AND k.confrelid = 'students'::regclass AND NOT c.relispartition "
+            "ORDER BY 1"
+        )
+        return cursor.fetchall()
+    return db.run(query)
+
+
+def write_merge_sql(path, clusters, tables=(("attendance", "student_id", True),)):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("-- Generated by kiosk.duplicates; review the report before running.\nBEGIN;\n")
+        for number, cluster in enumerate(clusters, start=1):
+            keeper = cluster["keeper"]
+            others = ", ".join(str(s) for s in sorted(cluster["members"] - {keeper}))
+            top = max(cluster["edges"].values())
+            f.write(f"\n-- cluster {number}: keep {keeper}, merge {others} (best similarity {top:.3f})\n")
+            for table, column, per_day in tables:
+                if per_day:
+                    # At most one mark per student and day may survive the merge
+                    f.write(f"DELETE FROM {table} a USING {table} b WHERE a.{column} IN ({others}) "
+                            f"AND b.{column} IN ({keeper}, {others}) AND b.timestamp::date = a.timestamp::date "
+                            f"AND b.id <> a.id AND (b.{column} = {keeper} OR b.id < a.id);\n")
+                f.write(f"UPDATE {table} SET {column} = {keeper} WHERE {column} IN ({others});\n")
+            f.write(f"DELETE FROM students WHERE student_id IN ({others});\n")
+        f.write("\nCOMMIT;\n")
+
+
+# ---------------- Batch Job ----------------
+def run(args):
+    from kiosk.db import Database
+    from kiosk.gallery import EmbeddingGallery
+
+    db = Database()
+    try:
+        gallery = EmbeddingGallery(dim=args.dim, storage=args.storage)
+        start = time.perf_counter()
+        gallery.load(db.load_embeddings())
+        students = len(np.unique(gallery.ids))
+        print(f"loaded {len(gallery)} templates of {students} students "
+              f"({gallery.nbytes / 1e6:.0f} MB) in {time.perf_counter() - start:.1f}s")
+        for reason, count in gallery.rejected.items():
+            print(f"  skipped {count} rows: {reason}")
+
+        def progress(done, total):
+            print(f"  compared {done}/{total} templates  {time.perf_counter() - start:.0f}s", flush=True)
+
+        start = time.perf_counter()
+        pairs = best_pair_scores(similar_pairs(gallery.matrix, gallery.ids, args.threshold, gallery.scales,
+                                               block_rows=args.block_rows, progress=progress))
+        clusters = cluster_pairs(pairs)
+        print(f"{len(pairs)} suspicious pairs in {len(clusters)} clusters "
+              f"({time.perf_counter() - start:.1f}s)")
+        if not clusters:
+            return 0
+
+        details = fetch_details(db, set().union(*(c["members"] for c in clusters)))
+        tables = referencing_tables(db)
+    finally:
+        db.close()
+
+    for cluster in clusters:
+        cluster["keeper"] = choose_keeper(cluster["members"], details)
+    write_report(args.report, clusters, details)
+    print(f"merge report written to {args.report}")
+    if args.sql:
+        write_merge_sql(args.sql, clusters, tables)
+        print(f"merge SQL written to {args.sql}")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find students enrolled more than once")
+    parser.add_argument("--report", default="duplicates.csv", help="CSV merge report")
+    parser.add_argument("--sql", help="also write a reviewable merge script")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="cosine similarity")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="templates per block")
+    parser.add_argument("--storage", choices=sorted(DTYPES), default="float32",
+                        help="in-memory precision (float16/int8 halve/quarter the gallery)")
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+    if args.threshold <= 0:
+        parser.error("--threshold must be positive")
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+
+# ---------------- Embedding Record Format ----------------
+# students.face_embedding layout (little-endian):
+#
+#   magic "KEMB" | version u8 | dtype u8 | flags u8 | pad | dim u16 | count u16
+#   | model name length u8 | model name (utf-8)
+#   | int8 only: count float32 per-template scales
+#   | count x dim values of `dtype`
+#
+# Rows written before the header existed are bare float32 bytes holding one
+# or more concatenated templates; they still decode (model unknown).
+MAGIC = b"KEMB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBBxHHB")
+FLAG_NORMALIZED = 0x01
+
+DTYPES = {"float32": 0, "float16": 1, "int8": 2}
+DTYPE_NAMES = {code: name for name, code in DTYPES.items()}
+
+# The recognizer in insightface's default model pack (w600k_r50)
+DEFAULT_MODEL = "buffalo_l"
+
+EmbeddingRecord = namedtuple("EmbeddingRecord", "model dim dtype normalized vectors scales")
+
+
+class EmbeddingFormatError(ValueError):
+    pass
+
+
+# ---------------- Quantization ----------------
+def quantize(templates, dtype):
+    # templates: (k, dim) float32. Returns (values, scales); scales only for int8
+    templates = np.asarray(templates, dtype=np.float32)
+    if dtype == "float32":
+        return templates, None
+    if dtype == "float16":
+        return templates.astype(np.float16), None
+    if dtype == "int8":
+        # Symmetric per-template scale: value = int8 * scale
+        peak = np.abs(templates).max(axis=1)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        values = np.clip(np.rint(templates / scales[:, None]), -127, 127).astype(np.int8)
+        return values, scales
+    raise EmbeddingFormatError(f"Unknown embedding dtype {dtype!r}")
+
+
+def dequantize(values, scales=None):
+    out = np.asarray(values, dtype=np.float32)
+    if scales is not None:
+        out = out * np.asarray(scales, dtype=np.float32)[:, None]
+    return out
+
+
+# ---------------- Encode / Decode ----------------
+def encode_templates(templates, model=DEFAULT_MODEL, dtype="float32"):
+    # templates: one (dim,) or several (k, dim) embeddings; stored L2-normalized
+    templates = np.asarray(templates, dtype=np.float32)
+    templates = templates.reshape(-1, templates.shape[-1])
+    norms = np.linalg.norm(templates, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    values, scales = quantize(templates / norms, dtype)
+
+    name = (model or "").encode("utf-8")
+    if len(name) > 255:
+        raise EmbeddingFormatError("Model name is too long")
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, DTYPES[dtype], FLAG_NORMALIZED,
+                         templates.shape[1], templates.shape[0], len(name)), name]
+    if scales is not None:
+        parts.append(scales.astype("<f4").tobytes())
+    parts.append(np.ascontiguousarray(values).tobytes())
+    return b"".join(parts)
+
+
+def is_versioned(data):
+    return bytes(data[:4]) == MAGIC
+
+
+def decode_templates(data, dim=None):
+    # Returns an EmbeddingRecord whose `vectors` still use the stored dtype
+    # (zero-copy views over `data`); `dim` is only needed for legacy rows
+    data = memoryview(data)
+    if not is_versioned(data):
+        if not dim or len(data) == 0 or len(data) % (4 * dim):
+            raise EmbeddingFormatError(f"Legacy embedding of {len(data)} bytes is not a multiple of {dim} floats")
+        vectors = np.frombuffer(data, dtype="<f4").reshape(-1, dim)
+        return EmbeddingRecord(None, dim, "float32", False, vectors, None)
+
+    if len(data) < HEADER.size:
+        raise EmbeddingFormatError("Truncated embedding header")
+    _magic, version, dtype_code, flags, rec_dim, count, name_len = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise EmbeddingFormatError(f"Unsupported embedding format version {version}")
+    if dtype_code not in DTYPE_NAMES:
+        raise EmbeddingFormatError(f"Unknown embedding dtype code {dtype_code}")
+    dtype = DTYPE_NAMES[dtype_code]
+
+    offset = HEADER.size
+    model = bytes(data[offset:offset + name_len]).decode("utf-8")
+    offset += name_len
+
+    scales = None
+    if dtype == "int8":
+        scales = np.frombuffer(data, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+
+    np_dtype = {"float32": "<f4", "float16": "<f2", "int8": "i1"}[dtype]
+    expected = offset + count * rec_dim * np.dtype(np_dtype).itemsize
+    if len(data) != expected:
+        raise EmbeddingFormatError(f"Embedding record is {len(data)} bytes, expected {expected}")
+    vectors = np.frombuffer(data, dtype=np_dtype, count=count * rec_dim, offset=offset).reshape(count, rec_dim)
+    return EmbeddingRecord(model or None, rec_dim, dtype, bool(flags & FLAG_NORMALIZED), vectors, scales)
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# ---------------- Face Quality ----------------
+def pose_offsets(kps):
+    # Rough yaw/pitch from the 5 detector landmarks (eyes, nose, mouth corners);
+    # both are ~0 for a frontal face
+    left_eye, right_eye, nose, left_mouth, right_mouth = np.asarray(kps, dtype=np.float32)[:5]
+    eye_mid = (left_eye + right_eye) / 2
+    mouth_mid = (left_mouth + right_mouth) / 2
+    eye_dist = np.linalg.norm(right_eye - left_eye)
+    span = mouth_mid[1] - eye_mid[1]
+    if eye_dist <= 0 or span <= 0:
+        return 1.0, 1.0
+    yaw = (nose[0] - eye_mid[0]) / eye_dist
+    pitch = (nose[1] - eye_mid[1]) / span - 0.5
+    return float(yaw), float(pitch)
+
+
+def sharpness(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def crop_face(frame, bbox, margin=0.2):
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = np.asarray(bbox, dtype=np.float32)
+    mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+    x1, y1 = int(max(x1 - mx, 0)), int(max(y1 - my, 0))
+    x2, y2 = int(min(x2 + mx, w)), int(min(y2 + my, h))
+    return frame[y1:y2, x1:x2]
+
+
+# ---------------- Enrollment Session ----------------
+class EnrollmentSession:
+    # Collects up to `samples` good frames of one face within `window_s`
+    # seconds and turns them into averaged, L2-normalized template(s).
+    # Frames failing the detector score, size, blur or pose gates are skipped.
+    MIN_DET_SCORE = 0.6
+    MIN_FACE_PX = 80
+    MIN_SHARPNESS = 60.0
+    MAX_YAW = 0.3
+    MAX_PITCH = 0.25
+
+    def __init__(self, samples=5, window_s=4.0, min_samples=3, templates=1):
+        self.target = samples
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.templates = templates
+        self.started = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._samples = []          # (quality, yaw, embedding, crop)
+        self.rejected = {}
+
+    # --- Called from the inference worker with the un-annotated frame ---
+    def add(self, frame, face):
+        if self.done:
+            return False
+        reason = self.check(frame, face)
+        if reason:
+            with self._lock:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            return False
+
+        crop = crop_face(frame, face.bbox)
+        yaw, pitch = pose_offsets(face.kps)
+        embedding = np.asarray(face.embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        quality = float(face.det_score) - abs(yaw) - abs(pitch)
+        with self._lock:
+            self._samples.append((quality, yaw, embedding, crop.copy()))
+        return True
+
+    def check(self, frame, face):
+        if face.get("embedding") is None or face.get("kps") is None:
+            return "no landmarks"
+        if float(face.det_score) < self.MIN_DET_SCORE:
+            return "low detector score"
+        x1, y1, x2, y2 = face.bbox
+        if min(x2 - x1, y2 - y1) < self.MIN_FACE_PX:
+            return "face too small"
+        yaw, pitch = pose_offsets(face.kps)
+        if abs(yaw) > self.MAX_YAW or abs(pitch) > self.MAX_PITCH:
+            return "not facing camera"
+        crop = crop_face(frame, face.bbox, margin=0.0)
+        if crop.size == 0 or sharpness(crop) < self.MIN_SHARPNESS:
+            return "blurry"
+        return None
+
+    # --- Progress ---
+    @property
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    @property
+    def done(self):
+        return self.count >= self.target or time.monotonic() - self.started >= self.window_s
+
+    @property
+    def succeeded(self):
+        return self.count >= self.min_samples
+
+    # --- Result ---
+    def templates_matrix(self):
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+
+        # Several templates split the samples by yaw so each covers a pose range
+        samples.sort(key=lambda s: s[1])
+        groups = np.array_split(np.arange(len(samples)), min(self.templates, len(samples)))
+        templates = []
+        for group in groups:
+            mean = np.mean([samples[i][2] for i in group], axis=0)
+            templates.append(mean / (np.linalg.norm(mean) or 1.0))
+        return np.vstack(templates).astype(np.float32)
+
+    def best_photo(self):
+        # Crop from the same detection as the best sample's embedding
+        with self._lock:
+            if not self._samples:
+                return None
+            best = max(self._samples, key=lambda s: s[0])
+        ok, buffer = cv2.imencode(".jpg", best[3])
+        return buffer.tobytes() if ok else None
@@ -0,0 +1,295 @@
+import hashlib
+import os
+
+import numpy as np
+
+from kiosk.embedding_codec import dequantize
+
+
+# ---------------- Exact Index ----------------
+class ExactIndex:
+    # Brute-force fallback: scores the query against every gallery row.
+    # It reads the gallery's own matrix, so it costs no extra memory. A
+    # float16/int8 matrix is scored in float32 blocks, never decoded whole.
+    name = "exact"
+    BLOCK_ROWS = 8192
+
+    def __init__(self):
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._scales = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def build(self, matrix, ids, scales=None):
+        self._matrix = matrix
+        self._ids = ids
+        self._scales = scales
+
+    def update(self, matrix, ids, scales=None):
+        # The gallery re-binds its grown views after every insert
+        self.build(matrix, ids, scales)
+        return False
+
+    def _scores(self, queries):
+        # (N, Q) similarities for (Q, d) queries
+        if self._matrix.dtype == np.float32:
+            return self._matrix @ queries.T
+        scores = np.empty((len(self._ids), len(queries)), dtype=np.float32)
+        for start in range(0, len(self._ids), self.BLOCK_ROWS):
+            end = start + self.BLOCK_ROWS
+            block = self._matrix[start:end].astype(np.float32) @ queries.T
+            if self._scales is not None:
+                block *= self._scales[start:end, None]
+            scores[start:end] = block
+        return scores
+
+    def search(self, query, k=1):
+        if len(self._ids) == 0:
+            return _empty_result()
+        scores = self._scores(query.reshape(1, -1))[:, 0]
+        return _top_k(scores, self._ids, k)
+
+    def search_batch(self, queries):
+        # Best match per query row from one (N x d) @ (d x Q) product
+        if len(self._ids) == 0:
+            return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), -np.inf, dtype=np.float32)
+        scores = self._scores(queries)
+        best = np.argmax(scores, axis=0)
+        return self._ids[best], scores[best, np.arange(len(queries))]
+
+
+# ---------------- IVF Index ----------------
+class IVFIndex:
+    # Inverted-file index: rows are bucketed by their nearest k-means centroid
+    # and a query only scans the n_probe closest buckets. Like ExactIndex it
+    # reads the gallery's own (possibly float16/int8) matrix: a bucket is a run
+    # of row positions in `order`, so the index adds 8 bytes per template.
+    # Rows appended after the last build form a tail that is always scanned.
+    # `fingerprint` identifies the gallery rows the index was built from.
+    name = "ivf"
+    FORMAT_VERSION = 3
+
+    def __init__(self, n_lists=None, n_probe=32, train_iters=12, train_sample=20000,
+                 rebuild_ratio=0.2, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_iters = train_iters
+        self.train_sample = train_sample
+        self.rebuild_ratio = rebuild_ratio
+        self.seed = seed
+
+        self.centroids = None
+        self.order = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.fingerprint = None
+        self.source_rows = 0
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._scales = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- Build ---
+    def build(self, matrix, ids, scales=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(ids)
+        self._matrix, self._ids, self._scales = matrix, ids, scales
+        self.fingerprint = content_fingerprint(matrix, ids, scales)
+        self.source_rows = n
+
+        if n == 0:
+            self.centroids = None
+            self.order = np.zeros(0, dtype=np.int64)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        rng = np.random.default_rng(self.seed)
+        if n > self.train_sample:
+            rows = np.sort(rng.choice(n, self.train_sample, replace=False))
+            sample = dequantize(matrix[rows], None if scales is None else scales[rows])
+        else:
+            sample = dequantize(matrix, scales)
+        self.centroids = _train_spherical_kmeans(sample, n_lists, self.train_iters, rng)
+
+        assign = _assign(matrix, self.centroids, scales)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=self.offsets[1:])
+
+    # --- Re-bind after the gallery appended rows ---
+    def update(self, matrix, ids, scales=None):
+        # The first source_rows rows must be unchanged; returns True if the
+        # tail grew large enough to retrain
+        if len(ids) - self.source_rows > max(64, self.rebuild_ratio * self.source_rows):
+            self.build(matrix, ids, scales)
+            return True
+        self._matrix, self._ids, self._scales = matrix, np.asarray(ids, dtype=np.int64), scales
+        return False
+
+    # --- Search ---
+    def _scores(self, rows, query):
+        block = self._matrix[rows]
+        scores = (block if block.dtype == np.float32 else block.astype(np.float32)) @ query
+        if self._scales is not None:
+            scores *= self._scales[rows]
+        return scores
+
+    def search(self, query, k=1):
+        cand_scores, cand_ids = [], []
+
+        if self.centroids is not None and self.source_rows:
+            centroid_scores = self.centroids @ query
+            n_probe = min(self.n_probe, len(centroid_scores))
+            probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+            for c in probe:
+                start, end = self.offsets[c], self.offsets[c + 1]
+                if start == end:
+                    continue
+                rows = self.order[start:end]
+                cand_scores.append(self._scores(rows, query))
+                cand_ids.append(self._ids[rows])
+
+        if len(self._ids) > self.source_rows:
+            tail = slice(self.source_rows, len(self._ids))
+            cand_scores.append(self._scores(tail, query))
+            cand_ids.append(self._ids[tail])
+
+        if not cand_scores:
+            return _empty_result()
+        return _top_k(np.concatenate(cand_scores), np.concatenate(cand_ids), k)
+
+    def search_batch(self, queries):
+        ids = np.full(len(queries), -1, dtype=np.int64)
+        scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            found, found_scores = self.search(query, k=1)
+            if len(found):
+                ids[i], scores[i] = found[0], found_scores[0]
+        return ids, scores
+
+    # --- Persistence ---
+    def save(self, path):
+        # Only the bucketing is saved; load_or_build_index binds the gallery's
+        # rows again and re-adds any tail
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.int64(self.FORMAT_VERSION),
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, 0), np.float32),
+                order=self.order,
+                offsets=self.offsets,
+                n_probe=np.int64(self.n_probe),
+                fingerprint=np.str_(self.fingerprint or ""),
+                source_rows=np.int64(self.source_rows),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        # The index is unbound until update() hands it the gallery's arrays
+        with np.load(path) as data:
+            if int(data["version"]) != cls.FORMAT_VERSION:
+                raise ValueError(f"Unsupported index version in {path}")
+            index = cls(n_probe=int(data["n_probe"]))
+            centroids = data["centroids"]
+            index.centroids = centroids if centroids.size else None
+            index.order = data["order"]
+            index.offsets = data["offsets"]
+            index.fingerprint = str(data["fingerprint"]) or None
+            index.source_rows = int(data["source_rows"])
+        index.n_lists = len(index.offsets) - 1
+        return index
+
+
+# ---------------- Load / Build ----------------
+def content_fingerprint(matrix, ids, scales=None):
+    # Hash of the rows, scales and IDs in gallery order; any re-enrolled,
+    # removed or re-ordered template changes it
+    matrix = np.ascontiguousarray(matrix)
+    digest = hashlib.sha1(f"{matrix.dtype.str}{matrix.shape[1:]}".encode())
+    digest.update(np.ascontiguousarray(ids, dtype=np.int64).data)
+    digest.update(matrix.data)
+    if scales is not None:
+        digest.update(np.ascontiguousarray(scales, dtype=np.float32).data)
+    return digest.hexdigest()
+
+
+def load_or_build_index(path, matrix, ids, scales=None, factory=IVFIndex):
+    # Reuse the persisted index when the gallery's first rows are still the
+    # ones it was built from; rows enrolled since become the tail, anything
+    # else (an updated embedding, a removal, a re-ordered load) forces a rebuild.
+    index = None
+    if path and os.path.exists(path):
+        try:
+            index = factory.load(path)
+        except Exception:
+            index = None
+
+    if index is not None:
+        n = index.source_rows
+        head = slice(0, n)
+        if (not index.fingerprint or n > len(ids) or len(index.order) != n
+                or content_fingerprint(matrix[head], ids[head], None if scales is None else scales[head])
+                != index.fingerprint):
+            index = None
+        elif not index.update(matrix, ids, scales):
+            return index
+
+    if index is None:
+        index = factory()
+        index.build(matrix, ids, scales)
+    if path:
+        index.save(path)
+    return index
+
+
+# ---------------- Helpers ----------------
+def _empty_result():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+
+def _top_k(scores, ids, k):
+    k = min(k, len(scores))
+    if k == len(scores):
+        top = np.argsort(-scores)
+    else:
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+    return ids[top], scores[top]
+
+
+def _assign(matrix, centroids, scales=None, chunk=16384):
+    # Nearest centroid per row, decoding float16/int8 rows one chunk at a time
+    assign = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), chunk):
+        end = start + chunk
+        block = dequantize(matrix[start:end], None if scales is None else scales[start:end])
+        assign[start:end] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _train_spherical_kmeans(sample, n_lists, iters, rng):
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=n_lists)
+
+        # Re-seed empty lists with random samples so no centroid goes dead
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
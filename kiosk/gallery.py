@@ -0,0 +1,236 @@
+import logging
+import threading
+
+import numpy as np
+
+from kiosk.embedding_codec import (DEFAULT_MODEL, EmbeddingFormatError, decode_templates,
+                                   dequantize, quantize)
+from kiosk.face_index import ExactIndex, IVFIndex, load_or_build_index
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Helpers ----------------
+def normalize(embedding):
+    vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return vec
+    return vec / norm
+
+
+def normalize_rows(block):
+    block = np.asarray(block, dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return block / norms
+
+
+# ---------------- Embedding Gallery ----------------
+class EmbeddingGallery:
+    # Enrolled embeddings live in one contiguous, L2-normalized matrix with a
+    # parallel array of student IDs, so a lookup is one mat-vec product.
+    # Matching is delegated to a pluggable index (exact scan by default).
+    # A student enrolled with several templates has one row per template.
+    # `storage` keeps the matrix as float32, float16 or int8 (+ per-row scale).
+    INITIAL_CAPACITY = 256
+    ANN_MIN_SIZE = 5000
+    LOAD_CHUNK = 4096
+
+    def __init__(self, dim=512, index=None, storage="float32", model=DEFAULT_MODEL):
+        self.dim = dim
+        self.index = index or ExactIndex()
+        self.index_path = None        # where use_ann_index persists the index
+        self.storage = storage
+        self.model = model
+        self.rejected = {}            # reason -> rows skipped by the last load
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((self.INITIAL_CAPACITY, dim), dtype=storage)
+        self._scales = np.ones(self.INITIAL_CAPACITY, dtype=np.float32) if storage == "int8" else None
+        self._ids = np.zeros(self.INITIAL_CAPACITY, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._size]
+
+    @property
+    def scales(self):
+        return None if self._scales is None else self._scales[:self._size]
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def nbytes(self):
+        size = self.matrix.nbytes + self.ids.nbytes
+        return size + (self.scales.nbytes if self._scales is not None else 0)
+
+    # --- Load once at startup ---
+    def load(self, rows):
+        # rows: (student_id, face_embedding bytes) pairs. Versioned records and
+        # legacy raw-float32 rows are both accepted; rows from another model or
+        # dimension are skipped and counted in `rejected`.
+        with self._lock:
+            self._size = 0
+            self.rejected = {}
+            self._extend(rows)
+            self._rebuild_index()
+        return self._size
+
+    # --- Rows enrolled since the last load or snapshot ---
+    def extend(self, rows):
+        with self._lock:
+            start = self._size
+            self._extend(rows)
+            if self.index.update(self.matrix, self.ids, self.scales):
+                self._save_index()
+        return self._size - start
+
+    # --- Adopt arrays as-is (e.g. memory-mapped from a local snapshot) ---
+    def attach(self, matrix, ids, scales=None):
+        if matrix.shape[1] != self.dim or matrix.dtype != np.dtype(self.storage):
+            raise ValueError(f"Expected ({self.dim},) {self.storage} rows, got {matrix.shape} {matrix.dtype}")
+        if (scales is None) != (self.storage != "int8"):
+            raise ValueError("int8 rows need per-row scales")
+        with self._lock:
+            # Capacity == size, so the first insert copies into fresh arrays
+            self._matrix = matrix
+            self._ids = ids
+            self._scales = scales
+            self._size = len(ids)
+            self.rejected = {}
+            self._rebuild_index()
+        return self._size
+
+    # --- Consistent copies of the arrays (for snapshots) ---
+    def export_arrays(self):
+        with self._lock:
+            arrays = {"embeddings": np.array(self.matrix), "ids": np.array(self.ids)}
+            if self._scales is not None:
+                arrays["scales"] = np.array(self.scales)
+        return arrays
+
+    def _extend(self, rows):
+        # Decode rows in chunks so a large load never holds every template twice
+        rejected = self.rejected
+        ids, blocks, pending = [], [], 0
+        for student_id, db_embedding in rows:
+            try:
+                record = decode_templates(db_embedding, self.dim)
+            except EmbeddingFormatError:
+                rejected["format"] = rejected.get("format", 0) + 1
+                continue
+            if record.dim != self.dim:
+                rejected["dimension"] = rejected.get("dimension", 0) + 1
+                continue
+            if record.model and self.model and record.model != self.model:
+                rejected["model"] = rejected.get("model", 0) + 1
+                continue
+            ids.extend([student_id] * len(record.vectors))
+            blocks.append(dequantize(record.vectors, record.scales))
+            pending += len(record.vectors)
+            if pending >= self.LOAD_CHUNK:
+                self._append(ids, np.vstack(blocks))
+                ids, blocks, pending = [], [], 0
+        if ids:
+            self._append(ids, np.vstack(blocks))
+
+    # --- Switch to the persisted ANN index for large galleries ---
+    def use_ann_index(self, path, factory=IVFIndex):
+        with self._lock:
+            if self._size < self.ANN_MIN_SIZE:
+                return False
+            self.index = load_or_build_index(path, self.matrix, self.ids, self.scales, factory)
+            self.index_path = path
+        return True
+
+    def _save_index(self):
+        # A rebuilt or retrained ANN index replaces the persisted one, so the
+        # next start reuses it instead of training again
+        if self.index_path and hasattr(self.index, "save"):
+            try:
+                self.index.save(self.index_path)
+            except OSError as e:
+                logger.warning("could not save the face index to %s: %s", self.index_path, e)
+
+    # --- Incremental insert (registration) ---
+    def add(self, student_id, embedding):
+        # embedding: one template (dim,) or several (k, dim)
+        flat = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if flat.shape[0] == 0 or flat.shape[0] % self.dim:
+            raise ValueError(f"Expected {self.dim}-d embedding(s), got {flat.shape[0]} values")
+        templates = normalize_rows(flat.reshape(-1, self.dim))
+
+        with self._lock:
+            self._append([student_id] * len(templates), templates)
+            if self.index.update(self.matrix, self.ids, self.scales):
+                self._save_index()
+
+    # --- Best match above threshold ---
+    def match(self, embedding, threshold):
+        vec = normalize(embedding)
+        with self._lock:
+            if self._size == 0 or vec.shape[0] != self.dim:
+                return None
+            ids, scores = self.index.search(vec, k=1)
+            if len(ids) == 0:
+                return None
+            student_id, score = int(ids[0]), float(scores[0])
+
+        if score < threshold:
+            return None
+        return student_id, score
+
+    # --- Best match per face for a whole frame ---
+    def match_batch(self, embeddings, threshold):
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+
+        with self._lock:
+            if self._size == 0 or len(queries) == 0:
+                return [None] * len(queries)
+            ids, scores = self.index.search_batch(queries)
+
+        return [
+            (int(student_id), float(score)) if student_id >= 0 and score >= threshold else None
+            for student_id, score in zip(ids, scores)
+        ]
+
+    # Normalized float32 rows go into the storage dtype at the end of the matrix
+    def _append(self, ids, block):
+        n = len(ids)
+        self._reserve(self._size + n)
+        values, scales = quantize(normalize_rows(block), self.storage)
+        self._matrix[self._size:self._size + n] = values
+        if scales is not None:
+            self._scales[self._size:self._size + n] = scales
+        self._ids[self._size:self._size + n] = ids
+        self._size += n
+
+    def _rebuild_index(self):
+        # Both indexes read the gallery's own rows; neither keeps a float32 copy
+        self.index.build(self.matrix, self.ids, self.scales)
+        self._save_index()
+
+    # Grow the backing arrays geometrically so inserts stay amortized O(1)
+    def _reserve(self, needed):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity and self._matrix.flags.writeable:
+            return
+        capacity = max(capacity, self.INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=self._matrix.dtype)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        if self._scales is not None:
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+        self._matrix = matrix
+        self._ids = ids
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+from insightface.app.common import Face
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.scrfd import SCRFD
+from insightface.utils import ensure_available, face_align
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Model Loading ----------------
+# Only the detector and the recognizer of the buffalo_l pack are used; its
+# landmark and gender/age models are never loaded.
+MODEL_PACK = "buffalo_l"
+KIOSK_MODULES = ("detection", "recognition")
+MODEL_FILES = {"detection": "det_10g.onnx", "recognition": "w600k_r50.onnx"}
+MODEL_CLASSES = {"detection": SCRFD, "recognition": ArcFaceONNX}
+
+
+# ---------------- Inference Profiles ----------------
+class InferenceProfile:
+    # det_size: detector input size. detect_width: wider frames are shrunk
+    # before detection and the boxes scaled back (None = never). intra_threads
+    # 0 = an equal share of the cores per inference worker. int8: use the
+    # *.int8.onnx model variants written by `python -m kiosk.calibrate --quantize`.
+    def __init__(self, name, det_size, detect_width=None, intra_threads=0, inter_threads=1, int8=False):
+        self.name = name
+        self.det_size = tuple(det_size)
+        self.detect_width = detect_width
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.int8 = int8
+
+    def __repr__(self):
+        return (f"InferenceProfile({self.name!r}, det_size={self.det_size}, detect_width={self.detect_width}, "
+                f"threads={self.intra_threads or 'auto'}/{self.inter_threads}, int8={self.int8})")
+
+
+PROFILES = {profile.name: profile for profile in (
+    InferenceProfile("accurate", (640, 640)),
+    InferenceProfile("balanced", (480, 480), detect_width=960),
+    InferenceProfile("fast", (320, 320), detect_width=640),
+    InferenceProfile("fast-int8", (320, 320), detect_width=640, int8=True),
+)}
+DEFAULT_PROFILE = "accurate"
+PROFILE_PATH = os.environ.get("KIOSK_PROFILE_PATH", os.path.join("data", "inference_profile.json"))
+
+
+def resolve_profile(name=None, path=PROFILE_PATH):
+    # An explicit name wins; "auto" (or nothing) uses the profile saved by
+    # kiosk.calibrate, falling back to the default when none was calibrated
+    if name and name != "auto":
+        if name not in PROFILES:
+            raise ValueError(f"Unknown inference profile {name!r}; choose from {', '.join(PROFILES)}")
+        return PROFILES[name]
+    try:
+        with open(path, encoding="utf-8") as f:
+            return PROFILES[json.load(f)["profile"]]
+    except (OSError, ValueError, KeyError):
+        return PROFILES[DEFAULT_PROFILE]
+
+
+def int8_model_path(model_file):
+    return f"{os.path.splitext(model_file)[0]}.int8.onnx"
+
+
+def session_options(profile, workers=1):
+    # Several inference workers share the models; giving each run all cores
+    # makes their thread pools fight, so split the cores between them
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = profile.intra_threads or max(1, (os.cpu_count() or 1) // max(workers, 1))
+    options.inter_op_num_threads = profile.inter_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def model_files(modules=KIOSK_MODULES, root="~/.insightface"):
+    # {task: float32 .onnx path}, downloading the pack on first use
+    model_dir = ensure_available("models", MODEL_PACK, root=root)
+    return {task: os.path.join(model_dir, MODEL_FILES[task]) for task in modules}
+
+
+class FaceModels:
+    # The part of insightface's FaceAnalysis the kiosk uses: `models` by task
+    # name, `det_model`, plus the inference profile they were loaded with
+    def __init__(self, models, profile):
+        self.models = models
+        self.det_model = models.get("detection")
+        self.profile = profile
+
+
+def load_face_app(modules=KIOSK_MODULES, det_size=None, profile=None, workers=1):
+    # FaceAnalysis opens a session for every model in the pack and takes no
+    # SessionOptions, so the models are built here instead: one session each,
+    # with the profile's threading (and int8 weights, when available)
+    profile = profile or PROFILES[DEFAULT_PROFILE]
+    options = session_options(profile, workers)
+    models = {}
+    for task, model_file in model_files(modules).items():
+        path = model_file
+        if profile.int8:
+            if os.path.exists(int8_model_path(model_file)):
+                path = int8_model_path(model_file)
+            else:
+                logger.warning("no int8 variant of %s; using float32", os.path.basename(model_file))
+        session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        # model_file stays the float32 graph: ArcFaceONNX reads its input normalization from it
+        models[task] = MODEL_CLASSES[task](model_file=model_file, session=session)
+
+    # The sessions are CPU-only already; prepare(ctx_id < 0) would re-create
+    # them through set_providers
+    for task, model in models.items():
+        if task == "detection":
+            model.prepare(0, input_size=det_size or profile.det_size, det_thresh=0.5)
+        else:
+            model.prepare(0)
+    return FaceModels(models, profile)
+
+
+def warm_up(face_app, frame_size=(480, 640)):
+    # First ONNX Runtime calls allocate and tune; pay that before the first student
+    detect_faces(face_app, np.zeros((*frame_size, 3), dtype=np.uint8))
+    rec_model = face_app.models["recognition"]
+    size = rec_model.input_size[0]
+    rec_model.get_feat([np.zeros((size, size, 3), dtype=np.uint8)])
+
+
+# ---------------- Split Detection / Recognition ----------------
+# FaceAnalysis.get always runs every loaded model on every face. These helpers
+# call the detector and the recognizer separately so callers can skip the
+# embedding for faces whose identity is already known.
+
+def detect_faces(face_app, frame, max_num=0):
+    # Large frames are shrunk once with INTER_AREA before the detector; boxes
+    # and landmarks are mapped back so crops come from the full-resolution frame
+    profile = getattr(face_app, "profile", None)
+    scale = 1.0
+    if profile is not None and profile.detect_width and frame.shape[1] > profile.detect_width:
+        scale = profile.detect_width / frame.shape[1]
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = frame
+    bboxes, kpss = face_app.det_model.detect(small, max_num=max_num, metric="default")
+    if scale != 1.0:
+        bboxes[:, 0:4] /= scale
+        if kpss is not None:
+            kpss /= scale
+    faces = []
+    for i in range(bboxes.shape[0]):
+        kps = kpss[i] if kpss is not None else None
+        faces.append(Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4]))
+    return faces
+
+
+def embed_faces(face_app, frame, faces):
+    # One recognizer forward pass for every face in the frame
+    rec_model = face_app.models["recognition"]
+    crops = [face_align.norm_crop(frame, landmark=face.kps, image_size=rec_model.input_size[0])
+             for face in faces]
+    feats = np.asarray(rec_model.get_feat(crops), dtype=np.float32).reshape(len(faces), -1)
+    for face, feat in zip(faces, feats):
+        face.embedding = feat
+    return feats
+
+
+def embed_face_batches(face_app, items):
+    # items: [(frame, [Face])], e.g. one entry per camera. All crops go through
+    # a single recognizer forward pass; returns one (n_i, d) array per item.
+    rec_model = face_app.models["recognition"]
+    crops, counts = [], []
+    for frame, faces in items:
+        crops.extend(face_align.norm_crop(frame, landmark=face.kps, image_size=rec_model.input_size[0])
+                     for face in faces)
+        counts.append(len(faces))
+    feats = np.asarray(rec_model.get_feat(crops), dtype=np.float32).reshape(len(crops), -1)
+
+    results, offset = [], 0
+    for (_frame, faces), count in zip(items, counts):
+        chunk = feats[offset:offset + count]
+        for face, feat in zip(faces, chunk):
+            face.embedding = feat
+        results.append(chunk)
+        offset += count
+    return results
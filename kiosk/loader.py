@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+# ---------------- Background Loader ----------------
+class BackgroundLoader(threading.Thread):
+    # Runs named startup steps off the UI thread and reports progress. The
+    # `dispatch` callable decides where callbacks run (the kiosk passes one
+    # that schedules them on the Kivy clock).
+    def __init__(self, steps, on_progress=None, on_done=None, on_error=None, dispatch=None):
+        super().__init__(daemon=True)
+        self.steps = steps
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.dispatch = dispatch or (lambda fn: fn())
+        self.timings = {}
+
+    def _emit(self, callback, *args):
+        if callback:
+            self.dispatch(lambda: callback(*args))
+
+    def run(self):
+        start = time.perf_counter()
+        for i, (label, fn) in enumerate(self.steps):
+            self._emit(self.on_progress, i / len(self.steps), label)
+            step_start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self._emit(self.on_error, label, e)
+                return
+            self.timings[label] = time.perf_counter() - step_start
+
+        self._emit(self.on_progress, 1.0, "Ready")
+        self._emit(self.on_done, time.perf_counter() - start)
@@ -0,0 +1,174 @@
+import csv
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+# ---------------- Stage Timer ----------------
+class StageTimer:
+    # Collects wall-clock milliseconds per named pipeline stage for one frame
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def add(self, name, ms):
+        # For work shared by several frames (cross-camera batches)
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+
+# ---------------- Rolling Histogram ----------------
+# Prometheus-style upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000, 2500)
+
+
+class RollingHistogram:
+    # Percentiles come from the last `window` samples; the bucket counts,
+    # sum and count are cumulative, as Prometheus expects.
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS, window=1000):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = int(np.searchsorted(self.buckets, value, side="left"))
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.total += value
+            self._recent.append(value)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        with self._lock:
+            recent = np.fromiter(self._recent, dtype=np.float64, count=len(self._recent))
+        if recent.size == 0:
+            return [0.0] * len(qs)
+        return [float(v) for v in np.percentile(recent, qs)]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.bucket_counts), self.count, self.total
+
+
+# ---------------- Pipeline Metrics ----------------
+class PipelineMetrics:
+    # Thread-safe registry of per-stage latency histograms plus a few gauges
+    # (FPS, gallery size, queue depth). Capture threads, inference workers and
+    # the UI thread all report here.
+    def __init__(self, window=1000):
+        self.window = window
+        self.started = time.time()
+        self._stages = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, RollingHistogram(window=self.window))
+        histogram.observe(ms)
+
+    def observe_timings(self, timings):
+        for stage, ms in timings.items():
+            self.observe(stage, ms)
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = float(value)
+
+    def gauge(self, name, default=0.0, **labels):
+        return self._gauges.get((name, tuple(sorted(labels.items()))), default)
+
+    # --- Reading ---
+    def summary(self):
+        # {stage: (p50, p95, p99, count)} in pipeline order of first appearance
+        with self._lock:
+            stages = list(self._stages.items())
+        return {stage: (*histogram.percentiles(), histogram.count) for stage, histogram in stages}
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP kiosk_stage_latency_ms Per-stage latency of the recognition pipeline",
+            "# TYPE kiosk_stage_latency_ms histogram",
+        ]
+        with self._lock:
+            stages = list(self._stages.items())
+            gauges = sorted(self._gauges.items())
+        for stage, histogram in stages:
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, counts):
+                cumulative += n
+                lines.append(f'kiosk_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'kiosk_stage_latency_ms_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'kiosk_stage_latency_ms_sum{{stage="{stage}"}} {total:.3f}')
+            lines.append(f'kiosk_stage_latency_ms_count{{stage="{stage}"}} {count}')
+
+        seen = set()
+        for (name, labels), value in gauges:
+            if name not in seen:
+                lines.append(f"# TYPE kiosk_{name} gauge")
+                seen.add(name)
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+            lines.append(f"kiosk_{name}{{{label_text}}} {value:g}" if label_text else f"kiosk_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def append_csv(self, path):
+        # One row per stage; the header is written when the file is new
+        new_file = not os.path.exists(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["time", "stage", "count", "p50_ms", "p95_ms", "p99_ms"])
+            for stage, (p50, p95, p99, count) in self.summary().items():
+                writer.writerow([now, stage, count, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}"])
+
+
+# ---------------- Prometheus Endpoint ----------------
+class MetricsServer(threading.Thread):
+    # Serves GET /metrics on localhost for a local Prometheus/agent to scrape
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        super().__init__(daemon=True)
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,277 @@
+# ---------------- Attendance Schema Migration ----------------
+# Moves `attendance` to a table partitioned by month on a stored
+# attendance_date column, with UNIQUE (student_id, attendance_date) so two
+# kiosks can never mark the same student twice on one day. The old table is
+# kept as attendance_legacy (--drop-legacy removes it); only the first mark
+# per student and day is copied. Ids are kept, so attendance rollups and
+# other id watermarks stay valid.
+#
+#   python -m kiosk.migrate_attendance --dry-run
+#   python -m kiosk.migrate_attendance                      (one transaction; stop the kiosks first)
+#   python -m kiosk.migrate_attendance --ensure-partitions  (create the coming months)
+#   python -m kiosk.migrate_attendance --archive 2025-2026
+#   python -m kiosk.migrate_attendance --archive 2025-2026 --before 2026-04-01 --start-month 8
+#
+# --archive is the database half of the admin "Archive School Year" step:
+# the monthly partitions of that school year (--start-month of the first
+# year up to the same month of the next, default June) that have ended are
+# detached from `attendance` and moved into the attendance_archive schema,
+# where they can still be queried or dumped. --before stops the archive
+# earlier and must fall inside the school year; months before the year
+# starts are never touched.
+# Restart the kiosks after migrating so they switch to the new statements.
+
+import argparse
+import re
+from datetime import date
+
+from kiosk.db import Database
+
+MONTHS_AHEAD = 3
+SCHOOL_YEAR_START_MONTH = 6
+SCHOOL_YEAR = re.compile(r"^(\d{4})-(\d{4})$")
+ARCHIVE_SCHEMA = "attendance_archive"
+PARTITION_NAME = re.compile(r"^attendance_(\d{4})_(\d{2})$")
+
+CREATE_SQL = """
+CREATE TABLE attendance (
+    id integer NOT NULL DEFAULT nextval(%(sequence)s::regclass),
+    student_id integer NOT NULL REFERENCES students (student_id),
+    "timestamp" timestamp without time zone NOT NULL DEFAULT now(),
+    attendance_date date NOT NULL DEFAULT CURRENT_DATE,
+    CONSTRAINT attendance_date_matches CHECK (attendance_date = "timestamp"::date),
+    PRIMARY KEY (id, attendance_date),
+    UNIQUE (student_id, attendance_date)
+) PARTITION BY RANGE (attendance_date)
+"""
+
+# The earliest mark per student and day survives
+COPY_SQL = """
+INSERT INTO attendance (id, student_id, "timestamp", attendance_date)
+SELECT DISTINCT ON (l.student_id, l."timestamp"::date) l.id, l.student_id, l."timestamp", l."timestamp"::date
+FROM attendance_legacy l
+WHERE l."timestamp" IS NOT NULL
+ORDER BY l.student_id, l."timestamp"::date, l."timestamp", l.id
+"""
+
+ARCHIVE_LOG_SQL = f"""
+CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.school_years (
+    partition_name text PRIMARY KEY,
+    school_year text NOT NULL,
+    month date NOT NULL,
+    row_count bigint NOT NULL,
+    archived_at timestamp without time zone NOT NULL DEFAULT now()
+)
+"""
+
+
+class DryRun(Exception):
+    # Raised inside the transaction so a dry run rolls everything back
+    def __init__(self, stats):
+        super().__init__("dry run")
+        self.stats = stats
+
+
+# ---------------- Months ----------------
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"attendance_{month.year:04d}_{month.month:02d}"
+
+
+# ---------------- Partitions ----------------
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('attendance')")
+    row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def monthly_partitions(cursor):
+    # [(name, first day of month)] currently attached to attendance, oldest first
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'attendance'::regclass"
+    )
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partitions(cursor, first_month, last_month):
+    # Returns (created names, [(name, error)] for months that failed). A month
+    # whose rows already landed in the default partition cannot be split out
+    # here and is left there; the caller decides how to report it.
+    existing = {name for name, _month in monthly_partitions(cursor)}
+    created, failed = [], []
+    month = first_month
+    while month <= last_month:
+        name = partition_name(month)
+        if name not in existing:
+            cursor.execute("SAVEPOINT partition")
+            try:
+                cursor.execute(f"CREATE TABLE {name} PARTITION OF attendance FOR VALUES FROM (%s) TO (%s)",
+                               (month, add_months(month, 1)))
+                cursor.execute("RELEASE SAVEPOINT partition")
+                created.append(name)
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT partition")
+                failed.append((name, str(e).strip()))
+        month = add_months(month, 1)
+    return created, failed
+
+
+def ensure_partitions(db, months_ahead=MONTHS_AHEAD):
+    # Called by the kiosk at startup; a no-op before the migration
+    def query(cursor):
+        if not is_partitioned(cursor):
+            return [], []
+        this_month = month_start(date.today())
+        return create_partitions(cursor, this_month, add_months(this_month, months_ahead))
+    return db.run(query)
+
+
+# ---------------- Migration ----------------
+def migrate(db, months_ahead=MONTHS_AHEAD, drop_legacy=False, dry_run=False):
+    def query(cursor):
+        if is_partitioned(cursor):
+            return None
+        cursor.execute("LOCK TABLE attendance IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("SELECT pg_get_serial_sequence('attendance', 'id')")
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            'SELECT count(*), count(*) FILTER (WHERE "timestamp" IS NULL), '
+            'min("timestamp")::date, max("timestamp")::date FROM attendance'
+        )
+        total, undated, first_day, last_day = cursor.fetchone()
+
+        cursor.execute("ALTER TABLE attendance RENAME TO attendance_legacy")
+        cursor.execute("ALTER INDEX IF EXISTS attendance_pkey RENAME TO attendance_legacy_pkey")
+        cursor.execute(CREATE_SQL, {"sequence": sequence})
+        if sequence:
+            # Dropping attendance_legacy must not take the id sequence with it
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY attendance.id")
+        cursor.execute("CREATE TABLE attendance_default PARTITION OF attendance DEFAULT")
+
+        this_month = month_start(date.today())
+        first_month = month_start(first_day) if first_day else this_month
+        last_month = max(month_start(last_day) if last_day else this_month, add_months(this_month, months_ahead))
+        partitions, failed = create_partitions(cursor, first_month, last_month)
+
+        cursor.execute(COPY_SQL)
+        copied = cursor.rowcount
+        if drop_legacy:
+            cursor.execute("DROP TABLE attendance_legacy")
+        stats = {"rows": total, "copied": copied, "duplicates": total - undated - copied,
+                 "undated": undated, "partitions": len(partitions), "failed": failed}
+        if dry_run:
+            raise DryRun(stats)
+        return stats
+
+    try:
+        return db.run(query)
+    except DryRun as e:
+        return e.stats
+
+
+# ---------------- Archive ----------------
+def school_year_months(school_year, start_month=SCHOOL_YEAR_START_MONTH):
+    # "2025-2026" -> (first month, first month of the next school year)
+    match = SCHOOL_YEAR.match(school_year)
+    if not match or int(match.group(2)) != int(match.group(1)) + 1:
+        raise ValueError(f"school year must look like 2025-2026, got {school_year!r}")
+    first = date(int(match.group(1)), start_month, 1)
+    return first, add_months(first, 12)
+
+
+def archive_school_year(db, school_year, before=None, start_month=SCHOOL_YEAR_START_MONTH):
+    # Detach the monthly partitions of the school year that end on or before
+    # `before` (default: the end of the school year or the start of this
+    # month, whichever comes first)
+    first, end = school_year_months(school_year, start_month)
+    if before is None:
+        before = min(end, month_start(date.today()))
+    elif not first < before <= end:
+        raise ValueError(f"--before {before} is outside school year {school_year} ({first} to {end})")
+
+    def query(cursor):
+        if not is_partitioned(cursor):
+            raise RuntimeError("attendance is not partitioned yet; run the migration first")
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        cursor.execute(ARCHIVE_LOG_SQL)
+
+        archived = []
+        for name, month in monthly_partitions(cursor):
+            if month < first:
+                continue
+            if add_months(month, 1) > before:
+                break
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            rows = cursor.fetchone()[0]
+            cursor.execute(f"ALTER TABLE attendance DETACH PARTITION {name}")
+            cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+            cursor.execute(
+                f"INSERT INTO {ARCHIVE_SCHEMA}.school_years (partition_name, school_year, month, row_count) "
+                "VALUES (%s, %s, %s, %s)",
+                (name, school_year, month, rows)
+            )
+            archived.append((name, rows))
+        return archived
+    return db.run(query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition attendance by month with one row per student per day")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--ensure-partitions", action="store_true", help="create partitions for the coming months")
+    action.add_argument("--archive", metavar="SCHOOL_YEAR", help="detach finished months, e.g. 2025-2026")
+    parser.add_argument("--before", type=date.fromisoformat,
+                        help="archive months ending on or before this date, inside the school year "
+                             "(default: the end of the school year or the start of this month)")
+    parser.add_argument("--start-month", type=int, choices=range(1, 13), default=SCHOOL_YEAR_START_MONTH,
+                        metavar="MONTH", help="month the school year starts in (default: %(default)s)")
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the old table after copying")
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+
+    db = Database()
+    try:
+        if args.ensure_partitions:
+            created, failed = ensure_partitions(db, args.months_ahead)
+            print(f"created {len(created)} partitions: {', '.join(created) or '-'}")
+            for name, error in failed:
+                print(f"  could not create {name}: {error}")
+        elif args.archive:
+            try:
+                archived = archive_school_year(db, args.archive, args.before, args.start_month)
+            except ValueError as e:
+                parser.error(str(e))
+            for name, rows in archived:
+                print(f"  {name}: {rows} rows -> {ARCHIVE_SCHEMA}.{name}")
+            print(f"archived {len(archived)} months for school year {args.archive}")
+        else:
+            stats = migrate(db, args.months_ahead, args.drop_legacy, args.dry_run)
+            if stats is None:
+                print("attendance is already partitioned")
+                return
+            print(f"{'would copy' if args.dry_run else 'copied'} {stats['copied']} of {stats['rows']} rows "
+                  f"into {stats['partitions']} monthly partitions; dropped {stats['duplicates']} same-day "
+                  f"duplicates and {stats['undated']} rows without a timestamp")
+            for name, error in stats["failed"]:
+                print(f"  could not create {name}: {error}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# ---------------- Embedding Migration ----------------
+# Rewrites students.face_embedding into the versioned record format
+# (kiosk.embedding_codec), optionally quantized. Legacy raw-float32 rows are
+# tagged with --model; versioned rows already in the target dtype are left
+# alone. Each batch commits on its own, so the tool can be stopped and re-run.
+#
+#   python -m kiosk.migrate_embeddings --dry-run
+#   python -m kiosk.migrate_embeddings --dtype float16
+
+import argparse
+import sys
+
+from psycopg2.extras import execute_values
+
+from kiosk.db import Database
+from kiosk.embedding_codec import (DEFAULT_MODEL, DTYPES, EmbeddingFormatError, decode_templates,
+                                   dequantize, encode_templates)
+
+
+def convert(data, dim, model, dtype):
+    # Returns the new bytes, or None when the row is already in the target format
+    record = decode_templates(data, dim)
+    if record.model is not None and record.dtype == dtype:
+        return None
+    return encode_templates(dequantize(record.vectors, record.scales),
+                            model=record.model or model, dtype=dtype)
+
+
+def migrate(db, dim, model, dtype, batch_size=500, dry_run=False):
+    stats = {"converted": 0, "unchanged": 0, "invalid": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        def batch(cursor):
+            cursor.execute(
+                "SELECT student_id, face_embedding FROM students "
+                "WHERE student_id > %s AND face_embedding IS NOT NULL ORDER BY student_id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            # Counted per attempt so a retried batch is not counted twice
+            counts = dict.fromkeys(stats, 0)
+            updates = []
+            for student_id, data in rows:
+                try:
+                    new = convert(data, dim, model, dtype)
+                except EmbeddingFormatError as e:
+                    counts["invalid"] += 1
+                    print(f"  student {student_id}: {e}", file=sys.stderr)
+                    continue
+                if new is None:
+                    counts["unchanged"] += 1
+                    continue
+                counts["converted"] += 1
+                counts["bytes_before"] += len(data)
+                counts["bytes_after"] += len(new)
+                updates.append((student_id, new))
+
+            if updates and not dry_run:
+                execute_values(
+                    cursor,
+                    "UPDATE students SET face_embedding = v.embedding "
+                    "FROM (VALUES %s) AS v(student_id, embedding) WHERE students.student_id = v.student_id",
+                    updates, template="(%s, %s::bytea)", page_size=len(updates)
+                )
+            return (rows[-1][0] if rows else None), counts
+
+        last_id, counts = db.run(batch)
+        for key, value in counts.items():
+            stats[key] += value
+        if last_id is None:
+            return stats
+        print(f"  up to student {last_id}: {stats['converted']} converted, {stats['unchanged']} unchanged",
+              flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored face embeddings to the versioned format")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float32", help="target stored precision")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model name recorded for legacy rows")
+    parser.add_argument("--dim", type=int, default=512, help="embedding size of legacy rows")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+
+    db = Database()
+    try:
+        stats = migrate(db, args.dim, args.model, args.dtype, args.batch_size, args.dry_run)
+    finally:
+        db.close()
+
+    before, after = stats["bytes_before"], stats["bytes_after"]
+    print(f"{'would convert' if args.dry_run else 'converted'} {stats['converted']}, "
+          f"unchanged {stats['unchanged']}, invalid {stats['invalid']}")
+    if before:
+        print(f"embedding bytes: {before} -> {after} ({after / before:.0%})")
+    sys.exit(1 if stats["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import deque
+
+
+# ---------------- Latest-Frame-Wins Queue ----------------
+class LatestQueue:
+    # Holds at most one item; a put replaces whatever the consumer has not
+    # picked up yet, so a slow consumer always sees the freshest frame.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if self._item is None and timeout != 0:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._item = None
+
+
+# ---------------- Frame Result ----------------
+class FrameResult:
+    # What the inference worker hands back to the UI thread
+    # face/embedding/student describe the face shown in the info panel
+    # status is the committed identity state: "pending", "known" or "unknown"
+    __slots__ = ("frame", "raw_frame", "face", "embedding", "student", "status", "attendance",
+                 "face_count", "timings")
+
+    def __init__(self, frame, raw_frame=None, face=None, embedding=None, student=None,
+                 status=None, attendance=None, face_count=0, timings=None):
+        self.frame = frame
+        self.raw_frame = raw_frame
+        self.face = face
+        self.embedding = embedding
+        self.student = student
+        self.status = status
+        self.attendance = attendance
+        self.face_count = face_count
+        self.timings = timings or {}
+
+
+# ---------------- Rate Meter ----------------
+class RateMeter:
+    # Events per second over the last `window` events
+    def __init__(self, window=60):
+        self._times = deque(maxlen=window)
+
+    def tick(self):
+        self._times.append(time.perf_counter())
+
+    def rate(self, stale_s=2.0):
+        times = list(self._times)
+        if len(times) < 2 or time.perf_counter() - times[-1] > stale_s:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+# ---------------- Capture Thread ----------------
+class CaptureThread(threading.Thread):
+    # Reads one source as fast as it delivers. After `reopen_after` failed
+    # reads in a row (network camera dropped, file ended) the source is reopened.
+    def __init__(self, open_capture, frames, reopen_after=200, metrics=None):
+        super().__init__(daemon=True)
+        self.open_capture = open_capture
+        self.frames = frames
+        self.reopen_after = reopen_after
+        self.metrics = metrics
+        self.rate = RateMeter()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        cap = self.open_capture()
+        failures = 0
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    failures += 1
+                    if failures >= self.reopen_after:
+                        cap.release()
+                        cap = self.open_capture()
+                        failures = 0
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                if self.metrics:
+                    self.metrics.observe("capture", (time.perf_counter() - start) * 1000)
+                self.rate.tick()
+                self.frames.put(frame)
+        finally:
+            cap.release()
+
+
+# ---------------- Camera Sources ----------------
+def parse_camera_sources(spec):
+    # "0,2,rtsp://door/stream,lobby.mp4" -> [0, 2, "rtsp://door/stream", "lobby.mp4"]
+    sources = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item:
+            sources.append(int(item) if item.isdigit() else item)
+    return sources
+
+
+# ---------------- Multi-Camera Frame Hub ----------------
+class FrameHub:
+    # One latest-frame-wins slot per camera, shared by a pool of workers. A
+    # camera is handed to one worker at a time, so its tracker state is never
+    # touched by two threads, and cameras are served round-robin.
+    def __init__(self, n_cameras):
+        self._cond = threading.Condition()
+        self._frames = [None] * n_cameras
+        self._busy = [False] * n_cameras
+        self._next = 0
+        self.dropped = [0] * n_cameras
+
+    def slot(self, camera):
+        return _HubSlot(self, camera)
+
+    def put(self, camera, frame):
+        with self._cond:
+            if self._frames[camera] is not None:
+                self.dropped[camera] += 1
+            self._frames[camera] = frame
+            self._cond.notify()
+
+    def take(self, max_batch, timeout=None):
+        # Up to max_batch (camera, frame) pairs from cameras no other worker holds
+        with self._cond:
+            ready = self._ready()
+            if not ready and timeout != 0:
+                self._cond.wait(timeout)
+                ready = self._ready()
+            batch = []
+            for camera in ready[:max_batch]:
+                batch.append((camera, self._frames[camera]))
+                self._frames[camera] = None
+                self._busy[camera] = True
+            if batch:
+                self._next = (batch[-1][0] + 1) % len(self._frames)
+            return batch
+
+    def release(self, cameras):
+        with self._cond:
+            for camera in cameras:
+                self._busy[camera] = False
+            self._cond.notify_all()
+
+    def pending(self, camera):
+        return int(self._frames[camera] is not None)
+
+    def clear(self):
+        with self._cond:
+            self._frames = [None] * len(self._frames)
+
+    def _ready(self):
+        n = len(self._frames)
+        order = [(self._next + i) % n for i in range(n)]
+        return [c for c in order if self._frames[c] is not None and not self._busy[c]]
+
+
+class _HubSlot:
+    # The frames.put() interface CaptureThread expects, for one camera
+    def __init__(self, hub, camera):
+        self.hub = hub
+        self.camera = camera
+
+    def put(self, frame):
+        self.hub.put(self.camera, frame)
+
+
+# ---------------- Batch Worker ----------------
+class BatchWorker(threading.Thread):
+    def __init__(self, process_batch, hub, results, meters, max_batch=4, on_error=None, metrics=None):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.process_batch = process_batch
+        self.hub = hub
+        self.results = results
+        self.meters = meters
+        self.max_batch = max_batch
+        self.on_error = on_error
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            batch = self.hub.take(self.max_batch, timeout=0.1)
+            if not batch:
+                continue
+            cameras = [camera for camera, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.process_batch(cameras, [frame for _, frame in batch])
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                continue
+            finally:
+                self.hub.release(cameras)
+            if self.metrics:
+                self.metrics.observe("batch", (time.perf_counter() - start) * 1000)
+            for camera, result in zip(cameras, results):
+                self.meters[camera].tick()
+                if result is not None:
+                    if self.metrics:
+                        self.metrics.observe_timings(result.timings)
+                    self.results[camera].put(result)
+
+
+# ---------------- Multi-Camera Pipeline ----------------
+class MultiCameraPipeline:
+    # cameras -> CaptureThread each -> FrameHub -> BatchWorker pool -> LatestQueue per camera
+    # process_batch(cameras, frames) -> one FrameResult per frame
+    def __init__(self, open_captures, process_batch, workers=2, max_batch=4, on_error=None, metrics=None):
+        n = len(open_captures)
+        self.hub = FrameHub(n)
+        self.results = [LatestQueue() for _ in range(n)]
+        self.meters = [RateMeter() for _ in range(n)]
+        self.captures = [CaptureThread(open_capture, self.hub.slot(i), metrics=metrics)
+                         for i, open_capture in enumerate(open_captures)]
+        self.workers = [BatchWorker(process_batch, self.hub, self.results, self.meters, max_batch,
+                                    on_error, metrics)
+                        for _ in range(max(1, workers))]
+
+    def __len__(self):
+        return len(self.captures)
+
+    def start(self):
+        for thread in self.captures + self.workers:
+            thread.start()
+
+    def stop(self, timeout=1.0):
+        for thread in self.captures + self.workers:
+            thread.stop()
+        for thread in self.captures + self.workers:
+            thread.join(timeout)
+        self.hub.clear()
+        for results in self.results:
+            results.clear()
+
+    def latest(self, camera=0):
+        return self.results[camera].get(timeout=0)
+
+    def stats(self):
+        # Per camera: capture FPS, processed FPS, frames waiting and frames dropped
+        return [
+            {
+                "camera": i,
+                "capture_fps": capture.rate.rate(),
+                "fps": self.meters[i].rate(),
+                "queue_depth": self.hub.pending(i),
+                "dropped": self.hub.dropped[i],
+            }
+            for i, capture in enumerate(self.captures)
+        ]
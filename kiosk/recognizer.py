@@ -0,0 +1,262 @@
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from kiosk.cache import LRUCache
+from kiosk.metrics import StageTimer
+from kiosk.pipeline import FrameResult
+from kiosk.voting import IdentityVoter
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Frame Processor ----------------
+class FrameProcessor:
+    # Everything the inference worker does to one frame: detect/track, embed
+    # new faces, match them against the gallery, mark attendance and draw the
+    # labels. It has no Kivy dependency, so the kiosk screen and the headless
+    # benchmark run the exact same code. Identities go through per-track
+    # voting, so attendance is only logged for committed identities.
+    # Identified tracks are re-embedded every `reverify_every` detections and
+    # whenever a detection overlaps the old box by less than `handoff_iou`, so
+    # a face that takes over a track (the next student in a door queue) is
+    # voted in under its own identity instead of inheriting the previous one.
+    # Attendance is marked from the committed student_id; a profile that
+    # could not be fetched during an outage is fetched again on a later frame,
+    # at most once every `profile_retry_s` seconds.
+    def __init__(self, detect, embed, gallery, db, attendance, tracker, threshold,
+                 profile_cache_size=4096, vote_window=5, vote_min=3, vote_cooldown_s=3.0,
+                 profiles=None, reverify_every=10, handoff_iou=0.5, profile_retry_s=5.0):
+        self.detect = detect          # frame -> [Face]
+        self.embed = embed            # (frame, [Face]) -> (N, d) embeddings
+        self.gallery = gallery
+        self.db = db
+        self.attendance = attendance
+        self.tracker = tracker
+        self.threshold = threshold
+        self.profiles = profiles if profiles is not None else LRUCache(profile_cache_size)
+        self.enrollment = None        # active EnrollmentSession, if any
+        self.voting = dict(window=vote_window, min_votes=vote_min, cooldown_s=vote_cooldown_s)
+        self.reverify_every = reverify_every
+        self.handoff_iou = handoff_iou
+        self.profile_retry_s = profile_retry_s
+        self.profile_retry_at = 0.0
+
+    def reset(self):
+        self.tracker.reset()
+
+    def process(self, frame):
+        job = self.begin(frame)
+        embeddings, matches = [], []
+        if job.pending:
+            with job.timer.stage("embed"):
+                embeddings = self.embed(frame, [track.face for track in job.pending])
+            with job.timer.stage("match"):
+                matches = self.match_ids(embeddings)
+        return self.complete(job, embeddings, matches)
+
+    # --- Phase 1: track/detect and pick the faces that need an embedding ---
+    def begin(self, frame):
+        timer = StageTimer()
+        raw_frame = None
+        if self.enrollment is not None:
+            # Enrollment samples are cropped from an unlabelled copy and need
+            # fresh landmarks and embeddings every frame
+            raw_frame = frame.copy()
+            self.tracker.force_detection()
+        tracks, _detected = self.tracker.update(frame, self.detect, timer)
+
+        # Only fresh detections have landmarks aligned with this frame, so
+        # only they get embedded; identified tracks only when due for a re-check
+        pending = [track for track in tracks if track.fresh and self.needs_embedding(track)]
+        return FrameJob(frame, raw_frame, timer, tracks, pending)
+
+    def needs_embedding(self, track):
+        if track.student is None:
+            return True
+        return (track.detections - track.verified_at >= self.reverify_every
+                or track.overlap < self.handoff_iou
+                or in_doubt(track))
+
+    # --- Phase 2: vote on the matches, mark attendance and draw ---
+    def complete(self, job, embeddings, matches):
+        frame, timer, tracks = job.frame, job.timer, job.tracks
+        if not tracks:
+            return FrameResult(frame, job.raw_frame, timings=timer.timings)
+
+        for track, embedding, student_id in zip(job.pending, embeddings, matches):
+            track.embedding = embedding
+            track.verified_at = track.detections
+            if track.voter is None:
+                track.voter = IdentityVoter(**self.voting)
+            if track.voter.vote(student_id):
+                committed = track.voter.committed
+                track.student = None
+                if committed is not None:
+                    self.identify(track, committed, timer)
+                else:
+                    # Someone unknown took over the track
+                    track.attendance = None
+                    track.profile_pending = False
+            elif track.profile_pending:
+                track.student = self.fetch_student(track)
+
+        # Undecided or disputed tracks need fresh detections to collect votes quickly
+        if any(track.voter is None or not track.voter.decided or in_doubt(track) for track in tracks):
+            self.tracker.force_detection()
+
+        # The info panel (and enrollment) follows the face closest to the camera
+        primary = max(tracks, key=lambda t: (t.bbox[2] - t.bbox[0]) * (t.bbox[3] - t.bbox[1]))
+
+        # A frame begun before enrollment started has no unlabelled copy
+        enrollment = self.enrollment
+        if enrollment is not None and job.raw_frame is not None and primary.fresh and primary.student is None:
+            with timer.stage("enroll"):
+                enrollment.add(job.raw_frame, primary.face)
+
+        with timer.stage("draw"):
+            for track in tracks:
+                name_text = "Unknown"
+                if track.student:
+                    name_text = f"{track.student[1]} {track.student[2]}"
+                elif track_status(track) == "pending":
+                    name_text = "..."
+                draw_face_label(frame, track.bbox.astype(int), name_text)
+
+        return FrameResult(frame, job.raw_frame, face=primary.face, embedding=primary.embedding,
+                           student=primary.student, status=track_status(primary),
+                           attendance=primary.attendance, face_count=len(tracks),
+                           timings=timer.timings)
+
+    def identify(self, track, student_id, timer):
+        # Mark attendance
+        with timer.stage("log"):
+            track.attendance = self.log_attendance(student_id)
+        track.student = self.fetch_student(track)
+
+    def fetch_student(self, track):
+        # None while the database is unreachable; profile_pending asks a
+        # later embedded frame of this track to try again
+        student_id = track.voter.committed
+        track.profile_pending = False
+        if student_id not in self.profiles and time.monotonic() < self.profile_retry_at:
+            track.profile_pending = True
+            return None
+        try:
+            return self.fetch_profile(student_id)
+        except self.db.RETRY_ERRORS as e:
+            logger.warning("profile of student %s unavailable: %s", student_id, e)
+            self.profile_retry_at = time.monotonic() + self.profile_retry_s
+            track.profile_pending = True
+            return None
+
+    # --- Match faces (one batched gallery lookup per frame) ---
+    def match_ids(self, embeddings):
+        try:
+            matches = self.gallery.match_batch(embeddings, self.threshold)
+        except Exception:
+            return [None] * len(embeddings)
+        return [match[0] if match is not None else None for match in matches]
+
+    # --- Profile lookup (no photo BLOB), cached by student_id ---
+    def fetch_profile(self, student_id):
+        profile = self.profiles.get(student_id)
+        if profile is None:
+            profile = self.db.fetch_profile(student_id)
+            if profile:
+                self.profiles.put(student_id, profile)
+        return profile
+
+    # --- Attendance logging (write-behind, flushed in batches) ---
+    def log_attendance(self, student_id):
+        if self.attendance.mark(student_id):
+            return "Attendance marked!"
+        return "Already marked today."
+
+
+class FrameJob:
+    # One frame between FrameProcessor.begin and FrameProcessor.complete
+    __slots__ = ("frame", "raw_frame", "timer", "tracks", "pending")
+
+    def __init__(self, frame, raw_frame, timer, tracks, pending):
+        self.frame = frame
+        self.raw_frame = raw_frame
+        self.timer = timer
+        self.tracks = tracks
+        self.pending = pending
+
+
+# ---------------- Cross-Camera Batching ----------------
+def process_batch(processors, frames, embed_many):
+    # One frame per camera. Tracking runs per camera; the new faces of every
+    # camera share one recognizer pass and one gallery lookup. The processors
+    # must share a gallery. embed_many: [(frame, [Face])] -> [(n_i, d)]
+    jobs = [processor.begin(frame) for processor, frame in zip(processors, frames)]
+    batch = [i for i, job in enumerate(jobs) if job.pending]
+    embeddings = {i: [] for i in range(len(jobs))}
+    matches = {i: [] for i in range(len(jobs))}
+
+    if batch:
+        start = time.perf_counter()
+        per_frame = embed_many([(jobs[i].frame, [track.face for track in jobs[i].pending]) for i in batch])
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        found = processors[batch[0]].match_ids(np.vstack(per_frame))
+        match_ms = (time.perf_counter() - start) * 1000
+
+        offset = 0
+        for i, feats in zip(batch, per_frame):
+            embeddings[i] = feats
+            matches[i] = found[offset:offset + len(feats)]
+            offset += len(feats)
+            jobs[i].timer.add("embed", embed_ms)
+            jobs[i].timer.add("match", match_ms)
+
+    return [processor.complete(job, embeddings[i], matches[i])
+            for i, (processor, job) in enumerate(zip(processors, jobs))]
+
+
+def in_doubt(track):
+    # The latest vote disagreed with the committed identity
+    voter = track.voter
+    return voter is not None and voter.decided and bool(voter.history) and voter.history[-1] != voter.committed
+
+
+def track_status(track):
+    if track.student:
+        return "known"
+    if track.voter is None or track.profile_pending:
+        return "pending"
+    # A committed student without a profile (removed since the gallery loaded) shows as unknown
+    return "unknown" if track.voter.decided else "pending"
+
+
+# ---------------- Draw name ----------------
+def draw_face_label(frame, box, name_text):
+    x1, y1, x2, y2 = box
+
+    # Draw rectangle around the face
+    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+    # Draw filled rectangle below for the name background
+    rect_height = 25
+    cv2.rectangle(frame, (x1, y2), (x2, y2 + rect_height), (0, 255, 0), -1)
+
+    # Determine the text size and adjust font scale to fit
+    max_width = x2 - x1 - 10  # 5px padding on each side
+    font_scale = 0.6
+    thickness = 1
+    (text_width, text_height), _ = cv2.getTextSize(name_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+
+    # Reduce font scale if text is wider than the rectangle
+    while text_width > max_width and font_scale > 0.1:
+        font_scale -= 0.05
+        (text_width, text_height), _ = cv2.getTextSize(name_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+
+    # Draw the text starting from the left with small padding
+    text_y = y2 + rect_height - 5
+    cv2.putText(frame, name_text, (x1 + 5, text_y),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
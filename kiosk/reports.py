@@ -0,0 +1,436 @@
+# ---------------- Attendance Reports Service ----------------
+# Read-only JSON/CSV API over the attendance the kiosks write, for the admin
+# dashboard. Counts come from small rollup tables that are maintained
+# incrementally, so dashboard queries do not grow with the attendance table:
+#
+#   attendance_daily_student  one row per (date, student) ever seen present
+#   attendance_daily_section  present count per (date, course, section)
+#   attendance_rollup_state   id watermark of the last folded attendance row
+#
+#   python -m kiosk.reports --port 8090
+#
+#   GET /api/attendance/today                          present / absent / percent
+#   GET /api/attendance/daily?from=&to=&course=&section=
+#   GET /api/attendance/sections?date=                 per section, with enrollment
+#   GET /api/attendance/courses?from=&to=
+#   GET /api/attendance/trends?days=30&course=&section=
+#   GET /api/attendance/records?after_id=&limit=       keyset-paginated raw rows
+#   GET /api/attendance/export.csv?from=&to=&course=&section=   streamed CSV
+
+import argparse
+import csv
+import io
+import json
+import logging
+import select
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import psycopg2
+
+from kiosk.db import Database
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_daily_student (
+    attendance_date date NOT NULL,
+    student_id integer NOT NULL,
+    PRIMARY KEY (attendance_date, student_id)
+);
+CREATE TABLE IF NOT EXISTS attendance_daily_section (
+    attendance_date date NOT NULL,
+    course character varying(100) NOT NULL,
+    section character varying(50) NOT NULL,
+    present integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (attendance_date, course, section)
+);
+CREATE TABLE IF NOT EXISTS attendance_rollup_state (
+    name text PRIMARY KEY,
+    last_attendance_id bigint NOT NULL
+);
+"""
+
+# Folds attendance rows (lo, hi] into the rollups. Only (date, student)
+# pairs seen for the first time bump a section counter, so re-folding a
+# range is harmless; that is what makes the overlap below safe.
+FOLD_SQL = """
+WITH firsts AS (
+    INSERT INTO attendance_daily_student (attendance_date, student_id)
+    SELECT DISTINCT a.timestamp::date, a.student_id
+    FROM attendance a
+    WHERE a.id > %(lo)s AND a.id <= %(hi)s
+    ON CONFLICT DO NOTHING
+    RETURNING attendance_date, student_id
+)
+INSERT INTO attendance_daily_section AS r (attendance_date, course, section, present)
+SELECT f.attendance_date, s.course, s.section, count(*)
+FROM firsts f JOIN students s ON s.student_id = f.student_id
+GROUP BY 1, 2, 3
+ON CONFLICT (attendance_date, course, section) DO UPDATE SET present = r.present + EXCLUDED.present
+"""
+
+NOTIFY_CHANNEL = "attendance_inserted"
+ROLLUP_LOCK = 7305001   # pg_advisory_xact_lock key: one folder at a time
+
+
+# ---------------- Rollups ----------------
+class AttendanceRollups:
+    # Serial ids can commit out of order (several kiosks, replayed spools),
+    # so every fold re-reads the last OVERLAP ids before the watermark.
+    OVERLAP = 5000
+    CHUNK = 50000
+
+    def __init__(self, db):
+        self.db = db
+        self.refreshed_at = None
+
+    def ensure_schema(self):
+        def query(cursor):
+            cursor.execute(SCHEMA)
+            cursor.execute("INSERT INTO attendance_rollup_state (name, last_attendance_id) "
+                           "VALUES ('daily', 0) ON CONFLICT DO NOTHING")
+        self.db.run(query)
+
+    def refresh(self):
+        # Fold new attendance rows in chunks; returns the number of id steps folded
+        folded = 0
+        while True:
+            def fold(cursor):
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK,))
+                cursor.execute("SELECT last_attendance_id FROM attendance_rollup_state "
+                               "WHERE name = 'daily' FOR UPDATE")
+                last = cursor.fetchone()[0]
+                cursor.execute("SELECT COALESCE(max(id), 0) FROM attendance")
+                newest = cursor.fetchone()[0]
+                if newest <= last and folded:
+                    return last, last
+                hi = min(newest, last + self.CHUNK)
+                cursor.execute(FOLD_SQL, {"lo": max(last - self.OVERLAP, 0), "hi": hi})
+                cursor.execute("UPDATE attendance_rollup_state SET last_attendance_id = %s "
+                               "WHERE name = 'daily'", (max(hi, last),))
+                return last, hi
+
+            last, hi = self.db.run(fold)
+            folded += max(hi - last, 0)
+            if hi <= last or hi - last < self.CHUNK:
+                break
+        self.refreshed_at = datetime.now()
+        return folded
+
+    # --- Queries (rollups only, plus the small students table) ---
+    def daily(self, start, end, course=None, section=None):
+        def query(cursor):
+            cursor.execute(
+                "SELECT attendance_date, sum(present) FROM attendance_daily_section "
+                "WHERE attendance_date BETWEEN %s AND %s "
+                "AND (%s::text IS NULL OR course = %s) AND (%s::text IS NULL OR section = %s) "
+                "GROUP BY attendance_date ORDER BY attendance_date",
+                (start, end, course, course, section, section)
+            )
+            return [{"date": d.isoformat(), "present": int(n)} for d, n in cursor.fetchall()]
+        return self.db.run(query)
+
+    def enrollment(self, course=None, section=None):
+        def query(cursor):
+            cursor.execute(
+                "SELECT course, section, count(*) FROM students "
+                "WHERE (%s::text IS NULL OR course = %s) AND (%s::text IS NULL OR section = %s) "
+                "GROUP BY course, section",
+                (course, course, section, section)
+            )
+            return {(c, s): n for c, s, n in cursor.fetchall()}
+        return self.db.run(query)
+
+    def sections(self, day):
+        enrolled = self.enrollment()
+
+        def query(cursor):
+            cursor.execute("SELECT course, section, present FROM attendance_daily_section "
+                           "WHERE attendance_date = %s", (day,))
+            return {(c, s): n for c, s, n in cursor.fetchall()}
+        present = self.db.run(query)
+
+        rows = []
+        for key in sorted(set(enrolled) | set(present)):
+            total, count = enrolled.get(key, 0), present.get(key, 0)
+            rows.append({"course": key[0], "section": key[1], "present": count, "enrolled": total,
+                         "absent": max(total - count, 0), "rate": _rate(count, total)})
+        return rows
+
+    def courses(self, start, end):
+        enrolled = {}
+        for (course, _section), n in self.enrollment().items():
+            enrolled[course] = enrolled.get(course, 0) + n
+
+        def query(cursor):
+            cursor.execute(
+                "SELECT course, sum(present), count(DISTINCT attendance_date) FROM attendance_daily_section "
+                "WHERE attendance_date BETWEEN %s AND %s GROUP BY course ORDER BY course",
+                (start, end)
+            )
+            return cursor.fetchall()
+
+        rows = []
+        for course, present, days in self.db.run(query):
+            possible = enrolled.get(course, 0) * days
+            rows.append({"course": course, "present": int(present), "days": days,
+                         "enrolled": enrolled.get(course, 0), "rate": _rate(int(present), possible)})
+        return rows
+
+    def trends(self, days, course=None, section=None):
+        end = date.today()
+        start = end - timedelta(days=days - 1)
+        enrolled = sum(self.enrollment(course, section).values())
+        by_day = {row["date"]: row["present"] for row in self.daily(start, end, course, section)}
+
+        series, weekdays = [], {}
+        for i in range(days):
+            day = start + timedelta(days=i)
+            present = by_day.get(day.isoformat(), 0)
+            series.append({"date": day.isoformat(), "weekday": day.strftime("%A"), "present": present,
+                           "rate": _rate(present, enrolled)})
+            if day.weekday() < 5:
+                weekdays.setdefault(day.strftime("%A"), []).append(present)
+        averages = {name: round(sum(v) / len(v), 1) for name, v in weekdays.items()}
+        return {"enrolled": enrolled, "series": series, "weekday_average": averages}
+
+    def today(self):
+        rows = self.sections(date.today())
+        present = sum(r["present"] for r in rows)
+        enrolled = sum(r["enrolled"] for r in rows)
+        return {"date": date.today().isoformat(), "present": present, "enrolled": enrolled,
+                "absent": max(enrolled - present, 0), "percent": _rate(present, enrolled)}
+
+    # --- Raw rows ---
+    def records(self, after_id=0, limit=500):
+        def query(cursor):
+            cursor.execute(
+                "SELECT a.id, a.student_id, s.first_name, s.last_name, s.course, s.section, a.timestamp "
+                "FROM attendance a JOIN students s ON s.student_id = a.student_id "
+                "WHERE a.id > %s ORDER BY a.id LIMIT %s",
+                (after_id, limit)
+            )
+            return cursor.fetchall()
+        rows = [_record(row) for row in self.db.run(query)]
+        return {"rows": rows, "next_after_id": rows[-1]["id"] if len(rows) == limit else None}
+
+    def export_rows(self, start, end, course=None, section=None, itersize=5000):
+        # Server-side cursor: rows stream out without loading the range in memory
+        with self.db.connection() as conn:
+            with conn.cursor(name="attendance_export") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(
+                    "SELECT a.id, a.student_id, s.first_name, s.last_name, s.course, s.section, a.timestamp "
+                    "FROM attendance a JOIN students s ON s.student_id = a.student_id "
+                    "WHERE a.timestamp >= %s AND a.timestamp < %s "
+                    "AND (%s::text IS NULL OR s.course = %s) AND (%s::text IS NULL OR s.section = %s) "
+                    "ORDER BY a.timestamp, a.id",
+                    (start, end + timedelta(days=1), course, course, section, section)
+                )
+                yield from cursor
+
+
+def _rate(count, total):
+    return round(100.0 * count / total, 1) if total else 0.0
+
+
+def _record(row):
+    record_id, student_id, first_name, last_name, course, section, timestamp = row
+    return {"id": record_id, "student_id": student_id, "first_name": first_name, "last_name": last_name,
+            "course": course, "section": section, "timestamp": timestamp.isoformat()}
+
+
+# ---------------- Refresher ----------------
+class RollupRefresher(threading.Thread):
+    # Folds new rows when a kiosk NOTIFYs after an insert, and at least
+    # every `interval_s` seconds in case a notification was missed.
+    def __init__(self, rollups, interval_s=30.0, debounce_s=1.0):
+        super().__init__(daemon=True)
+        self.rollups = rollups
+        self.interval_s = interval_s
+        self.debounce_s = debounce_s
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _listen(self):
+        try:
+            conn = psycopg2.connect(**self.rollups.db.config)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            return conn
+        except psycopg2.Error:
+            return None
+
+    def run(self):
+        conn = None
+        while not self._stop_event.is_set():
+            try:
+                self.rollups.refresh()
+            except Exception as e:
+                logger.warning("rollup refresh failed: %s", e)
+
+            conn = conn or self._listen()
+            if conn is None:
+                self._stop_event.wait(self.interval_s)
+                continue
+            try:
+                if select.select([conn], [], [], self.interval_s)[0]:
+                    # Let a burst of inserts settle into one fold
+                    time.sleep(self.debounce_s)
+                    conn.poll()
+                    conn.notifies.clear()
+            except (OSError, psycopg2.Error):
+                conn = None
+
+
+# ---------------- HTTP API ----------------
+def _parse_date(value, default):
+    return date.fromisoformat(value) if value else default
+
+
+class ReportsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rollups = None
+    cors_origin = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        route = self.ROUTES.get(url.path)
+        if route is None:
+            self._send_json({"error": "not found"}, 404)
+            return
+        try:
+            route(self, params)
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+        except Exception as e:
+            self._send_json({"error": str(e)}, 500)
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, status, content_type, length=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        if self.cors_origin:
+            self.send_header("Access-Control-Allow-Origin", self.cors_origin)
+        self.end_headers()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self._headers(status, "application/json", len(body))
+        self.wfile.write(body)
+
+    # --- Routes ---
+    def today(self, params):
+        self._send_json(self.rollups.today())
+
+    def daily(self, params):
+        end = _parse_date(params.get("to"), date.today())
+        start = _parse_date(params.get("from"), end - timedelta(days=29))
+        self._send_json(self.rollups.daily(start, end, params.get("course"), params.get("section")))
+
+    def sections(self, params):
+        self._send_json(self.rollups.sections(_parse_date(params.get("date"), date.today())))
+
+    def courses(self, params):
+        end = _parse_date(params.get("to"), date.today())
+        start = _parse_date(params.get("from"), end - timedelta(days=29))
+        self._send_json(self.rollups.courses(start, end))
+
+    def trends(self, params):
+        days = min(max(int(params.get("days", 30)), 1), 366)
+        self._send_json(self.rollups.trends(days, params.get("course"), params.get("section")))
+
+    def records(self, params):
+        limit = min(max(int(params.get("limit", 500)), 1), 5000)
+        self._send_json(self.rollups.records(int(params.get("after_id", 0)), limit))
+
+    def export_csv(self, params):
+        end = _parse_date(params.get("to"), date.today())
+        start = _parse_date(params.get("from"), end - timedelta(days=29))
+        rows = self.rollups.export_rows(start, end, params.get("course"), params.get("section"))
+
+        self._headers(200, "text/csv; charset=utf-8")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "student_id", "first_name", "last_name", "course", "section", "timestamp"])
+        try:
+            for i, row in enumerate(rows, start=1):
+                writer.writerow([*row[:6], row[6].isoformat()])
+                if i % 1000 == 0:
+                    self._write_chunk(buffer)
+        except Exception:
+            # Headers are already out; cut the stream short so the client sees a failed download
+            logger.exception("export failed")
+            self.close_connection = True
+            return
+        self._write_chunk(buffer)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, buffer):
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def health(self, params):
+        refreshed = self.rollups.refreshed_at
+        self._send_json({"ok": True, "refreshed_at": refreshed.isoformat() if refreshed else None})
+
+    ROUTES = {
+        "/api/attendance/today": today,
+        "/api/attendance/daily": daily,
+        "/api/attendance/sections": sections,
+        "/api/attendance/courses": courses,
+        "/api/attendance/trends": trends,
+        "/api/attendance/records": records,
+        "/api/attendance/export.csv": export_csv,
+        "/health": health,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance aggregation API for the admin dashboard")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--cors-origin", help="allowed browser origin, e.g. http://localhost:5173")
+    parser.add_argument("--refresh-interval", type=float, default=30.0, help="fallback refresh period (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db = Database()
+    rollups = AttendanceRollups(db)
+    rollups.ensure_schema()
+    logger.info("folding existing attendance... %d rows", rollups.refresh())
+
+    refresher = RollupRefresher(rollups, interval_s=args.refresh_interval)
+    refresher.start()
+
+    handler = type("Handler", (ReportsHandler,), {"rollups": rollups, "cors_origin": args.cors_origin})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    logger.info("serving on http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        refresher.stop()
+        server.server_close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
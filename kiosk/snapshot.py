@@ -0,0 +1,120 @@
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# ---------------- Local Gallery Snapshot ----------------
+class GallerySnapshot:
+    # Keeps the gallery's arrays on local disk as .npy files so the kiosk can
+    # boot by memory-mapping them (no table fetch) and keep recognizing while
+    # Postgres is unreachable. A refresh only fetches students enrolled after
+    # the stored created_at watermark; removals force a full reload.
+    #
+    # Each save writes a new generation of files and then swaps meta.json, so
+    # a mapped older generation is never overwritten underneath the gallery.
+    FORMAT_VERSION = 1
+    # Enrollments whose transaction started before the watermark but
+    # committed after it are still picked up
+    OVERLAP = timedelta(minutes=5)
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.watermark = None       # created_at of the newest student in the snapshot
+        self.generation = 0
+        self.count = 0              # templates in the saved generation
+
+    def _path(self, name, generation):
+        return os.path.join(self.directory, f"{name}-{generation}.npy")
+
+    # --- Boot: zero-copy attach ---
+    def load(self, gallery):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (meta.get("version") != self.FORMAT_VERSION or meta.get("dim") != gallery.dim
+                or meta.get("storage") != gallery.storage or meta.get("model") != gallery.model):
+            return False
+
+        generation = meta["generation"]
+        try:
+            matrix = np.load(self._path("embeddings", generation), mmap_mode="r")
+            ids = np.load(self._path("ids", generation), mmap_mode="r")
+            scales = None
+            if gallery.storage == "int8":
+                scales = np.load(self._path("scales", generation), mmap_mode="r")
+            gallery.attach(matrix, ids, scales)
+        except (OSError, ValueError):
+            return False
+
+        self.generation = generation
+        self.count = len(ids)
+        self.watermark = datetime.fromisoformat(meta["watermark"]) if meta.get("watermark") else None
+        return True
+
+    # --- Incremental refresh from the database ---
+    def refresh(self, gallery, db):
+        # Returns the number of templates added; saves a new generation on change
+        current = db.student_ids()
+        known = set(np.unique(gallery.ids).tolist())
+        if known - current or self.watermark is None:
+            rows = db.load_embeddings_since()
+            gallery.load((student_id, data) for student_id, data, _ in rows)
+            added = len(gallery)
+        else:
+            since = self.watermark - self.OVERLAP if self.watermark > datetime.min + self.OVERLAP else None
+            rows = db.load_embeddings_since(since)
+            # Students this kiosk enrolled itself are already in the gallery
+            new_rows = [(student_id, data) for student_id, data, _ in rows if student_id not in known]
+            added = gallery.extend(new_rows) if new_rows else 0
+
+        if rows:
+            self.watermark = max(self.watermark or datetime.min, max(row[2] for row in rows))
+        if len(gallery) != self.count or not os.path.exists(self.meta_path):
+            self.save(gallery)
+        return added
+
+    # --- Write a new generation ---
+    def save(self, gallery):
+        os.makedirs(self.directory, exist_ok=True)
+        generation = self.generation + 1
+        arrays = gallery.export_arrays()
+
+        for name, array in arrays.items():
+            with open(self._path(name, generation), "wb") as f:
+                np.save(f, array)
+                f.flush()
+                os.fsync(f.fileno())
+
+        meta = {
+            "version": self.FORMAT_VERSION,
+            "generation": generation,
+            "dim": gallery.dim,
+            "storage": gallery.storage,
+            "model": gallery.model,
+            "count": len(arrays["ids"]),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+        self.generation = generation
+        self.count = meta["count"]
+        self._remove_old_generations()
+
+    def _remove_old_generations(self):
+        for path in glob.glob(os.path.join(self.directory, "*-*.npy")):
+            generation = os.path.basename(path).rsplit("-", 1)[-1][:-len(".npy")]
+            if generation.isdigit() and int(generation) < self.generation:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still mapped (Windows); removed on a later save
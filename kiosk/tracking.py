@@ -0,0 +1,164 @@
+import itertools
+
+import cv2
+import numpy as np
+
+
+# ---------------- Helpers ----------------
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+# ---------------- Track ----------------
+class Track:
+    # One face followed across frames. Identity fields are filled by the
+    # caller and carried forward until the track is lost; `detections` and
+    # `overlap` tell the caller when an identified face must be re-verified.
+    _ids = itertools.count(1)
+
+    def __init__(self, face):
+        self.track_id = next(self._ids)
+        self.face = face
+        self.fresh = True        # face came from the detector on this frame
+        self.detections = 1      # detector hits since the track started
+        self.overlap = 1.0       # IoU of the latest detection with the previous box
+        self.verified_at = 0     # `detections` when the face was last embedded
+        self.embedding = None
+        self.voter = None
+        self.student = None
+        self.profile_pending = False
+        self.attendance = None
+
+    @property
+    def bbox(self):
+        return self.face.bbox
+
+    def shift(self, dx, dy):
+        offset = np.array([dx, dy], dtype=np.float32)
+        self.face.bbox = self.face.bbox + np.tile(offset, 2)
+        if self.face.get("kps") is not None:
+            self.face.kps = self.face.kps + offset
+        self.fresh = False
+
+
+# ---------------- Detect-Then-Track ----------------
+class FaceTracker:
+    # Runs the detector every `detect_every` frames, or sooner when the scene
+    # changes or a track is lost. In between, boxes are moved by the median
+    # Lucas-Kanade optical flow of corner points inside each box.
+    def __init__(self, detect_every=5, motion_threshold=12.0, iou_threshold=0.3,
+                 flow_width=320):
+        self.detect_every = max(1, detect_every)
+        self.motion_threshold = motion_threshold
+        self.iou_threshold = iou_threshold
+        self.flow_width = flow_width
+
+        self.tracks = []
+        self._prev_gray = None
+        self._since_detect = 0
+        self._force_detect = True
+
+    def reset(self):
+        self.tracks = []
+        self._prev_gray = None
+        self._since_detect = 0
+        self._force_detect = True
+
+    def force_detection(self):
+        self._force_detect = True
+
+    def update(self, frame, detect, timer):
+        with timer.stage("track"):
+            scale = min(1.0, self.flow_width / frame.shape[1])
+            small = cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1.0 else frame
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+            run_detection = (
+                self._force_detect
+                or self._prev_gray is None
+                or self._since_detect + 1 >= self.detect_every
+                or self._motion(gray) > self.motion_threshold
+            )
+
+            if not run_detection:
+                for track in self.tracks:
+                    shift = self._flow_shift(gray, track.bbox, scale)
+                    if shift is None:
+                        self._force_detect = True
+                        continue
+                    track.shift(*shift)
+                self._since_detect += 1
+
+        if run_detection:
+            with timer.stage("detect"):
+                faces = detect(frame)
+            with timer.stage("track"):
+                self._associate(faces)
+            self._since_detect = 0
+            self._force_detect = False
+
+        self._prev_gray = gray
+        return self.tracks, run_detection
+
+    # Greedy IoU association keeps identities of faces that barely moved
+    def _associate(self, faces):
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for fi, face in enumerate(faces):
+                overlap = iou(track.bbox, face.bbox)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, ti, fi))
+        pairs.sort(reverse=True)
+
+        used_tracks, used_faces, tracks = set(), set(), []
+        for overlap, ti, fi in pairs:
+            if ti in used_tracks or fi in used_faces:
+                continue
+            used_tracks.add(ti)
+            used_faces.add(fi)
+            track = self.tracks[ti]
+            track.face = faces[fi]
+            track.fresh = True
+            track.detections += 1
+            track.overlap = overlap
+            tracks.append(track)
+
+        for fi, face in enumerate(faces):
+            if fi not in used_faces:
+                tracks.append(Track(face))
+
+        self.tracks = tracks
+
+    def _motion(self, gray):
+        if self._prev_gray is None or self._prev_gray.shape != gray.shape:
+            return float("inf")
+        return float(cv2.absdiff(gray, self._prev_gray).mean())
+
+    def _flow_shift(self, gray, bbox, scale):
+        h, w = gray.shape
+        x1, y1, x2, y2 = (np.asarray(bbox) * scale).astype(int)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, w), min(y2, h)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+
+        pts = cv2.goodFeaturesToTrack(self._prev_gray[y1:y2, x1:x2], maxCorners=30,
+                                      qualityLevel=0.01, minDistance=3)
+        if pts is None:
+            return None
+        pts = pts.astype(np.float32) + np.array([x1, y1], dtype=np.float32)
+
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, pts, None,
+                                                  winSize=(15, 15), maxLevel=2)
+        good = status.reshape(-1) == 1
+        if good.sum() < 3:
+            return None
+        dx, dy = np.median((nxt[good] - pts[good]).reshape(-1, 2), axis=0) / scale
+        return float(dx), float(dy)
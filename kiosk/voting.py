@@ -0,0 +1,43 @@
+import time
+from collections import Counter, deque
+
+
+# ---------------- Identity Voting ----------------
+class IdentityVoter:
+    # Per-track hysteresis over noisy per-frame matches. A candidate (a
+    # student_id, or None for "no match") is committed only once it has
+    # `min_votes` of the last `window` observations, and a committed identity
+    # is held for at least `cooldown_s` seconds before it can change.
+    def __init__(self, window=5, min_votes=3, cooldown_s=3.0, clock=time.monotonic):
+        self.history = deque(maxlen=window)
+        self.min_votes = min_votes
+        self.cooldown_s = cooldown_s
+        self.clock = clock
+
+        self.decided = False
+        self.committed = None
+        self.committed_at = 0.0
+
+    @property
+    def status(self):
+        if not self.decided:
+            return "pending"
+        return "unknown" if self.committed is None else "known"
+
+    # Returns True when the committed identity changed
+    def vote(self, student_id):
+        self.history.append(student_id)
+        candidate, votes = Counter(self.history).most_common(1)[0]
+        now = self.clock()
+
+        if self.decided and candidate == self.committed:
+            return False
+        if votes < self.min_votes:
+            return False
+        if self.decided and now - self.committed_at < self.cooldown_s:
+            return False
+
+        self.decided = True
+        self.committed = candidate
+        self.committed_at = now
+        return True
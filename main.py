@@ -1,3 +1,7 @@
+# ---------------- Startup Clock ----------------
+import time
+PROCESS_START = time.perf_counter()
+
 # ---------------- Kivy Core ----------------
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
@@ -9,6 +13,7 @@ from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
 from kivy.uix.image import Image
 from kivy.uix.popup import Popup
+from kivy.uix.progressbar import ProgressBar
 from kivy.uix.widget import Widget
 from kivy.uix.behaviors import ButtonBehavior
 from kivy.animation import Animation
@@ -16,19 +21,29 @@ from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle, RoundedRectangle
 from kivy.graphics.texture import Texture
 from kivy.core.window import Window
+from kivy.logger import Logger
 from kivy.uix.gridlayout import GridLayout
 
 # ---------------- Data and Utilities ----------------
+import os
+import threading
 import numpy as np
 from datetime import datetime
-from scipy.spatial.distance import cosine
-
-# ---------------- Database ----------------
-import psycopg2
 
-# ---------------- Computer Vision ----------------
-import cv2
-from insightface.app import FaceAnalysis
+# ---------------- Kiosk ----------------
+# OpenCV, InsightFace and the modules built on them are imported by the
+# background loader (FaceRecognitionScreen.start_loading), not at startup.
+from kiosk.duplicates import DUPLICATE_THRESHOLD, find_duplicate
+from kiosk.embedding_codec import encode_templates
+from kiosk.gallery import EmbeddingGallery
+from kiosk.snapshot import GallerySnapshot
+from kiosk.pipeline import MultiCameraPipeline, parse_camera_sources
+from kiosk.attendance import AttendanceBuffer
+from kiosk.auth import Authenticator
+from kiosk.cache import LRUCache
+from kiosk.db import Database
+from kiosk.loader import BackgroundLoader
+from kiosk.metrics import MetricsServer, PipelineMetrics
 
 
 # ---------------- Hover Button ----------------
@@ -104,22 +119,27 @@ class WelcomeScreen(FloatLayout):
 
 # ---------------- Login Screen ----------------
 class LoginScreen(FloatLayout):
-    def __init__(self, switch_to_dashboard=None, **kwargs):
+    def __init__(self, db, switch_to_dashboard=None, **kwargs):
         super().__init__(**kwargs)
+        self.db = db
+        self.auth = Authenticator(db)
         self.switch_to_dashboard = switch_to_dashboard
+        self.login_pending = False
         self._build_ui()
         self._fade_in()
         self._connect_db()
 
     def _connect_db(self):
-        try:
-            self.conn = psycopg2.connect(host="localhost", database="Attendance-DB",
-                                         user="postgres", password="xd123")
-            self.cursor = self.conn.cursor()
-        except Exception as e:
-            self._show_popup("Database Error", f"Cannot connect to DB:\n{str(e)}")
-            self.login_btn.disabled = True
-
+        # The pool reconnects on its own, so the login button stays usable;
+        # the ping runs off the UI thread so a dead DB cannot freeze startup
+        def ping():
+            try:
+                self.db.ping()
+            except Exception as e:
+                message = f"Cannot connect to DB:\n{str(e)}"
+                Clock.schedule_once(lambda dt: self._show_popup("Database Error", message))
+
+        threading.Thread(target=ping, daemon=True).start()
         self.login_btn.bind(on_release=self.check_login)
 
     def _show_popup(self, title, message):
@@ -131,6 +151,7 @@ class LoginScreen(FloatLayout):
         close_btn.bind(on_release=popup.dismiss)
         popup.open()
 
+    # --- Login: hash check and DB lookup run on a worker thread ---
     def check_login(self, instance):
         username = self.username.text.strip()
         password = self.password.text.strip()
@@ -138,24 +159,39 @@ class LoginScreen(FloatLayout):
         if not username or not password:
             self._show_popup("Error","Please enter both username and password.")
             return
+        if self.login_pending:
+            return
+
+        self.login_pending = True
+        self.login_btn.disabled = True
+        self.login_btn.text = "[b]Checking...[/b]"
+        threading.Thread(target=self.run_login, args=(username, password), daemon=True).start()
 
+    def run_login(self, username, password):
         try:
-            self.cursor.execute("SELECT username, role FROM users WHERE username=%s AND password=%s",
-                                (username,password))
-            result = self.cursor.fetchone()
-
-            if result:
-                db_username, role = result
-                if role.lower()=="admin":
-                    self._show_popup("Login Successful","Admin login successful!")
-                    if self.switch_to_dashboard:
-                        Clock.schedule_once(lambda dt: self.switch_to_dashboard(),0.5)
-                else:
-                    self._show_popup("Login Successful",f"Welcome {db_username}!")
-            else:
-                self._show_popup("Invalid Login","Invalid username or password.")
+            result, error = self.auth.login(username, password), None
         except Exception as e:
-            self._show_popup("Error", str(e))
+            result, error = None, e
+        Clock.schedule_once(lambda dt: self.on_login_result(result, error))
+
+    def on_login_result(self, result, error):
+        self.login_pending = False
+        self.login_btn.disabled = False
+        self.login_btn.text = "[b]Login[/b]"
+
+        if error is not None:
+            self._show_popup("Error", str(error))
+        elif result:
+            db_username, role = result
+            if role.lower()=="admin":
+                self.password.text = ""
+                self._show_popup("Login Successful","Admin login successful!")
+                if self.switch_to_dashboard:
+                    Clock.schedule_once(lambda dt: self.switch_to_dashboard(),0.5)
+            else:
+                self._show_popup("Login Successful",f"Welcome {db_username}!")
+        else:
+            self._show_popup("Invalid Login","Invalid username or password.")
 
     def _build_ui(self):
         # Background
@@ -254,9 +290,38 @@ class DashboardScreen(FloatLayout):
 
 class FaceRecognitionScreen(Screen):
     RECOGNITION_THRESHOLD = 0.5  # similarity threshold
-
-    def __init__(self, switch_to_dashboard=None, **kwargs):
+    INDEX_PATH = os.environ.get("KIOSK_INDEX_PATH", os.path.join("data", "gallery_ivf.npz"))
+    SNAPSHOT_DIR = os.environ.get("KIOSK_SNAPSHOT_DIR", os.path.join("data", "gallery_snapshot"))
+    SNAPSHOT_REFRESH_S = 60  # new enrollments from other kiosks show up within this
+    DETECT_EVERY = int(os.environ.get("KIOSK_DETECT_EVERY", "5"))  # 1 = full inference every frame
+    PROFILE_CACHE_SIZE = 4096
+    ENROLL_SAMPLES = 5
+    VOTE_WINDOW = 5       # recent matches considered per face
+    VOTE_MIN = 3          # consistent matches needed to commit an identity
+    VOTE_COOLDOWN_S = 3.0
+    REVERIFY_EVERY = 10   # detections between re-checks of an identified face
+    ENROLL_TEMPLATES = int(os.environ.get("KIOSK_ENROLL_TEMPLATES", "1"))  # templates per student
+    # New enrollments this close to an existing student need a second confirmation
+    DUPLICATE_THRESHOLD = float(os.environ.get("KIOSK_DUPLICATE_THRESHOLD", DUPLICATE_THRESHOLD))
+    EMBEDDING_DTYPE = os.environ.get("KIOSK_EMBEDDING_DTYPE", "float32")  # stored: float32/float16/int8
+    GALLERY_DTYPE = os.environ.get("KIOSK_GALLERY_DTYPE", "float32")      # in memory: float32/float16/int8
+    PHOTO_CACHE_SIZE = 64  # ready-made textures
+    SPOOL_PATH = os.environ.get("KIOSK_ATTENDANCE_SPOOL", os.path.join("data", "attendance_spool.jsonl"))
+    # Device indices, RTSP URLs or video files, comma-separated
+    CAMERA_SOURCES = parse_camera_sources(os.environ.get("KIOSK_CAMERAS", "3"))
+    INFERENCE_WORKERS = int(os.environ.get("KIOSK_INFERENCE_WORKERS", "2"))
+    # accurate / balanced / fast / fast-int8, or auto = the one kiosk.calibrate picked
+    INFERENCE_PROFILE = os.environ.get("KIOSK_INFERENCE_PROFILE", "auto")
+    CAMERA_BATCH = 4          # frames from different cameras embedded together
+    CAMERA_STATS_S = 10       # how often per-camera FPS / queue depth is logged
+    METRICS_PORT = int(os.environ.get("KIOSK_METRICS_PORT", "0"))  # >0 serves /metrics on localhost
+    METRICS_CSV = os.environ.get("KIOSK_METRICS_CSV", "")          # append stage percentiles here
+    METRICS_CSV_S = 60
+    SHOW_OVERLAY = os.environ.get("KIOSK_OVERLAY", "0") == "1"     # F2 toggles at runtime
+
+    def __init__(self, db, switch_to_dashboard=None, **kwargs):
         super().__init__(**kwargs)
+        self.db = db
         self.switch_to_dashboard = switch_to_dashboard
 
         # --- Background ---
@@ -326,21 +391,185 @@ class FaceRecognitionScreen(Screen):
                                on_release=self.go_back)
         self.add_widget(self.back_btn)
 
-        # --- DB connection ---
+        # --- Camera switch (only with several sources) ---
+        self.display_camera = 0
+        self.camera_btn = Button(text=f"Camera 1/{len(self.CAMERA_SOURCES)}", size_hint=(0.15,0.08),
+                                 pos_hint={"right":0.95,"y":0.02},
+                                 on_release=self.next_camera)
+        if len(self.CAMERA_SOURCES) > 1:
+            self.add_widget(self.camera_btn)
+
+        # --- Performance overlay (F2) ---
+        self.overlay = Label(text="", markup=True, font_size=13, font_name="RobotoMono-Regular",
+                             halign="left", valign="top", size_hint=(0.4,0.4),
+                             pos_hint={"x":0.06,"top":0.88}, color=(1,1,0.4,1))
+        self.overlay.bind(size=lambda *x: setattr(self.overlay, "text_size", self.overlay.size))
+        self.overlay_visible = False
+        Window.bind(on_key_down=self.on_key_down)
+
+        # --- Gallery and attendance (filled by the background loader) ---
+        self.gallery = EmbeddingGallery(storage=self.GALLERY_DTYPE)
+        self.snapshot = GallerySnapshot(self.SNAPSHOT_DIR)
+        self.refresh_thread = None
+        self.attendance = AttendanceBuffer(self.db, self.SPOOL_PATH)
+        self.attendance.start()
+
+        # --- Face detection (loaded by start_loading) ---
+        self.face_app = None
+        self.processors = []      # one per camera; they share gallery, caches and attendance
+        self.processor = None     # the displayed camera's processor
+        self.loader = None
+        self.db_error = None
+        self.enrollment = None
+        self.enrollment_fields = None
+        self.pending_enrollment = None   # (fields, templates, photo) awaiting "Register anyway"
+
+        self.pipeline = None
+        self.clock_event = None
+        self.stats_event = None
+        self.metrics_event = None
+
+        # --- Stage latency histograms, optionally exported ---
+        self.metrics = PipelineMetrics()
+        self.metrics_server = None
+        if self.METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, self.METRICS_PORT)
+                self.metrics_server.start()
+            except OSError as e:
+                Logger.warning(f"Kiosk: metrics endpoint unavailable ({e})")
+        if self.METRICS_CSV:
+            Clock.schedule_interval(lambda dt: self.metrics.append_csv(self.METRICS_CSV), self.METRICS_CSV_S)
+        if self.SHOW_OVERLAY:
+            self.toggle_overlay()
+        self.current_embedding = None
+        self.last_result = None
+        self.last_timings = {}
+        self.frame_texture = None
+
+        # --- Photo textures, loaded lazily by student_id ---
+        self.photo_textures = LRUCache(self.PHOTO_CACHE_SIZE)
+        self.photo_loading = set()
+        self.panel_state = None
+
+    # --- Background startup (runs while the welcome/login screens are shown) ---
+    def start_loading(self, on_progress=None, on_done=None):
+        def done(elapsed):
+            self.on_models_ready(elapsed)
+            if on_done:
+                on_done(elapsed)
+
+        self.loader = BackgroundLoader(
+            steps=[
+                ("Loading OpenCV", self.load_opencv),
+                ("Loading student gallery", self.load_gallery),
+                ("Loading face models", self.load_models),
+                ("Warming up face models", self.warm_up_models),
+            ],
+            on_progress=on_progress,
+            on_done=done,
+            on_error=self.on_loading_error,
+            dispatch=lambda fn: Clock.schedule_once(lambda dt: fn()),
+        )
+        self.loader.start()
+
+    def load_opencv(self):
+        import cv2  # noqa: F401
+
+    def load_gallery(self):
+        # Boot from the memory-mapped local snapshot, then fetch only newer students
+        from_snapshot = self.snapshot.load(self.gallery)
         try:
-            self.conn = psycopg2.connect(host="localhost", database="Attendance-DB",
-                                         user="postgres", password="xd123")
-            self.cursor = self.conn.cursor()
+            self.snapshot.refresh(self.gallery, self.db)
         except Exception as e:
-            self.info_label.text = f"DB Error: {e}"
+            if not from_snapshot:
+                self.db_error = e
+            Logger.warning(f"Kiosk: gallery refresh failed, using local snapshot ({e})")
+        for reason, count in self.gallery.rejected.items():
+            Logger.warning(f"Kiosk: skipped {count} student embeddings ({reason} mismatch)")
+
+        # Large galleries switch to the persisted IVF index
+        self.gallery.use_ann_index(self.INDEX_PATH)
+        try:
+            # Monthly attendance partitions for the coming months (no-op before the migration)
+            from kiosk.migrate_attendance import ensure_partitions
+            _created, failed = ensure_partitions(self.db)
+            for name, error in failed:
+                Logger.warning(f"Kiosk: could not create attendance partition {name} ({error})")
+        except Exception as e:
+            Logger.warning(f"Kiosk: could not create attendance partitions ({e})")
+        try:
+            # Students already marked today, so repeat sightings never hit the DB
+            self.attendance.seed()
+        except Exception as e:
+            Logger.warning(f"Kiosk: could not load today's attendance, retrying on the next flush ({e})")
 
-        # --- Face detection ---
-        self.face_app = FaceAnalysis()
-        self.face_app.prepare(ctx_id=-1)
+    # --- Periodic incremental gallery refresh (off the UI thread) ---
+    def refresh_gallery(self, dt=None):
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return
 
-        self.cap = None
-        self.clock_event = None
-        self.current_embedding = None
+        def run():
+            try:
+                added = self.snapshot.refresh(self.gallery, self.db)
+                if added:
+                    Logger.info(f"Kiosk: gallery refreshed, {added} new templates")
+            except Exception as e:
+                Logger.warning(f"Kiosk: gallery refresh failed ({e})")
+
+        self.refresh_thread = threading.Thread(target=run, daemon=True)
+        self.refresh_thread.start()
+
+    def load_models(self):
+        from kiosk.inference import load_face_app, resolve_profile
+        profile = resolve_profile(self.INFERENCE_PROFILE)
+        Logger.info(f"Kiosk: inference profile {profile}")
+        self.face_app = load_face_app(profile=profile, workers=self.INFERENCE_WORKERS)
+
+    def warm_up_models(self):
+        from kiosk.inference import detect_faces, embed_faces, warm_up
+        from kiosk.recognizer import FrameProcessor
+        from kiosk.tracking import FaceTracker
+
+        warm_up(self.face_app)
+
+        # --- Detect-then-track per camera: full inference every N frames or on motion ---
+        profiles = LRUCache(self.PROFILE_CACHE_SIZE)
+        self.processors = [
+            FrameProcessor(
+                detect=lambda frame: detect_faces(self.face_app, frame),
+                embed=lambda frame, faces: embed_faces(self.face_app, frame, faces),
+                gallery=self.gallery,
+                db=self.db,
+                attendance=self.attendance,
+                tracker=FaceTracker(detect_every=self.DETECT_EVERY),
+                threshold=self.RECOGNITION_THRESHOLD,
+                vote_window=self.VOTE_WINDOW,
+                vote_min=self.VOTE_MIN,
+                vote_cooldown_s=self.VOTE_COOLDOWN_S,
+                reverify_every=self.REVERIFY_EVERY,
+                profiles=profiles,
+            )
+            for _ in self.CAMERA_SOURCES
+        ]
+        self.processor = self.processors[self.display_camera]
+
+    def on_models_ready(self, elapsed):
+        cold_start = time.perf_counter() - PROCESS_START
+        Logger.info(f"Kiosk: models ready in {elapsed:.2f}s (cold start {cold_start:.2f}s)")
+        for label, seconds in self.loader.timings.items():
+            Logger.info(f"Kiosk:   {label}: {seconds:.2f}s")
+
+        Clock.schedule_interval(self.refresh_gallery, self.SNAPSHOT_REFRESH_S)
+
+        self.info_label.text = "[b]System Active[/b]"
+        if self.db_error:
+            self.info_label.text = f"DB Error: {self.db_error}"
+        if self.manager and self.manager.current == self.name:
+            self.start_camera()
+
+    def on_loading_error(self, label, error):
+        self.info_label.text = f"[b]Startup Error[/b]\n{label}: {error}"
 
     # --- Update rectangle ---
     def update_rect(self, *args):
@@ -349,144 +578,247 @@ class FaceRecognitionScreen(Screen):
 
     # --- Camera start/stop ---
     def on_enter(self):
-        self.cap = cv2.VideoCapture(3)
+        if self.processor is None:
+            self.info_label.text = "[b]Loading face models...[/b]"
+            return
+        self.start_camera()
+
+    def start_camera(self):
+        import cv2
+
+        from kiosk.inference import embed_face_batches
+        from kiosk.recognizer import process_batch
+
+        if self.pipeline:
+            return
+        for processor in self.processors:
+            processor.reset()
+
+        def run_batch(cameras, frames):
+            processors = [self.processors[camera] for camera in cameras]
+            return process_batch(processors, frames, lambda items: embed_face_batches(self.face_app, items))
+
+        self.pipeline = MultiCameraPipeline(
+            [lambda source=source: cv2.VideoCapture(source) for source in self.CAMERA_SOURCES],
+            run_batch,
+            workers=self.INFERENCE_WORKERS,
+            max_batch=self.CAMERA_BATCH,
+            on_error=self.log_pipeline_error,
+            metrics=self.metrics,
+        )
+        self.pipeline.start()
         self.clock_event = Clock.schedule_interval(self.update, 1/30)
+        self.stats_event = Clock.schedule_interval(self.log_camera_stats, self.CAMERA_STATS_S)
+        self.metrics_event = Clock.schedule_interval(self.update_metrics, 1.0)
+
+    def log_pipeline_error(self, error):
+        # Runs on the inference worker; the batch is dropped and the worker carries on
+        Logger.error(f"Kiosk: frame processing failed ({error})", exc_info=error)
+
+    def log_camera_stats(self, dt=None):
+        if not self.pipeline:
+            return
+        for stats, source in zip(self.pipeline.stats(), self.CAMERA_SOURCES):
+            Logger.info(
+                f"Kiosk: camera {stats['camera'] + 1} ({source}): capture {stats['capture_fps']:.1f} fps, "
+                f"processed {stats['fps']:.1f} fps, queue {stats['queue_depth']}, dropped {stats['dropped']}"
+            )
+
+    # --- Gauges for the overlay and the /metrics endpoint (once a second) ---
+    def update_metrics(self, dt=None):
+        metrics = self.metrics
+        metrics.set_gauge("gallery_templates", len(self.gallery))
+        metrics.set_gauge("attendance_pending", self.attendance.pending())
+        metrics.set_gauge("ui_fps", Clock.get_fps())
+        if self.pipeline:
+            for stats in self.pipeline.stats():
+                camera = str(stats["camera"] + 1)
+                metrics.set_gauge("camera_fps", stats["fps"], camera=camera)
+                metrics.set_gauge("camera_capture_fps", stats["capture_fps"], camera=camera)
+                metrics.set_gauge("camera_queue_depth", stats["queue_depth"], camera=camera)
+                metrics.set_gauge("camera_dropped_frames", stats["dropped"], camera=camera)
+        if self.overlay_visible:
+            self.refresh_overlay()
+
+    def refresh_overlay(self):
+        metrics = self.metrics
+        camera = str(self.display_camera + 1)
+        lines = [
+            f"[b]cam {camera}[/b]  {metrics.gauge('camera_fps', camera=camera):5.1f} fps  "
+            f"(capture {metrics.gauge('camera_capture_fps', camera=camera):.1f}, "
+            f"ui {metrics.gauge('ui_fps'):.0f})",
+            f"gallery {len(self.gallery)}  dropped {int(metrics.gauge('camera_dropped_frames', camera=camera))}"
+            f"  queue {int(metrics.gauge('camera_queue_depth', camera=camera))}",
+            "",
+            f"{'stage':<8}{'p50':>7}{'p95':>7}{'p99':>7}  ms",
+        ]
+        for stage, (p50, p95, p99, _count) in self.metrics.summary().items():
+            lines.append(f"{stage:<8}{p50:>7.1f}{p95:>7.1f}{p99:>7.1f}")
+        self.overlay.text = "\n".join(lines)
+
+    def toggle_overlay(self, *args):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            self.refresh_overlay()
+            if not self.overlay.parent:
+                self.add_widget(self.overlay)
+        elif self.overlay.parent:
+            self.remove_widget(self.overlay)
+
+    def on_key_down(self, window, key, scancode, codepoint, modifiers):
+        if key == 283 and self.manager and self.manager.current == self.name:  # F2
+            self.toggle_overlay()
+            return True
+        return False
+
+    # --- Show another camera in the feed and info panel ---
+    def next_camera(self, *args):
+        if self.enrollment is not None:
+            return
+        self.display_camera = (self.display_camera + 1) % len(self.CAMERA_SOURCES)
+        self.camera_btn.text = f"Camera {self.display_camera + 1}/{len(self.CAMERA_SOURCES)}"
+        if self.processors:
+            self.processor = self.processors[self.display_camera]
+        self.last_result = None
+        self.current_embedding = None
+        self.panel_state = None
 
     def on_pre_leave(self):
         if self.clock_event:
             self.clock_event.cancel()
-        if self.cap:
-            self.cap.release()
-            self.cap = None
+            self.clock_event = None
+        if self.stats_event:
+            self.stats_event.cancel()
+            self.stats_event = None
+        if self.metrics_event:
+            self.metrics_event.cancel()
+            self.metrics_event = None
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        self.last_result = None
+        self.current_embedding = None
+        self.panel_state = None
+        if self.enrollment is not None:
+            self.enrollment = None
+            self.processor.enrollment = None
+            self.register_btn.disabled = False
+        self.clear_pending_enrollment()
         self.info_label.text = "[b]System Active[/b]"
         self.student_photo.texture = None
         self.clear_registration_fields()
 
-    # --- Update camera feed ---
+    # --- UI tick: blit the most recent result ---
     def update(self, dt):
-        if not self.cap:
+        if not self.pipeline:
             return
-        ret, frame = self.cap.read()
-        if not ret:
+        result = self.pipeline.latest(self.display_camera)
+        if result is None:
             return
+        self.last_result = result
+        self.last_timings = result.timings
 
-        faces = self.face_app.get(frame)
-        name_text = "Unknown"
-
-        if faces:
-            face = faces[0]
-            box = face.bbox.astype(int)
-            cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (0,255,0), 2)
-
-            embedding = face.embedding.astype(np.float32)
-            self.current_embedding = embedding
-
-            student = self.match_student(embedding)
-            if student:
-                name_text = f"{student[1]} {student[2]}"
-                self.info_label.text = (
-                    f"[b]{student[1]} {student[2]}[/b]\n\n"
-                    f"Student ID: {student[0]}\n"
-                    f"Course: {student[3]}\n"
-                    f"Section: {student[4]}"
-                )
-
-                # Show stored face photo
-                face_photo_bytes = student[6]
-                if face_photo_bytes:
-                    nparr = np.frombuffer(face_photo_bytes, np.uint8)
-                    img_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    buf = cv2.flip(img_np, 0).tobytes()
-                    texture = Texture.create(size=(img_np.shape[1], img_np.shape[0]), colorfmt='bgr')
-                    texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-                    self.student_photo.texture = texture
-
-                # Mark attendance
-                self.log_attendance(student[0])
-
-                self.clear_registration_fields()
-            else:
-                self.info_label.text = "[b]Face not recognized[/b]\nRegister below."
-                self.student_photo.texture = None
-                self.show_registration_fields()
+        if result.face is not None:
+            self.current_embedding = result.embedding
         else:
-            self.info_label.text = "[b]System Active[/b]"
-            self.student_photo.texture = None
-            self.clear_registration_fields()
             self.current_embedding = None
 
-        # --- Draw name ---
-        if faces:
-            face = faces[0]
-            box = face.bbox.astype(int)
-            x1, y1, x2, y2 = box
-
-            # Draw rectangle around the face
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        if self.enrollment is not None:
+            self.update_enrollment()
+            self.blit_frame(result.frame)
+            return
 
-            # Draw filled rectangle below for the name background
-            rect_height = 25
-            cv2.rectangle(frame, (x1, y2), (x2, y2 + rect_height), (0, 255, 0), -1)
+        # The info panel only changes on committed identity changes
+        student = result.student
+        if result.face is None:
+            panel_state = None
+        elif student:
+            panel_state = (student[0], result.attendance, result.face_count)
+        else:
+            panel_state = (result.status,)
+        if panel_state != self.panel_state:
+            self.panel_state = panel_state
+            self.update_info_panel(result)
 
-            # Determine the text size and adjust font scale to fit
-            max_width = x2 - x1 - 10  # 5px padding on each side
-            font_scale = 0.6
-            thickness = 1
-            (text_width, text_height), _ = cv2.getTextSize(name_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            
-            # Reduce font scale if text is wider than the rectangle
-            while text_width > max_width and font_scale > 0.1:
-                font_scale -= 0.05
-                (text_width, text_height), _ = cv2.getTextSize(name_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        # Update camera feed
+        self.blit_frame(result.frame)
+
+    # --- Camera texture: allocated once per resolution, updated in place ---
+    def blit_frame(self, frame):
+        height, width = frame.shape[:2]
+        if self.frame_texture is None or self.frame_texture.size != (width, height):
+            self.frame_texture = Texture.create(size=(width, height), colorfmt="bgr")
+            # OpenCV rows run top-down; flip via texture coords instead of copying
+            self.frame_texture.flip_vertical()
+            self.img.texture = self.frame_texture
+
+        # The numpy buffer is handed to GL as-is (no tobytes copy); blit_buffer
+        # wants a flat buffer, and reshape(-1) of a contiguous frame is a view
+        start = time.perf_counter()
+        self.frame_texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        self.img.canvas.ask_update()
+        self.metrics.observe("upload", (time.perf_counter() - start) * 1000)
+
+    # --- Info panel (runs on identity change only) ---
+    def update_info_panel(self, result):
+        student = result.student
+        if result.face is None:
+            self.info_label.text = "[b]System Active[/b]"
+            self.student_photo.texture = None
+            self.clear_registration_fields()
+        elif result.status == "pending":
+            self.info_label.text = "[b]Identifying...[/b]"
+            self.student_photo.texture = None
+        elif student:
+            self.info_label.text = (
+                f"[b]{student[1]} {student[2]}[/b]\n\n"
+                f"Student ID: {student[0]}\n"
+                f"Course: {student[3]}\n"
+                f"Section: {student[4]}"
+            )
+            if result.attendance:
+                self.info_label.text += f"\n\n{result.attendance}"
+            if result.face_count > 1:
+                self.info_label.text += f"\n\n{result.face_count} faces in view"
 
-            # Draw the text starting from the left with small padding
-            text_y = y2 + rect_height - 5
-            cv2.putText(frame, name_text, (x1 + 5, text_y),
-                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+            # Show stored face photo
+            self.show_student_photo(student[0])
+            self.clear_registration_fields()
+        else:
+            self.info_label.text = "[b]Face not recognized[/b]\nRegister below."
+            self.student_photo.texture = None
+            self.show_registration_fields()
 
+    def show_student_photo(self, student_id):
+        texture = self.photo_textures.get(student_id)
+        self.student_photo.texture = texture
+        if texture is None and student_id not in self.photo_loading:
+            self.photo_loading.add(student_id)
+            threading.Thread(target=self.load_student_photo, args=(student_id,), daemon=True).start()
 
-        # Update camera feed
-        buf = cv2.flip(frame,0).tobytes()
-        texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt="bgr")
-        texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-        self.img.texture = texture
+    # --- Photo loader thread: fetch + decode, texture is built on the UI thread ---
+    def load_student_photo(self, student_id):
+        import cv2
 
-    # --- Match face ---
-    def match_student(self, embedding):
+        img_np = None
         try:
-            self.cursor.execute("SELECT student_id, first_name, last_name, course, section, face_embedding, face_photo FROM students")
-            rows = self.cursor.fetchall()
-            for row in rows:
-                student_id, first_name, last_name, course, section, db_embedding, face_photo = row
-                db_embedding = np.frombuffer(db_embedding, dtype=np.float32)
-                sim = 1 - cosine(embedding, db_embedding)
-                if sim >= self.RECOGNITION_THRESHOLD:
-                    return row
-            return None
+            photo_bytes = self.db.fetch_photo(student_id)
+            if photo_bytes:
+                img_np = cv2.imdecode(np.frombuffer(photo_bytes, np.uint8), cv2.IMREAD_COLOR)
         except Exception:
-            return None
+            pass
+        Clock.schedule_once(lambda dt: self.on_student_photo(student_id, img_np))
 
-    # --- Attendance logging ---
-    def log_attendance(self, student_id):
-        try:
-            # Check if attendance already recorded today
-            self.cursor.execute("""
-                SELECT id FROM attendance
-                WHERE student_id = %s AND DATE(timestamp) = CURRENT_DATE
-            """, (student_id,))
-            already_logged = self.cursor.fetchone()
-
-            if not already_logged:
-                self.cursor.execute(
-                    "INSERT INTO attendance (student_id) VALUES (%s)",
-                    (student_id,)
-                )
-                self.conn.commit()
-                self.info_label.text += "\n\nAttendance marked!"
-            else:
-                self.info_label.text += "\n\nAlready marked today."
-        except Exception as e:
-            self.info_label.text = f"DB Error: {e}"
+    def on_student_photo(self, student_id, img_np):
+        self.photo_loading.discard(student_id)
+        if img_np is None:
+            return
+        texture = Texture.create(size=(img_np.shape[1], img_np.shape[0]), colorfmt='bgr')
+        texture.flip_vertical()
+        texture.blit_buffer(np.ascontiguousarray(img_np).reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        self.photo_textures.put(student_id, texture)
+        if self.panel_state and self.panel_state[0] == student_id:
+            self.student_photo.texture = texture
 
     # --- Registration fields ---
     def show_registration_fields(self):
@@ -499,46 +831,95 @@ class FaceRecognitionScreen(Screen):
             if widget.parent:
                 self.info_box.remove_widget(widget)
 
-    # --- Register student ---
+    # --- Register student: collect several quality-gated samples first ---
     def register_new_student(self, instance):
-        if self.current_embedding is None:
-            self.info_label.text = "No face detected to register."
-            return
+        from kiosk.enrollment import EnrollmentSession
 
         first_name = self.first_input.text.strip()
         last_name = self.last_input.text.strip()
         course = self.course_input.text.strip()
         section = self.section_input.text.strip()
+        fields = (first_name, last_name, course, section)
+
+        # Second press after a duplicate warning enrolls the captured face anyway
+        pending = self.pending_enrollment
+        self.clear_pending_enrollment()
+        if pending is not None and pending[0] == fields:
+            self.save_enrollment(*pending)
+            return
 
-        if not all([first_name, last_name, course, section]):
+        if self.current_embedding is None:
+            self.info_label.text = "No face detected to register."
+            return
+
+        if not all(fields):
             self.info_label.text = "Please fill all fields."
             return
 
-        try:
-            ret, frame = self.cap.read()
-            if ret:
-                faces = self.face_app.get(frame)
-                if faces:
-                    face = faces[0]
-                    box = face.bbox.astype(int)
-                    x1, y1, x2, y2 = box
-                    face_crop = frame[y1:y2, x1:x2]
-                    _, buffer = cv2.imencode('.jpg', face_crop)
-                    face_bytes = buffer.tobytes()
-                else:
-                    face_bytes = None
-            else:
-                face_bytes = None
+        self.enrollment = EnrollmentSession(samples=self.ENROLL_SAMPLES, templates=self.ENROLL_TEMPLATES)
+        self.enrollment_fields = fields
+        self.processor.enrollment = self.enrollment
+        self.register_btn.disabled = True
+        self.info_label.text = "[b]Hold still and look at the camera...[/b]"
+
+    def update_enrollment(self):
+        session = self.enrollment
+        if not session.done:
+            self.info_label.text = (
+                f"[b]Hold still and look at the camera...[/b]\n\n"
+                f"Captured {session.count}/{session.target}"
+            )
+            return
+
+        self.enrollment = None
+        self.processor.enrollment = None
+        self.register_btn.disabled = False
+
+        if not session.succeeded:
+            reasons = ", ".join(sorted(session.rejected, key=session.rejected.get, reverse=True)[:2])
+            self.info_label.text = (
+                "[b]Could not capture a clear face.[/b]\n"
+                f"{reasons or 'no face'}. Please try again."
+            )
+            return
 
-            self.cursor.execute(
-                "INSERT INTO students (first_name, last_name, course, section, face_embedding, face_photo, created_at) "
-                "VALUES (%s,%s,%s,%s,%s,%s,NOW())",
-                (first_name, last_name, course, section,
-                 self.current_embedding.tobytes(), face_bytes)
+        templates = session.templates_matrix()
+        photo = session.best_photo()
+        duplicate = find_duplicate(self.gallery, templates, self.DUPLICATE_THRESHOLD)
+        if duplicate is not None:
+            self.pending_enrollment = (self.enrollment_fields, templates, photo)
+            self.register_btn.text = "Register anyway"
+            self.info_label.text = (
+                f"[b]Already enrolled?[/b]\n{self.describe_student(*duplicate)}\n\n"
+                "Press Register anyway to add a new record."
             )
-            self.conn.commit()
+            return
+        self.save_enrollment(self.enrollment_fields, templates, photo)
+
+    def describe_student(self, student_id, score):
+        try:
+            profile = self.processor.fetch_profile(student_id)
+        except Exception:
+            profile = None
+        if not profile:
+            return f"Matches student ID {student_id} ({score:.2f})"
+        _sid, first_name, last_name, course, section = profile
+        return f"Looks like {first_name} {last_name}, {course} {section} (ID {student_id}, {score:.2f})"
+
+    def clear_pending_enrollment(self):
+        self.pending_enrollment = None
+        self.register_btn.text = "Register"
+
+    def save_enrollment(self, fields, templates, photo):
+        first_name, last_name, course, section = fields
+        try:
+            student_id = self.db.insert_student(first_name, last_name, course, section,
+                                                encode_templates(templates, dtype=self.EMBEDDING_DTYPE),
+                                                photo)
+            self.gallery.add(student_id, templates)
 
             self.info_label.text = f"{first_name} {last_name} registered successfully!"
+            self.panel_state = ("registered",)
             self.clear_registration_fields()
 
         except Exception as e:
@@ -549,11 +930,45 @@ class FaceRecognitionScreen(Screen):
         if self.switch_to_dashboard:
             self.switch_to_dashboard()
 
+    # --- App shutdown: flush pending attendance ---
+    def shutdown(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.METRICS_CSV:
+            self.metrics.append_csv(self.METRICS_CSV)
+        self.attendance.stop()
+
+
+# ---------------- Loading Bar ----------------
+class LoadingBar(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", size_hint=(1,None), height=30,
+                         padding=[10,0], spacing=10, pos_hint={"x":0,"y":0}, **kwargs)
+        self.status = Label(text="Starting...", size_hint=(0.4,1), font_size=14,
+                            color=(1,1,1,1), halign="left", valign="middle")
+        self.status.bind(size=lambda i,v: setattr(i,'text_size',(i.width,i.height)))
+        self.add_widget(self.status)
+
+        self.bar = ProgressBar(max=1.0, value=0, size_hint=(0.6,1))
+        self.add_widget(self.bar)
+
+    def set_progress(self, fraction, message):
+        self.bar.value = fraction
+        self.status.text = message
+
+    def finish(self, message):
+        self.bar.value = 1.0
+        self.status.text = message
+        Clock.schedule_once(lambda dt: Animation(opacity=0, duration=1.0).start(self), 3)
 
 # ---------------- Main App ----------------
 class AttendanceApp(App):
     def build(self):
         sm = ScreenManager(transition=FadeTransition())
+        self.db = Database()
 
         # Welcome
         welcome_screen = Screen(name="welcome")
@@ -562,7 +977,7 @@ class AttendanceApp(App):
 
         # Login
         login_screen = Screen(name="login")
-        login_screen.add_widget(LoginScreen(switch_to_dashboard=lambda:setattr(sm,"current","dashboard")))
+        login_screen.add_widget(LoginScreen(self.db, switch_to_dashboard=lambda:setattr(sm,"current","dashboard")))
         sm.add_widget(login_screen)
 
         # Dashboard
@@ -571,12 +986,27 @@ class AttendanceApp(App):
         sm.add_widget(dashboard_screen)
 
         # Face Recognition
-        face_screen = FaceRecognitionScreen(name="face",
+        self.face_screen = FaceRecognitionScreen(self.db, name="face",
         switch_to_dashboard=lambda: setattr(sm,"current","dashboard"))
-        sm.add_widget(face_screen)
+        sm.add_widget(self.face_screen)
 
         sm.current = "welcome"
-        return sm
+
+        # Models load in the background while the welcome/login screens are up
+        root = FloatLayout()
+        root.add_widget(sm)
+        self.loading_bar = LoadingBar()
+        root.add_widget(self.loading_bar)
+        Clock.schedule_once(lambda dt: self.face_screen.start_loading(
+            on_progress=self.loading_bar.set_progress,
+            on_done=lambda elapsed: self.loading_bar.finish(
+                f"Face recognition ready ({time.perf_counter() - PROCESS_START:.1f}s cold start)")
+        ), 0)
+        return root
+
+    def on_stop(self):
+        self.face_screen.shutdown()
+        self.db.close()
 
 if __name__=="__main__":
     AttendanceApp().run()
@@ -0,0 +1,165 @@
+import itertools
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiosk.auth import PASSWORD_COLUMN_WIDTH  # noqa: E402
+from kiosk.embedding_codec import encode_templates  # noqa: E402
+
+# Database tests run against a scratch database created on the server named by
+# KIOSK_TEST_DSN (e.g. "host=localhost port=5432 user=postgres password=..."),
+# and are skipped without it.
+TEST_DSN = os.environ.get("KIOSK_TEST_DSN")
+
+# The tables as they are in attendance-system.sql
+SCHEMA = """
+CREATE TABLE students (
+    student_id serial PRIMARY KEY,
+    first_name character varying(100) NOT NULL,
+    last_name character varying(100) NOT NULL,
+    course character varying(100) NOT NULL,
+    section character varying(50) NOT NULL,
+    face_embedding bytea NOT NULL,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    face_photo bytea,
+    email character varying(255)
+);
+CREATE TABLE attendance (
+    id serial PRIMARY KEY,
+    student_id integer NOT NULL REFERENCES students (student_id),
+    "timestamp" timestamp without time zone DEFAULT now()
+);
+CREATE TABLE users (
+    id serial PRIMARY KEY,
+    username character varying(50) NOT NULL,
+    password character varying(50) NOT NULL,
+    role character varying(20) DEFAULT 'student'::character varying
+);
+"""
+
+_database_numbers = itertools.count()
+
+
+@pytest.fixture
+def db():
+    if not TEST_DSN:
+        pytest.skip("set KIOSK_TEST_DSN to run database tests")
+    import psycopg2
+    import psycopg2.extensions
+
+    from kiosk.db import Database
+
+    config = psycopg2.extensions.parse_dsn(TEST_DSN)
+    name = f"kiosk_test_{os.getpid()}_{next(_database_numbers)}"
+    admin = psycopg2.connect(**config)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE {name}")
+
+    database = Database(dict(config, dbname=name), retries=0)
+    try:
+        database.run(lambda cursor: cursor.execute(SCHEMA))
+        yield database
+    finally:
+        database.close()
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE {name}")
+        admin.close()
+
+
+@pytest.fixture
+def add_students(db):
+    def add(*names):
+        rows = [(first, "Test", "BSIT", "1A", b"\0", None) for first in names]
+        return db.insert_students(rows)
+    return add
+
+
+# ---------------- In-memory stand-ins ----------------
+@pytest.fixture
+def unit_rows():
+    def rows(n, dim=32, seed=0):
+        values = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+        return values / np.linalg.norm(values, axis=1, keepdims=True)
+    return rows
+
+
+class MemoryDatabase:
+    # In-memory stand-in for the Database methods the kiosk services use;
+    # set down to make every call fail like a lost connection
+    RETRY_ERRORS = (ConnectionError,)
+
+    def __init__(self):
+        self.users = {}         # username -> (password, role)
+        self.attendance = []    # (student_id, timestamp)
+        self.students = []      # (student_id, face_embedding, created_at)
+        self.password_width = PASSWORD_COLUMN_WIDTH
+        self.down = False
+        self.refused = set()    # student_ids insert_attendance rejects, like a broken foreign key
+        self.seeds = 0
+        self.full_loads = 0
+
+    def check(self):
+        if self.down:
+            raise ConnectionError("database is down")
+
+    # users
+    def fetch_credentials(self, username):
+        self.check()
+        row = self.users.get(username)
+        return (username, *row) if row else None
+
+    def update_password_hash(self, username, password_hash):
+        self.check()
+        if len(password_hash) > self.password_width:
+            raise ValueError("value too long for type character varying")
+        self.users[username] = (password_hash, self.users[username][1])
+        return 1
+
+    # attendance
+    def mark_today(self, *student_ids):
+        self.attendance.extend((student_id, datetime.now()) for student_id in student_ids)
+
+    def attendance_marked_today(self):
+        self.check()
+        self.seeds += 1
+        today = datetime.now().date()
+        return {student_id for student_id, timestamp in self.attendance if timestamp.date() == today}
+
+    def insert_attendance(self, rows):
+        self.check()
+        if any(student_id in self.refused for student_id, _timestamp in rows):
+            raise ValueError("insert violates foreign key constraint")
+        self.attendance.extend(rows)
+        return len(rows)
+
+    # students
+    def fetch_profile(self, student_id):
+        self.check()
+        if student_id not in {row[0] for row in self.students}:
+            return None
+        return (student_id, f"Student{student_id}", "Test", "BSIT", "1A")
+
+    def enroll(self, student_id, vector, created_at):
+        self.students.append((student_id, encode_templates(vector), created_at))
+
+    def student_ids(self):
+        self.check()
+        return {row[0] for row in self.students}
+
+    def load_embeddings_since(self, enrolled_at=None, student_id=0):
+        self.check()
+        if enrolled_at is None:
+            self.full_loads += 1
+        return sorted((row for row in self.students if enrolled_at is None or row[2] > enrolled_at),
+                      key=lambda row: (row[2], row[0]))
+
+
+@pytest.fixture
+def memory_db():
+    return MemoryDatabase()
@@ -0,0 +1,125 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from kiosk.attendance import AttendanceBuffer
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / "spool" / "attendance_spool.jsonl")
+
+
+def test_failed_seed_is_retried_on_the_next_flush(memory_db, spool_path):
+    memory_db.mark_today(7)
+    memory_db.down = True
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    with pytest.raises(ConnectionError):
+        buffer.seed()
+
+    assert buffer.mark(8)
+    assert buffer.flush() == 0
+
+    # The next flush seeds, then replays the spooled mark
+    memory_db.down = False
+    buffer.flush()
+    assert memory_db.seeds == 1
+    assert buffer.is_marked(7) and buffer.is_marked(8)
+    assert not buffer.mark(7)
+    assert sorted(student_id for student_id, _ts in memory_db.attendance) == [7, 8]
+
+
+def test_seeded_buffer_does_not_query_again(memory_db, spool_path):
+    memory_db.mark_today(7)
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    assert buffer.seed() == 1
+    assert buffer.flush() == 0
+    assert buffer.flush() == 0
+    assert memory_db.seeds == 1
+
+
+# ---------------- Spool ----------------
+def test_outage_spools_and_the_next_flush_replays(memory_db, spool_path):
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    buffer.seed()
+    assert buffer.mark(1) and buffer.mark(2)
+    assert not buffer.mark(1)
+
+    memory_db.down = True
+    assert buffer.flush() == 0
+    with open(spool_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert buffer.mark(3)
+    assert buffer.flush() == 0
+
+    memory_db.down = False
+    assert buffer.flush() == 0
+    assert [student_id for student_id, _ts in memory_db.attendance] == [1, 2, 3]
+    assert all(isinstance(ts, datetime) for _sid, ts in memory_db.attendance)
+    assert not os.path.exists(spool_path)
+
+
+def test_failed_replay_keeps_the_spool(memory_db, spool_path):
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    buffer.seed()
+    buffer.mark(1)
+    memory_db.down = True
+    buffer.flush()
+
+    # The replay and the new batch fail together; neither is lost
+    buffer.mark(2)
+    buffer.flush()
+    memory_db.down = False
+    buffer.flush()
+    assert sorted(student_id for student_id, _ts in memory_db.attendance) == [1, 2]
+
+
+def test_torn_spool_lines_are_skipped(memory_db, spool_path):
+    os.makedirs(os.path.dirname(spool_path))
+    with open(spool_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"student_id": 4, "timestamp": datetime.now().isoformat()}) + "\n")
+        f.write('{"student_id": 5, "times')
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    buffer.flush()
+    assert [student_id for student_id, _ts in memory_db.attendance] == [4]
+    assert not os.path.exists(spool_path)
+
+
+def test_rejected_rows_go_to_the_dead_letter_file(memory_db, spool_path):
+    memory_db.refused = {2}
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    buffer.seed()
+    for student_id in (1, 2, 3):
+        buffer.mark(student_id)
+    assert buffer.flush() == 2
+    assert [student_id for student_id, _ts in memory_db.attendance] == [1, 3]
+    assert not os.path.exists(spool_path)
+
+    with open(buffer.rejected_path, encoding="utf-8") as f:
+        [record] = map(json.loads, f)
+    assert record["student_id"] == 2 and "foreign key" in record["error"]
+
+    # Later marks are not held up by the bad row
+    buffer.mark(6)
+    assert buffer.flush() == 1
+
+
+def test_other_errors_are_not_spooled_as_an_outage(memory_db, spool_path):
+    buffer = AttendanceBuffer(memory_db, spool_path)
+    buffer.seed()
+    buffer.mark(1)
+    memory_db.insert_attendance = lambda rows: 1 / 0
+    assert buffer.flush() == 0
+    assert not os.path.exists(spool_path)
+    assert os.path.exists(buffer.rejected_path)
+
+
+def test_large_queues_drain_in_batches(memory_db, spool_path):
+    buffer = AttendanceBuffer(memory_db, spool_path, batch_size=2)
+    buffer.seed()
+    for student_id in range(5):
+        buffer.mark(student_id)
+    assert [buffer.flush() for _ in range(4)] == [2, 2, 1, 0]
+    assert buffer.pending() == 0
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from kiosk.auth import (DEFAULT_LOG2N, PASSWORD_COLUMN_WIDTH, Authenticator, SessionCache, hash_password,
+                        is_hashed, migrate_plaintext, verify_password, widen_password_column)
+
+FAST = {"log2n": 4, "r": 1, "p": 1}
+
+
+def test_hash_round_trip_and_length():
+    stored = hash_password("s3cret")
+    assert is_hashed(stored)
+    assert len(stored) <= PASSWORD_COLUMN_WIDTH
+    assert verify_password("s3cret", stored) == (True, False)
+    assert verify_password("wrong", stored) == (False, False)
+
+
+def test_plaintext_and_cheap_hashes_ask_for_rehash():
+    assert verify_password("admin", "admin") == (True, True)
+    assert verify_password("admin", "other") == (False, False)
+    assert verify_password("pw", hash_password("pw", **FAST)) == (True, FAST["log2n"] != DEFAULT_LOG2N)
+    assert verify_password("pw", "scrypt$garbage") == (False, False)
+
+
+def test_session_cache_expiry():
+    now = [0.0]
+    cache = SessionCache(ttl_s=10, outage_grace_s=100, clock=lambda: now[0])
+    cache.put("admin", "pw", "admin")
+    assert cache.get("admin", "pw") == "admin"
+    assert cache.get("admin", "nope") is None
+    now[0] = 50
+    assert cache.get("admin", "pw") is None
+    assert cache.get("admin", "pw", max_age_s=cache.outage_grace_s) == "admin"
+
+
+def test_login_rehashes_plaintext(memory_db):
+    memory_db.users["admin"] = ("pw", "admin")
+    auth = Authenticator(memory_db)
+    assert auth.login("admin", "pw") == ("admin", "admin")
+    assert is_hashed(memory_db.users["admin"][0])
+    assert auth.login("nobody", "pw") is None
+
+
+def test_failed_rehash_is_logged(memory_db, caplog):
+    memory_db.users["admin"] = ("pw", "admin")
+    memory_db.password_width = 50
+    with caplog.at_level(logging.WARNING, logger="kiosk.auth"):
+        assert Authenticator(memory_db).login("admin", "pw") == ("admin", "admin")
+    assert "could not re-hash" in caplog.text
+    assert memory_db.users["admin"][0] == "pw"
+
+
+# ---------------- Against the dump's users table ----------------
+def test_hash_fits_after_widening(db):
+    db.run(lambda cursor: cursor.execute(
+        "INSERT INTO users (username, password, role) VALUES ('admin', 'admin', 'admin'), ('t', 't', 'teacher')"))
+    with pytest.raises(Exception):
+        db.update_password_hash("admin", hash_password("admin"))
+
+    assert migrate_plaintext(db) == 2
+    assert widen_password_column(db) is False
+    assert Authenticator(db).login("admin", "admin") == ("admin", "admin")
@@ -0,0 +1,49 @@
+from kiosk.cache import LRUCache
+from kiosk.recognizer import FrameProcessor
+
+
+def test_least_recently_used_key_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"      # 2 is now the least recently used
+    cache.put(3, "c")
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert len(cache) == 2
+
+
+def test_put_refreshes_an_existing_key():
+    cache = LRUCache(maxsize=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.put(1, "a2")
+    cache.put(3, "c")
+    assert cache.get(1) == "a2" and cache.get(2) is None
+
+
+def test_hits_misses_pop_and_clear():
+    cache = LRUCache(maxsize=4)
+    cache.put("x", 1)
+    assert cache.get("x") == 1 and cache.get("y", "default") == "default"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.pop("x") == 1 and cache.pop("x") is None
+    cache.put("z", 2)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_profiles_are_fetched_once_and_misses_are_not_cached(memory_db):
+    calls = []
+    memory_db.enroll(7, [1.0, 0.0], None)
+    fetch = memory_db.fetch_profile
+
+    def counted(student_id):
+        calls.append(student_id)
+        return fetch(student_id)
+    memory_db.fetch_profile = counted
+
+    processor = FrameProcessor(None, None, None, memory_db, None, None, threshold=0.5, profile_cache_size=8)
+    assert processor.fetch_profile(7)[0] == 7
+    assert processor.fetch_profile(7)[0] == 7
+    assert processor.fetch_profile(8) is None and processor.fetch_profile(8) is None
+    assert calls == [7, 8, 8]
@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from kiosk.migrate_attendance import (archive_school_year, create_partitions, ensure_partitions, is_partitioned,
+                                      migrate, monthly_partitions)
+
+
+def attendance_rows(db):
+    return db.run(lambda cursor: cursor.execute(
+        "SELECT student_id, timestamp::date FROM attendance ORDER BY id") or cursor.fetchall())
+
+
+# ---------------- Legacy schema ----------------
+def test_insert_attendance_legacy_paths(db, add_students):
+    a, b = add_students("Ana", "Ben")
+    now = datetime.now()
+    assert db.insert_attendance([(a, now)]) == 1
+    assert db.insert_attendance([(b, now), (a, now)]) == 2
+    assert db.attendance_marked_today() == {a, b}
+    assert len(attendance_rows(db)) == 3
+
+
+# ---------------- Partitioned schema ----------------
+def test_migration_keeps_first_mark_per_day(db, add_students):
+    a, b = add_students("Ana", "Ben")
+    yesterday = datetime.now() - timedelta(days=1)
+    db.insert_attendance([(a, yesterday), (a, yesterday + timedelta(minutes=5)), (b, yesterday)])
+
+    stats = migrate(db)
+    assert stats["rows"] == 3 and stats["copied"] == 2 and stats["duplicates"] == 1
+    assert db.run(is_partitioned)
+    assert migrate(db) is None
+
+
+def test_insert_attendance_single_row_uses_prepared_upsert(db, add_students):
+    (a,) = add_students("Ana")
+    migrate(db)
+    now = datetime.now()
+
+    # The prepared statement runs on every single-mark flush
+    assert db.insert_attendance([(a, now)]) == 1
+    assert db.insert_attendance([(a, now + timedelta(seconds=1))]) == 0
+    assert db.insert_attendance([(a, now - timedelta(days=40))]) == 1
+    assert db.attendance_marked_today() == {a}
+
+
+def test_insert_attendance_batch_skips_conflicts(db, add_students):
+    a, b, c = add_students("Ana", "Ben", "Cy")
+    migrate(db)
+    now = datetime.now()
+    db.insert_attendance([(a, now)])
+
+    # Repeats inside one batch and rows another kiosk already wrote are both dropped
+    assert db.insert_attendance([(a, now), (b, now), (b, now), (c, now)]) == 2
+    assert sorted(row[0] for row in attendance_rows(db)) == [a, b, c]
+
+
+def test_partition_failures_are_returned(db, add_students):
+    (a,) = add_students("Ana")
+    migrate(db)
+    # A row in the default partition blocks creating its month
+    far = datetime(2099, 5, 1, 8)
+    db.insert_attendance([(a, far)])
+
+    created, failed = db.run(lambda cursor: create_partitions(cursor, date(2099, 4, 1), date(2099, 6, 1)))
+    assert created == ["attendance_2099_04", "attendance_2099_06"]
+    assert [name for name, _error in failed] == ["attendance_2099_05"]
+    assert ensure_partitions(db) == ([], [])
+
+
+def test_archive_takes_only_the_school_year(db, add_students):
+    (a,) = add_students("Ana")
+    migrate(db)
+    db.run(lambda cursor: create_partitions(cursor, date(2024, 5, 1), date(2025, 6, 1)))
+    db.insert_attendance([(a, datetime(2024, 5, 10, 8)), (a, datetime(2024, 6, 10, 8)),
+                          (a, datetime(2025, 5, 10, 8)), (a, datetime(2025, 6, 10, 8))])
+
+    with pytest.raises(ValueError):
+        archive_school_year(db, "2024-2025", before=date(2025, 8, 1))
+    with pytest.raises(ValueError):
+        archive_school_year(db, "2024-2026")
+
+    archived = archive_school_year(db, "2024-2025")
+    assert [name for name, _rows in archived][::11] == ["attendance_2024_06", "attendance_2025_05"]
+    assert len(archived) == 12 and sum(rows for _name, rows in archived) == 2
+    attached = [name for name, _month in db.run(monthly_partitions)]
+    assert "attendance_2024_05" in attached and "attendance_2025_06" in attached
+    assert attendance_rows(db) == [(a, date(2024, 5, 10)), (a, date(2025, 6, 10))]
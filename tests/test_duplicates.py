@@ -0,0 +1,105 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from kiosk.duplicates import (UnionFind, best_pair_scores, choose_keeper, cluster_pairs, find_duplicate,
+                              referencing_tables, similar_pairs, write_merge_sql)
+from kiosk.embedding_codec import quantize
+from kiosk.gallery import EmbeddingGallery
+from kiosk.migrate_attendance import archive_school_year, migrate
+
+DIM = 32
+
+
+@pytest.fixture
+def templates(unit_rows):
+    # Student 1 enrolled again as 7 (and 7 once more as 9); student 3 has two templates
+    rows = unit_rows(10)
+    rows[7] = rows[1]
+    rows[9] = rows[1]
+    rows[4] = rows[3]
+    ids = np.array([0, 1, 2, 3, 3, 5, 6, 7, 8, 9])
+    return rows, ids
+
+
+def pairs(batches):
+    return sorted(best_pair_scores(batches))
+
+
+@pytest.mark.parametrize("block_rows", [3, 4, 2048])
+def test_pairs_do_not_depend_on_the_block_size(templates, block_rows):
+    rows, ids = templates
+    assert pairs(similar_pairs(rows, ids, 0.9, block_rows=block_rows)) == [(1, 7), (1, 9), (7, 9)]
+
+
+def test_int8_rows_are_decoded_block_by_block(templates):
+    rows, ids = templates
+    values, scales = quantize(rows, "int8")
+    assert pairs(similar_pairs(values, ids, 0.9, scales=scales, block_rows=4)) == [(1, 7), (1, 9), (7, 9)]
+
+
+def test_clusters_are_transitive_and_keep_the_busiest_record():
+    clusters = cluster_pairs({(1, 2): 0.8, (2, 3): 0.7, (5, 6): 0.9})
+    assert [c["members"] for c in clusters] == [{1, 2, 3}, {5, 6}]
+
+    details = {1: ("A", "B", "C", "D", None, 2), 2: ("A", "B", "C", "D", None, 9), 3: ("A", "B", "C", "D", None, 9)}
+    assert choose_keeper({1, 2, 3}, details) == 2
+    assert choose_keeper({5, 6}, {}) == 5
+
+
+def test_union_find_roots_at_the_smallest_id():
+    uf = UnionFind()
+    uf.union(9, 4)
+    uf.union(4, 7)
+    assert {uf.find(x) for x in (4, 7, 9)} == {4}
+
+
+def test_merge_sql_moves_attendance_to_the_keeper(tmp_path):
+    clusters = cluster_pairs({(1, 2): 0.8, (2, 3): 0.7})
+    clusters[0]["keeper"] = 2
+    path = tmp_path / "merge.sql"
+    write_merge_sql(str(path), clusters)
+    sql = path.read_text()
+    assert sql.startswith("-- Generated") and sql.rstrip().endswith("COMMIT;")
+    assert "UPDATE attendance SET student_id = 2 WHERE student_id IN (1, 3);" in sql
+    assert "DELETE FROM students WHERE student_id IN (1, 3);" in sql
+
+
+def test_merge_sql_reaches_the_legacy_and_archived_attendance(db, add_students, tmp_path):
+    keeper, duplicate = add_students("Ana", "Ana")
+    db.insert_attendance([(keeper, datetime(2024, 6, 10, 8)), (duplicate, datetime(2024, 6, 10, 9)),
+                          (duplicate, datetime(2024, 6, 11, 8))])
+    migrate(db)
+    archive_school_year(db, "2024-2025")
+    db.insert_attendance([(duplicate, datetime.now())])
+
+    tables = referencing_tables(db)
+    names = [table for table, _column, _per_day in tables]
+    assert names[0] == "attendance" and names[-1] == "attendance_legacy"
+    assert len(names) == 2 + 12 and "attendance_archive.attendance_2024_06" in names
+    assert all(column == "student_id" and per_day for _table, column, per_day in tables)
+    path = tmp_path / "merge.sql"
+    write_merge_sql(str(path), [{"members": {keeper, duplicate}, "keeper": keeper, "edges": {(1, 2): 0.9}}],
+                    tables)
+    db.run(lambda cursor: cursor.execute(path.read_text()))
+
+    def marks(table):
+        return db.run(lambda cursor: cursor.execute(
+            f'SELECT student_id, "timestamp"::date FROM {table} ORDER BY id') or cursor.fetchall())
+    assert marks("attendance") == [(keeper, date.today())]
+    assert marks("attendance_archive.attendance_2024_06") == [(keeper, date(2024, 6, 10)),
+                                                              (keeper, date(2024, 6, 11))]
+    assert marks("attendance_legacy") == marks("attendance_archive.attendance_2024_06")
+    assert db.run(lambda cursor: cursor.execute("SELECT student_id FROM students") or cursor.fetchall()) == [
+        (keeper,)]
+
+
+def test_registration_check_finds_the_best_match(unit_rows):
+    rows = unit_rows(5)
+    gallery = EmbeddingGallery(dim=DIM)
+    for student_id, row in enumerate(rows, start=1):
+        gallery.add(student_id, row)
+    student_id, score = find_duplicate(gallery, np.vstack([unit_rows(1, seed=8)[0], rows[2]]))
+    assert student_id == 3 and score == pytest.approx(1.0, abs=1e-5)
+    assert find_duplicate(gallery, unit_rows(2, seed=8)) is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from kiosk.embedding_codec import (DEFAULT_MODEL, HEADER, EmbeddingFormatError, decode_templates, dequantize,
+                                   encode_templates, is_versioned, quantize)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-7), ("float16", 1e-3), ("int8", 1e-2)])
+def test_round_trip_per_dtype(dtype, tolerance, unit_rows):
+    templates = unit_rows(3, 512)
+    data = encode_templates(templates, dtype=dtype)
+    record = decode_templates(data)
+
+    assert is_versioned(data)
+    assert (record.model, record.dim, record.dtype, record.normalized) == (DEFAULT_MODEL, 512, dtype, True)
+    assert record.vectors.dtype == np.dtype({"float32": "<f4", "float16": "<f2", "int8": "i1"}[dtype])
+    assert (record.scales is not None) == (dtype == "int8")
+    assert np.abs(dequantize(record.vectors, record.scales) - templates).max() < tolerance
+
+
+def test_record_size_per_dtype(unit_rows):
+    templates = unit_rows(2, 512)
+    name = len(DEFAULT_MODEL)
+    assert len(encode_templates(templates, dtype="float32")) == HEADER.size + name + 2 * 512 * 4
+    assert len(encode_templates(templates, dtype="float16")) == HEADER.size + name + 2 * 512 * 2
+    assert len(encode_templates(templates, dtype="int8")) == HEADER.size + name + 2 * 4 + 2 * 512
+
+
+def test_encode_normalizes_and_accepts_one_template():
+    record = decode_templates(encode_templates(np.full(512, 3.0, np.float32)))
+    assert record.vectors.shape == (1, 512)
+    assert np.linalg.norm(record.vectors[0]) == pytest.approx(1.0)
+
+
+def test_int8_quantization_uses_the_full_range(unit_rows):
+    values, scales = quantize(unit_rows(4, 512), "int8")
+    assert values.dtype == np.int8 and scales.dtype == np.float32
+    assert (np.abs(values).max(axis=1) == 127).all()
+    zero_values, zero_scales = quantize(np.zeros((1, 8), np.float32), "int8")
+    assert not zero_values.any() and zero_scales[0] == 1.0
+
+
+def test_legacy_float32_rows_still_decode(unit_rows):
+    templates = unit_rows(2, 512)
+    record = decode_templates(templates.tobytes(), dim=512)
+    assert record.model is None and not record.normalized
+    assert np.array_equal(record.vectors, templates)
+
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(templates.tobytes()[:-4], dim=512)
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(templates.tobytes())
+
+
+def test_malformed_records_are_rejected(unit_rows):
+    data = encode_templates(unit_rows(1, 512), dtype="int8")
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(data[:HEADER.size - 1])
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(data[:-1])
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(data[:4] + bytes([99]) + data[5:])
+    with pytest.raises(EmbeddingFormatError):
+        decode_templates(data[:5] + bytes([7]) + data[6:])
+    with pytest.raises(EmbeddingFormatError):
+        quantize(unit_rows(1, 512), "bfloat16")
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+
+from kiosk.bench_pipeline import StandInFace
+from kiosk.enrollment import EnrollmentSession, pose_offsets
+
+BOX = np.array([100, 100, 300, 300], np.float32)
+FRONTAL = np.array([[150, 160], [250, 160], [200, 210], [160, 260], [240, 260]], np.float32)
+
+
+@pytest.fixture
+def sharp_frame():
+    return np.random.default_rng(0).integers(0, 256, (400, 400, 3), dtype=np.uint8)
+
+
+def face(embedding, bbox=BOX, kps=FRONTAL, det_score=0.9, yaw_px=0.0):
+    kps = None if kps is None else kps + np.array([[0, 0], [0, 0], [yaw_px, 0], [0, 0], [0, 0]], np.float32)
+    return StandInFace(bbox=bbox, kps=kps, det_score=det_score, embedding=np.asarray(embedding, np.float32))
+
+
+def test_pose_of_a_frontal_face_is_zero():
+    assert pose_offsets(FRONTAL) == pytest.approx((0.0, 0.0))
+    assert pose_offsets(face([1.0], yaw_px=50).kps)[0] == pytest.approx(0.5)
+
+
+def test_quality_gates(sharp_frame):
+    session = EnrollmentSession()
+    vec = np.ones(8)
+    assert not session.add(sharp_frame, face(vec, det_score=0.3))
+    assert not session.add(sharp_frame, face(vec, bbox=np.array([100, 100, 150, 150], np.float32)))
+    assert not session.add(sharp_frame, face(vec, yaw_px=50))
+    assert not session.add(np.full((400, 400, 3), 128, np.uint8), face(vec))
+    assert not session.add(sharp_frame, face(vec, kps=None))
+    assert session.rejected == {"low detector score": 1, "face too small": 1, "not facing camera": 1,
+                                "blurry": 1, "no landmarks": 1}
+    assert session.count == 0 and not session.succeeded
+    assert session.templates_matrix() is None and session.best_photo() is None
+
+
+def test_samples_average_into_one_normalized_template(sharp_frame):
+    rng = np.random.default_rng(1)
+    identity = rng.standard_normal(64)
+    samples = [identity + 0.3 * rng.standard_normal(64) for _ in range(4)]
+    session = EnrollmentSession(samples=4, min_samples=3)
+    for sample in samples:
+        assert session.add(sharp_frame, face(sample))
+    assert session.done and session.succeeded
+    assert not session.add(sharp_frame, face(identity))
+
+    units = [s / np.linalg.norm(s) for s in samples]
+    expected = np.mean(units, axis=0)
+    templates = session.templates_matrix()
+    assert templates.shape == (1, 64) and templates.dtype == np.float32
+    assert np.allclose(templates[0], expected / np.linalg.norm(expected), atol=1e-6)
+
+
+def test_templates_split_the_samples_by_pose(sharp_frame):
+    left, right = np.eye(8)[0], np.eye(8)[1]
+    session = EnrollmentSession(samples=4, min_samples=2, templates=2)
+    for embedding, yaw_px in ((right, 20), (left, -20), (right, 10), (left, -10)):
+        session.add(sharp_frame, face(embedding, yaw_px=yaw_px))
+    templates = session.templates_matrix()
+    assert np.allclose(templates, [left, right])
+
+
+def test_window_closes_the_session(sharp_frame):
+    session = EnrollmentSession(window_s=0.0)
+    assert session.done
+    assert not session.add(sharp_frame, face(np.ones(8)))
+
+
+def test_best_photo_is_the_most_frontal_sample(sharp_frame):
+    frontal_frame = np.random.default_rng(5).integers(0, 256, sharp_frame.shape, dtype=np.uint8)
+    session = EnrollmentSession(samples=2, min_samples=1)
+    session.add(sharp_frame, face(np.ones(8), yaw_px=20))
+    session.add(frontal_frame, face(np.ones(8)))
+
+    photo = cv2.imdecode(np.frombuffer(session.best_photo(), np.uint8), cv2.IMREAD_COLOR).astype(np.float32)
+    # 20% margin around the 200 px box
+    assert photo.shape == (280, 280, 3)
+    error = [np.abs(photo - frame[60:340, 60:340]).mean() for frame in (sharp_frame, frontal_frame)]
+    assert error[1] < error[0]
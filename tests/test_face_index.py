@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from kiosk.embedding_codec import encode_templates, quantize
+from kiosk.face_index import ExactIndex, IVFIndex, load_or_build_index
+from kiosk.gallery import EmbeddingGallery
+
+
+@pytest.fixture
+def gallery(unit_rows):
+    return unit_rows(400), np.arange(400, dtype=np.int64)
+
+
+def test_ivf_finds_enrolled_rows(gallery):
+    matrix, ids = gallery
+    index = IVFIndex(n_probe=64)
+    index.build(matrix, ids)
+    found, scores = index.search_batch(matrix[:50])
+    assert found.tolist() == ids[:50].tolist()
+    assert np.allclose(scores, 1.0, atol=1e-5)
+
+
+def test_exact_and_ivf_agree(gallery, unit_rows):
+    matrix, ids = gallery
+    exact, ivf = ExactIndex(), IVFIndex(n_probe=64)
+    exact.build(matrix, ids)
+    ivf.build(matrix, ids)
+    query = unit_rows(1, seed=1)[0]
+    assert exact.search(query, k=3)[0].tolist() == ivf.search(query, k=3)[0].tolist()
+
+
+def test_index_is_reused_and_extended(tmp_path, gallery):
+    matrix, ids = gallery
+    path = str(tmp_path / "ivf.npz")
+    load_or_build_index(path, matrix[:380], ids[:380])
+    mtime = (tmp_path / "ivf.npz").stat().st_mtime_ns
+
+    index = load_or_build_index(path, matrix, ids)
+    assert len(index) == 400 and index.source_rows == 380
+    assert index.search(matrix[390], k=1)[0][0] == 390
+    assert (tmp_path / "ivf.npz").stat().st_mtime_ns == mtime
+
+
+def test_stale_index_is_rebuilt(tmp_path, gallery, unit_rows):
+    matrix, ids = gallery
+    path = str(tmp_path / "ivf.npz")
+    load_or_build_index(path, matrix, ids)
+
+    # Same IDs, but student 7 re-enrolled with a new template
+    updated = matrix.copy()
+    updated[7] = unit_rows(1, seed=2)[0]
+    index = load_or_build_index(path, updated, ids)
+    found, scores = index.search(updated[7], k=1)
+    assert found[0] == 7 and scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert IVFIndex.load(path).fingerprint == index.fingerprint
+
+
+def test_removed_rows_force_a_rebuild(tmp_path, gallery):
+    matrix, ids = gallery
+    path = str(tmp_path / "ivf.npz")
+    load_or_build_index(path, matrix, ids)
+    index = load_or_build_index(path, matrix[1:], ids[1:])
+    assert len(index) == 399 and 0 not in index.search(matrix[0], k=3)[0]
+    assert index.source_rows == 399
+
+
+def test_gallery_saves_a_rebuilt_index(tmp_path, gallery):
+    matrix, ids = gallery
+    path = str(tmp_path / "ivf.npz")
+    faces = EmbeddingGallery(dim=32)
+    faces.ANN_MIN_SIZE = 100
+    faces.load((int(i), encode_templates(row)) for i, row in zip(ids, matrix))
+    assert faces.use_ann_index(path)
+
+    # A full reload in another order retrains; the next start reuses that index
+    faces.load((int(i), encode_templates(row)) for i, row in zip(ids[::-1], matrix[::-1]))
+    assert IVFIndex.load(path).fingerprint == faces.index.fingerprint
+    mtime = (tmp_path / "ivf.npz").stat().st_mtime_ns
+    load_or_build_index(path, faces.matrix, faces.ids)
+    assert (tmp_path / "ivf.npz").stat().st_mtime_ns == mtime
+
+
+def test_ivf_reads_quantized_rows_in_place(gallery):
+    matrix, ids = gallery
+    values, scales = quantize(matrix, "int8")
+    exact, ivf = ExactIndex(), IVFIndex(n_probe=64)
+    exact.build(values, ids, scales)
+    ivf.build(values, ids, scales)
+    assert ivf.search_batch(matrix[:50])[0].tolist() == exact.search_batch(matrix[:50])[0].tolist()
+    # Centroids plus one position per row, no decoded copy of the gallery
+    assert ivf.order.nbytes + ivf.centroids.nbytes < values.nbytes
+
+
+def test_gallery_keeps_one_copy_with_ann_index(tmp_path, gallery):
+    matrix, ids = gallery
+    g = EmbeddingGallery(dim=matrix.shape[1], storage="int8")
+    g.ANN_MIN_SIZE = 100
+    for student_id, row in zip(ids[:300], matrix[:300]):
+        g.add(student_id, row)
+    assert g.use_ann_index(str(tmp_path / "ivf.npz"))
+    assert g.index._matrix.base is g.matrix.base
+
+    g.add(1000, matrix[350])
+    assert g.match(matrix[350], 0.9)[0] == 1000
+    assert len(g.index) == 301 and g.index.source_rows == 300
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from kiosk.embedding_codec import encode_templates
+from kiosk.gallery import EmbeddingGallery
+
+DIM = 64
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_load_and_match_per_storage(storage, unit_rows):
+    vectors = unit_rows(300, DIM)
+    gallery = EmbeddingGallery(dim=DIM, storage=storage)
+    assert gallery.load((i + 1, encode_templates(v)) for i, v in enumerate(vectors)) == 300
+    assert gallery.matrix.dtype == np.dtype(storage)
+
+    student_id, score = gallery.match(vectors[41], threshold=0.9)
+    assert student_id == 42 and score == pytest.approx(1.0, abs=0.02)
+    matches = gallery.match_batch(np.vstack([vectors[7], unit_rows(1, DIM, seed=9)[0]]), threshold=0.9)
+    assert matches[0][0] == 8 and matches[1] is None
+
+
+def test_storage_shrinks_the_matrix(unit_rows):
+    sizes = {}
+    for storage in ("float32", "float16", "int8"):
+        gallery = EmbeddingGallery(dim=DIM, storage=storage)
+        gallery.load((i, encode_templates(v)) for i, v in enumerate(unit_rows(100, DIM)))
+        sizes[storage] = gallery.nbytes
+    assert sizes["float32"] > sizes["float16"] > sizes["int8"]
+
+
+def test_rejected_rows_are_counted(unit_rows):
+    gallery = EmbeddingGallery(dim=DIM)
+    rows = [
+        (1, encode_templates(unit_rows(1, DIM)[0])),
+        (2, encode_templates(unit_rows(1, DIM)[0], model="other_model")),
+        (3, encode_templates(np.ones(32, np.float32))),
+        (4, b"\x00" * 7),
+        (5, unit_rows(1, DIM, seed=3)[0].tobytes()),          # legacy raw float32
+    ]
+    assert gallery.load(rows) == 2
+    assert gallery.rejected == {"model": 1, "dimension": 1, "format": 1}
+    assert sorted(gallery.ids.tolist()) == [1, 5]
+
+
+def test_student_with_several_templates(unit_rows):
+    templates = unit_rows(3, DIM)
+    gallery = EmbeddingGallery(dim=DIM)
+    gallery.add(10, templates)
+    gallery.add(11, unit_rows(1, DIM, seed=5))
+    assert gallery.ids.tolist() == [10, 10, 10, 11]
+    assert gallery.match(templates[2], threshold=0.9)[0] == 10
+
+    with pytest.raises(ValueError):
+        gallery.add(12, np.ones(DIM + 1, np.float32))
+
+
+def test_growth_and_extend_keep_earlier_rows(unit_rows):
+    vectors = unit_rows(600, DIM)
+    gallery = EmbeddingGallery(dim=DIM, storage="int8")
+    gallery.load((i, encode_templates(v)) for i, v in enumerate(vectors[:200]))
+    assert gallery.extend((i, encode_templates(v)) for i, v in enumerate(vectors[200:], start=200)) == 400
+    assert len(gallery) == 600
+    found = [m[0] for m in gallery.match_batch(vectors[::50], threshold=0.9)]
+    assert found == list(range(0, 600, 50))
+
+
+def test_attach_checks_dtype_and_scales():
+    gallery = EmbeddingGallery(dim=DIM, storage="int8")
+    with pytest.raises(ValueError):
+        gallery.attach(np.zeros((2, DIM), np.float32), np.arange(2))
+    with pytest.raises(ValueError):
+        gallery.attach(np.zeros((2, DIM), np.int8), np.arange(2))
+    assert gallery.attach(np.zeros((2, DIM), np.int8), np.arange(2), np.ones(2, np.float32)) == 2
+
+
+def test_empty_gallery_matches_nothing(unit_rows):
+    gallery = EmbeddingGallery(dim=DIM)
+    assert gallery.match(unit_rows(1, DIM)[0], threshold=0.1) is None
+    assert gallery.match_batch(unit_rows(2, DIM), threshold=0.1) == [None, None]
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("insightface")
+
+from kiosk.inference import DEFAULT_PROFILE, PROFILES, detect_faces, resolve_profile  # noqa: E402
+
+
+# ---------------- Profiles ----------------
+def test_explicit_profile_wins(tmp_path):
+    path = tmp_path / "inference_profile.json"
+    path.write_text(json.dumps({"profile": "fast"}))
+    assert resolve_profile("balanced", str(path)) is PROFILES["balanced"]
+    with pytest.raises(ValueError):
+        resolve_profile("turbo", str(path))
+
+
+def test_auto_uses_the_calibrated_profile(tmp_path):
+    path = tmp_path / "inference_profile.json"
+    path.write_text(json.dumps({"profile": "fast-int8", "fps": 21.5}))
+    assert resolve_profile("auto", str(path)) is PROFILES["fast-int8"]
+    assert resolve_profile(None, str(path)) is PROFILES["fast-int8"]
+
+
+@pytest.mark.parametrize("content", [None, "not json", '{"profile": "retired"}', "{}"])
+def test_missing_or_bad_calibration_falls_back(tmp_path, content):
+    path = tmp_path / "inference_profile.json"
+    if content is not None:
+        path.write_text(content)
+    assert resolve_profile("auto", str(path)) is PROFILES[DEFAULT_PROFILE]
+
+
+# ---------------- Detection rescaling ----------------
+class FakeDetector:
+    # Returns one face at fixed coordinates of whatever image it is given
+    def __init__(self):
+        self.shapes = []
+
+    def detect(self, image, max_num=0, metric="default"):
+        self.shapes.append(image.shape)
+        bboxes = np.array([[100, 50, 200, 170, 0.9]], np.float32)
+        kpss = np.array([[[120, 90], [180, 90], [150, 120], [125, 150], [175, 150]]], np.float32)
+        return bboxes, kpss
+
+
+class FakeFaceApp:
+    def __init__(self, profile):
+        self.profile = profile
+        self.det_model = FakeDetector()
+
+
+def test_wide_frames_are_detected_small_and_mapped_back():
+    app = FakeFaceApp(PROFILES["fast"])        # detect_width=640
+    [face] = detect_faces(app, np.zeros((720, 1280, 3), np.uint8))
+    assert app.det_model.shapes == [(360, 640, 3)]
+    assert np.allclose(face.bbox, [200, 100, 400, 340])
+    assert np.allclose(face.kps[0], [240, 180]) and np.allclose(face.kps[4], [350, 300])
+    assert face.det_score == pytest.approx(0.9)
+
+
+def test_frames_within_the_detect_width_are_not_resized():
+    app = FakeFaceApp(PROFILES["balanced"])    # detect_width=960
+    [face] = detect_faces(app, np.zeros((480, 640, 3), np.uint8))
+    assert app.det_model.shapes == [(480, 640, 3)]
+    assert np.allclose(face.bbox, [100, 50, 200, 170])
+
+    app = FakeFaceApp(PROFILES["accurate"])    # never resized
+    detect_faces(app, np.zeros((1080, 1920, 3), np.uint8))
+    assert app.det_model.shapes == [(1080, 1920, 3)]
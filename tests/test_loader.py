@@ -0,0 +1,48 @@
+from kiosk.loader import BackgroundLoader
+
+
+def run_loader(steps):
+    events = []
+    loader = BackgroundLoader(
+        steps,
+        on_progress=lambda fraction, label: events.append(("progress", fraction, label)),
+        on_done=lambda seconds: events.append(("done",)),
+        on_error=lambda label, error: events.append(("error", label, str(error))),
+    )
+    loader.start()
+    loader.join(5)
+    return loader, events
+
+
+def test_progress_is_reported_per_step():
+    ran = []
+    loader, events = run_loader([("Loading models...", lambda: ran.append(1)),
+                                 ("Loading gallery...", lambda: ran.append(2))])
+    assert ran == [1, 2]
+    assert events == [("progress", 0.0, "Loading models..."), ("progress", 0.5, "Loading gallery..."),
+                      ("progress", 1.0, "Ready"), ("done",)]
+    assert list(loader.timings) == ["Loading models...", "Loading gallery..."]
+
+
+def test_failed_step_stops_the_load():
+    ran = []
+
+    def fail():
+        raise RuntimeError("database is down")
+
+    loader, events = run_loader([("Connecting...", fail), ("Loading gallery...", lambda: ran.append(1))])
+    assert ran == []
+    assert events == [("progress", 0.0, "Connecting..."), ("error", "Connecting...", "database is down")]
+    assert loader.timings == {}
+
+
+def test_callbacks_go_through_dispatch():
+    dispatched = []
+    loader = BackgroundLoader([("Step", lambda: None)], on_done=lambda seconds: dispatched.append("done"),
+                              dispatch=lambda fn: dispatched.append(fn))
+    loader.start()
+    loader.join(5)
+    # Nothing ran on the loader thread; the dispatcher gets the callback to run later
+    assert len(dispatched) == 1 and callable(dispatched[0])
+    dispatched.pop()()
+    assert dispatched == ["done"]
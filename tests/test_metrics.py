@@ -0,0 +1,92 @@
+import csv
+import urllib.error
+import urllib.request
+
+import pytest
+
+from kiosk.metrics import DEFAULT_BUCKETS_MS, MetricsServer, PipelineMetrics, RollingHistogram, StageTimer
+
+
+def test_percentiles_follow_the_recent_window():
+    histogram = RollingHistogram(window=100)
+    for value in range(1, 1001):
+        histogram.observe(value)
+    p50, p95, p99 = histogram.percentiles()
+    assert p50 == pytest.approx(950.5) and p95 == pytest.approx(995.05) and p99 == pytest.approx(999.01)
+    # Counts and sum keep every sample
+    _counts, count, total = histogram.snapshot()
+    assert count == 1000 and total == 500500
+    assert RollingHistogram().percentiles() == [0.0, 0.0, 0.0]
+
+
+def test_buckets_are_cumulative_and_inclusive():
+    metrics = PipelineMetrics()
+    for ms in (0.5, 1, 3, 5, 7, 3000):
+        metrics.observe("detect", ms)
+
+    lines = metrics.prometheus_text().splitlines()
+    assert lines[:2] == ["# HELP kiosk_stage_latency_ms Per-stage latency of the recognition pipeline",
+                         "# TYPE kiosk_stage_latency_ms histogram"]
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.split()[-1]) for line in lines if "_bucket" in line}
+    assert list(buckets) == [str(bound) for bound in DEFAULT_BUCKETS_MS] + ["+Inf"]
+    assert [buckets[le] for le in ("1", "2", "5", "10", "2500", "+Inf")] == [2, 2, 4, 5, 5, 6]
+    assert lines[-2:] == ['kiosk_stage_latency_ms_sum{stage="detect"} 3016.500',
+                          'kiosk_stage_latency_ms_count{stage="detect"} 6']
+
+
+def test_gauges_in_prometheus_text():
+    metrics = PipelineMetrics()
+    metrics.set_gauge("fps", 14.5, camera="1")
+    metrics.set_gauge("fps", 29.0, camera="0")
+    metrics.set_gauge("gallery_size", 12000)
+    assert metrics.gauge("fps", camera="1") == 14.5 and metrics.gauge("missing") == 0.0
+
+    text = metrics.prometheus_text()
+    assert text.endswith("\n")
+    assert text.count("# TYPE kiosk_fps gauge") == 1
+    assert 'kiosk_fps{camera="0"} 29\nkiosk_fps{camera="1"} 14.5\n' in text
+    assert "# TYPE kiosk_gallery_size gauge\nkiosk_gallery_size 12000\n" in text
+
+
+def test_stage_timings_and_summary():
+    timer = StageTimer()
+    with timer.stage("detect"):
+        pass
+    timer.add("embed", 4.0)
+    timer.add("embed", 2.0)
+    assert timer.timings["embed"] == 6.0 and timer.timings["detect"] >= 0
+
+    metrics = PipelineMetrics()
+    metrics.observe_timings({"detect": 10.0, "embed": 6.0})
+    metrics.observe_timings({"detect": 20.0})
+    summary = metrics.summary()
+    assert list(summary) == ["detect", "embed"]
+    assert summary["detect"][0] == pytest.approx(15.0) and summary["detect"][3] == 2
+
+
+def test_csv_header_is_written_once(tmp_path):
+    metrics = PipelineMetrics()
+    metrics.observe("match", 1.5)
+    path = str(tmp_path / "logs" / "metrics.csv")
+    metrics.append_csv(path)
+    metrics.append_csv(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["time", "stage", "count", "p50_ms", "p95_ms", "p99_ms"]
+    assert [row[1:] for row in rows[1:]] == [["match", "1", "1.50", "1.50", "1.50"]] * 2
+
+
+def test_metrics_endpoint():
+    metrics = PipelineMetrics()
+    metrics.set_gauge("attendance_pending", 3)
+    server = MetricsServer(metrics, port=0)
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.server.server_port}"
+        with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"] == "text/plain; version=0.0.4"
+            assert "kiosk_attendance_pending 3" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other", timeout=5)
+    finally:
+        server.stop()
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from kiosk.pipeline import FrameHub, FrameResult, LatestQueue, MultiCameraPipeline
+
+
+# ---------------- Latest-Frame-Wins Queue ----------------
+def test_latest_frame_wins():
+    queue = LatestQueue()
+    for frame in (1, 2, 3):
+        queue.put(frame)
+    assert queue.get(timeout=0) == 3
+    assert queue.dropped == 2
+    assert queue.get(timeout=0) is None
+
+
+def test_get_waits_for_the_next_frame():
+    queue = LatestQueue()
+    threading.Timer(0.05, queue.put, args=("frame",)).start()
+    assert queue.get(timeout=5) == "frame"
+    assert queue.get(timeout=0.01) is None
+
+
+# ---------------- Frame Hub ----------------
+def test_hub_keeps_the_latest_frame_per_camera():
+    hub = FrameHub(2)
+    hub.put(0, "old")
+    hub.put(0, "new")
+    hub.put(1, "only")
+    assert hub.take(4, timeout=0) == [(0, "new"), (1, "only")]
+    assert hub.dropped == [1, 0]
+
+
+def test_busy_camera_is_not_handed_to_a_second_worker():
+    hub = FrameHub(3)
+    for camera in range(3):
+        hub.put(camera, f"a{camera}")
+    assert hub.take(2, timeout=0) == [(0, "a0"), (1, "a1")]
+
+    # Camera 0 has a new frame, but its first one is still being processed
+    hub.put(0, "b0")
+    assert hub.take(4, timeout=0) == [(2, "a2")]
+    assert hub.take(4, timeout=0) == []
+    hub.release([0, 1])
+    assert hub.take(4, timeout=0) == [(0, "b0")]
+
+
+def test_hub_serves_cameras_round_robin():
+    hub = FrameHub(3)
+    served = []
+    for _ in range(3):
+        for camera in range(3):
+            hub.put(camera, camera)
+        batch = hub.take(1, timeout=0)
+        served.append(batch[0][0])
+        hub.release([batch[0][0]])
+    assert served == [0, 1, 2]
+
+
+# ---------------- Multi-Camera Pipeline ----------------
+class FakeCapture:
+    def __init__(self, camera):
+        self.camera = camera
+        self.count = 0
+
+    def read(self):
+        time.sleep(0.001)
+        self.count += 1
+        return True, (self.camera, self.count)
+
+    def release(self):
+        pass
+
+
+def test_each_camera_is_held_by_one_worker_at_a_time():
+    lock = threading.Lock()
+    active, overlaps, processed = set(), [], []
+
+    def process_batch(cameras, frames):
+        with lock:
+            overlaps.extend(camera for camera in cameras if camera in active)
+            active.update(cameras)
+        time.sleep(0.005)
+        with lock:
+            active.difference_update(cameras)
+            processed.extend(cameras)
+        return [FrameResult(frame) for frame in frames]
+
+    pipeline = MultiCameraPipeline([lambda camera=camera: FakeCapture(camera) for camera in range(3)],
+                                   process_batch, workers=4, max_batch=2)
+    pipeline.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(processed) < 30 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Every camera's result queue gets its own frames only
+        latest = [results.get(timeout=1) for results in pipeline.results]
+    finally:
+        pipeline.stop()
+
+    assert overlaps == []
+    assert set(processed) == {0, 1, 2}
+    assert [result.frame[0] for result in latest] == [0, 1, 2]
+
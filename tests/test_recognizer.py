@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import numpy as np
+
+from kiosk.bench_pipeline import StandInFace
+from kiosk.gallery import EmbeddingGallery
+from kiosk.recognizer import FrameProcessor
+from kiosk.tracking import FaceTracker
+
+DIM = 16
+FACES = {1: np.eye(DIM, dtype=np.float32)[0], 2: np.eye(DIM, dtype=np.float32)[1]}
+
+
+class Marks:
+    def __init__(self):
+        self.marked = []
+
+    def mark(self, student_id):
+        self.marked.append(student_id)
+        return True
+
+
+def door_processor(db, in_front, reverify_every=10):
+    # One face box that never moves; whoever is in front of the camera fills it
+    gallery = EmbeddingGallery(dim=DIM)
+    for student_id, vec in FACES.items():
+        gallery.add(student_id, vec)
+        db.enroll(student_id, vec, datetime.now())
+
+    def detect(frame):
+        return [StandInFace(bbox=np.array([100, 100, 200, 200], np.float32), det_score=0.99)]
+
+    def embed(frame, faces):
+        return np.vstack([FACES[in_front[0]] for _face in faces])
+
+    attendance = Marks()
+    processor = FrameProcessor(detect, embed, gallery, db, attendance, FaceTracker(detect_every=1),
+                               threshold=0.5, vote_cooldown_s=0.0, reverify_every=reverify_every,
+                               profile_retry_s=0.0)
+    return processor, attendance
+
+
+def test_next_person_in_the_box_does_not_inherit_the_identity(memory_db):
+    frame = np.zeros((240, 320, 3), np.uint8)
+    in_front = [1]
+    processor, attendance = door_processor(memory_db, in_front, reverify_every=2)
+
+    for _ in range(3):
+        result = processor.process(frame)
+    assert result.student[0] == 1 and attendance.marked == [1]
+
+    in_front[0] = 2
+    for _ in range(12):
+        result = processor.process(frame)
+    assert len(processor.tracker.tracks) == 1
+    assert result.student[0] == 2
+    assert attendance.marked == [1, 2]
+
+
+def test_identified_track_is_not_embedded_every_frame(memory_db):
+    frame = np.zeros((240, 320, 3), np.uint8)
+    processor, _attendance = door_processor(memory_db, [1], reverify_every=5)
+    embedded = sum("embed" in processor.process(frame).timings for _ in range(23))
+    # Three frames to commit, then one re-check every fifth detection
+    assert embedded == 3 + 4
+
+
+def test_profile_outage_still_marks_attendance(memory_db):
+    frame = np.zeros((240, 320, 3), np.uint8)
+    processor, attendance = door_processor(memory_db, [1])
+    memory_db.down = True
+    for _ in range(4):
+        result = processor.process(frame)
+    assert attendance.marked == [1]
+    assert result.student is None and result.status == "pending"
+    assert result.attendance == "Attendance marked!"
+
+    # The profile is fetched again once the database is back, without a second mark
+    memory_db.down = False
+    result = processor.process(frame)
+    assert result.student[0] == 1 and result.status == "known"
+    assert attendance.marked == [1]
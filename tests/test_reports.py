@@ -0,0 +1,111 @@
+import csv
+import http.client
+import io
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from kiosk.reports import AttendanceRollups, ReportsHandler
+
+
+def present(rollups, day):
+    return {row["date"]: row["present"] for row in rollups.daily(day, day)}.get(day.isoformat(), 0)
+
+
+def insert_with_id(db, record_id, student_id, timestamp):
+    db.run(lambda cursor: cursor.execute(
+        'INSERT INTO attendance (id, student_id, "timestamp") VALUES (%s, %s, %s)',
+        (record_id, student_id, timestamp)))
+
+
+@contextmanager
+def serving(rollups):
+    handler = type("Handler", (ReportsHandler,), {"rollups": rollups})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ---------------- Rollups ----------------
+def test_refolding_the_overlap_does_not_double_count(db, add_students):
+    a, b, c = add_students("Ana", "Ben", "Cy")
+    rollups = AttendanceRollups(db)
+    rollups.ensure_schema()
+    today = date.today()
+    now = datetime.now()
+
+    insert_with_id(db, 10, a, now)
+    insert_with_id(db, 11, b, now)
+    assert rollups.refresh() == 11
+    assert present(rollups, today) == 2
+
+    # Nothing new: the overlap is folded again without counting anyone twice
+    rollups.refresh()
+    assert present(rollups, today) == 2
+
+    # A lower id committed after the watermark moved past it, plus a repeat mark
+    insert_with_id(db, 5, c, now)
+    insert_with_id(db, 12, a, now + timedelta(minutes=1))
+    rollups.refresh()
+    assert present(rollups, today) == 3
+    assert rollups.sections(today) == [{"course": "BSIT", "section": "1A", "present": 3, "enrolled": 3,
+                                        "absent": 0, "rate": 100.0}]
+
+
+def test_refresh_folds_in_chunks(db, add_students):
+    students = add_students(*[f"S{i}" for i in range(7)])
+    rollups = AttendanceRollups(db)
+    rollups.ensure_schema()
+    rollups.CHUNK = 2
+    yesterday = datetime.now() - timedelta(days=1)
+    db.insert_attendance([(student_id, yesterday) for student_id in students])
+
+    assert rollups.refresh() == 7
+    assert present(rollups, yesterday.date()) == 7
+    assert rollups.refresh() == 0
+
+
+# ---------------- CSV export ----------------
+def test_export_streams_every_row_in_chunks(db, add_students):
+    a, b = add_students("Ana", "Ben")
+    start = datetime(2026, 3, 2, 8)
+    db.insert_attendance([(a if i % 2 else b, start + timedelta(minutes=i)) for i in range(2500)])
+    rollups = AttendanceRollups(db)
+
+    with serving(rollups) as conn:
+        conn.request("GET", "/api/attendance/export.csv?from=2026-03-01&to=2026-03-31&course=BSIT")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        rows = list(csv.reader(io.StringIO(response.read().decode("utf-8"))))
+
+    assert rows[0] == ["id", "student_id", "first_name", "last_name", "course", "section", "timestamp"]
+    assert len(rows) == 2501
+    assert rows[1][6] == start.isoformat() and rows[-1][6] == (start + timedelta(minutes=2499)).isoformat()
+
+
+class FailingExport:
+    def export_rows(self, start, end, course=None, section=None):
+        for i in range(1500):
+            yield (i, 1, "Ana", "Test", "BSIT", "1A", datetime(2026, 3, 2, 8))
+        raise ConnectionError("server closed the connection")
+
+
+def test_failed_export_cuts_the_stream_short(caplog):
+    with caplog.at_level(logging.ERROR, logger="kiosk.reports"):
+        with serving(FailingExport()) as conn:
+            conn.request("GET", "/api/attendance/export.csv")
+            response = conn.getresponse()
+            assert response.status == 200
+            with pytest.raises(http.client.IncompleteRead):
+                response.read()
+    assert "export failed" in caplog.text
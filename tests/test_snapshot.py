@@ -0,0 +1,79 @@
+import glob
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from kiosk.gallery import EmbeddingGallery
+from kiosk.snapshot import GallerySnapshot
+
+DIM = 32
+
+
+@pytest.fixture
+def students(memory_db, unit_rows):
+    start = datetime(2026, 6, 1, 8)
+    for i, vector in enumerate(unit_rows(20)):
+        memory_db.enroll(i + 1, vector, start + timedelta(hours=i))
+    return memory_db
+
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_saved_snapshot_boots_a_new_gallery(tmp_path, students, unit_rows, storage):
+    snapshot = GallerySnapshot(str(tmp_path))
+    gallery = EmbeddingGallery(dim=DIM, storage=storage)
+    assert snapshot.refresh(gallery, students) == 20
+
+    booted = EmbeddingGallery(dim=DIM, storage=storage)
+    restarted = GallerySnapshot(str(tmp_path))
+    assert restarted.load(booted)
+    assert isinstance(booted.matrix.base, np.memmap) or isinstance(booted.matrix, np.memmap)
+    assert np.array_equal(booted.ids, gallery.ids)
+    assert np.array_equal(booted.matrix, gallery.matrix)
+    assert restarted.watermark == datetime(2026, 6, 1, 8) + timedelta(hours=19)
+    assert booted.match(unit_rows(20)[4], threshold=0.9)[0] == 5
+
+
+def test_refresh_only_fetches_new_students(tmp_path, students, unit_rows):
+    snapshot = GallerySnapshot(str(tmp_path))
+    gallery = EmbeddingGallery(dim=DIM)
+    snapshot.refresh(gallery, students)
+    assert students.full_loads == 1
+
+    students.enroll(99, unit_rows(1, seed=7)[0], datetime(2026, 7, 1))
+    assert snapshot.refresh(gallery, students) == 1
+    assert students.full_loads == 1
+    assert snapshot.refresh(gallery, students) == 0
+    assert len(gallery) == 21 and snapshot.count == 21
+    assert len(glob.glob(os.path.join(str(tmp_path), "ids-*.npy"))) == 1
+
+
+def test_removed_student_forces_a_full_reload(tmp_path, students):
+    snapshot = GallerySnapshot(str(tmp_path))
+    gallery = EmbeddingGallery(dim=DIM)
+    snapshot.refresh(gallery, students)
+
+    students.students = [row for row in students.students if row[0] != 3]
+    snapshot.refresh(gallery, students)
+    assert students.full_loads == 2
+    assert 3 not in gallery.ids.tolist() and len(gallery) == 19
+
+
+def test_snapshot_of_another_storage_is_ignored(tmp_path, students):
+    GallerySnapshot(str(tmp_path)).refresh(EmbeddingGallery(dim=DIM), students)
+    assert not GallerySnapshot(str(tmp_path)).load(EmbeddingGallery(dim=DIM, storage="int8"))
+    assert not GallerySnapshot(str(tmp_path / "missing")).load(EmbeddingGallery(dim=DIM))
+
+
+def test_refresh_during_an_outage_keeps_the_snapshot(tmp_path, students):
+    snapshot = GallerySnapshot(str(tmp_path))
+    snapshot.refresh(EmbeddingGallery(dim=DIM), students)
+    students.down = True
+
+    booted = EmbeddingGallery(dim=DIM)
+    restarted = GallerySnapshot(str(tmp_path))
+    assert restarted.load(booted)
+    with pytest.raises(ConnectionError):
+        restarted.refresh(booted, students)
+    assert len(booted) == 20 and restarted.count == 20
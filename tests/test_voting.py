@@ -0,0 +1,43 @@
+from kiosk.voting import IdentityVoter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_commits_after_min_votes():
+    voter = IdentityVoter(window=5, min_votes=3, clock=Clock())
+    assert voter.status == "pending"
+    assert not voter.vote(4)
+    assert not voter.vote(None)
+    assert not voter.vote(4)
+    assert voter.vote(4)
+    assert (voter.committed, voter.status) == (4, "known")
+    assert not voter.vote(4)
+
+
+def test_unknown_face_commits_to_none():
+    voter = IdentityVoter(window=3, min_votes=2, clock=Clock())
+    voter.vote(None)
+    assert voter.vote(None)
+    assert voter.decided and voter.status == "unknown"
+
+
+def test_cooldown_holds_the_committed_identity():
+    clock = Clock()
+    voter = IdentityVoter(window=5, min_votes=3, cooldown_s=3.0, clock=clock)
+    for _ in range(3):
+        voter.vote(1)
+
+    clock.now = 1.0
+    for _ in range(4):
+        assert not voter.vote(2)
+    assert voter.committed == 1
+
+    clock.now = 4.0
+    assert voter.vote(2)
+    assert voter.committed == 2 and voter.committed_at == 4.0